@@ -27,9 +27,12 @@ bcrypt = Bcrypt()
 jwt = JWTManager()
 migrate = Migrate()
 
-def create_app():
+def create_app(config_overrides=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    # Used by the benchmark commands to point a throwaway app at an in-memory DB
+    if config_overrides:
+        app.config.update(config_overrides)
 
     # Allow Authorization and Content-Type headers, and all common methods
     # Use CORS_ORIGINS from config if set, otherwise allow all origins
@@ -53,4 +56,19 @@ def create_app():
     from .services import ai_embeddings_cli
     ai_embeddings_cli.register_commands(app)
 
+    from .services import geo_cli
+    geo_cli.register_commands(app)
+
+    from .services import profile_images_cli
+    profile_images_cli.register_commands(app)
+
+    from .services import notification_cli
+    notification_cli.register_commands(app)
+
+    from .services import outbound_cli
+    outbound_cli.register_commands(app)
+
+    from .services import benchmark_cli
+    benchmark_cli.register_commands(app)
+
     return app
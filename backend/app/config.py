@@ -21,6 +21,9 @@ class Config:
     # Use default values if SECRET_KEY is not set or is empty
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secret-key'
+
+    # bcrypt cost factor for new password hashes (each +1 doubles the hashing time)
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
     
     # Environment
     FLASK_ENV = os.getenv('FLASK_ENV', 'development')
@@ -56,4 +59,12 @@ class Config:
     STORAGE_ENV_PREFIX = os.getenv('STORAGE_ENV_PREFIX', '')
     
     # CORS Configuration
-    CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',') if os.getenv('CORS_ORIGINS') else ['*']
\ No newline at end of file
+    CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',') if os.getenv('CORS_ORIGINS') else ['*']
+
+    # Conversation-style nearest-neighbour index (built by `flask build-style-index`)
+    # Defaults to instance/style_index when not set
+    STYLE_INDEX_DIR = os.getenv('STYLE_INDEX_DIR')
+
+    # Memory-mapped copy of the stored embeddings (written by `flask export-embedding-vectors`)
+    # Defaults to instance/embedding_vectors when not set
+    EMBEDDING_VECTOR_DIR = os.getenv('EMBEDDING_VECTOR_DIR')
@@ -6,4 +6,9 @@ from .conversationDB import Conversation
 from .messageDB import Message
 from .quizDB import QuizResult
 from .skipDB import UserSkip
-from .blockDB import UserBlock
\ No newline at end of file
+from .blockDB import UserBlock
+from .embeddingDB import UserEmbedding
+from .explanationDB import ConversationExplanation
+from .notificationDB import NotificationOutbox, PushTicketRecord
+from .outboundMessageDB import OutboundMessage
+from .geocodeDB import GeocodeCacheEntry
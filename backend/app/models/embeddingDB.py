@@ -0,0 +1,32 @@
+from app import db
+from datetime import datetime
+import numpy as np
+
+class UserEmbedding(db.Model):
+    """Conversation-style embedding for a user, reused until enough new messages arrive."""
+    __tablename__ = 'user_embeddings'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    model = db.Column(db.String(64), nullable=False)  # e.g. "text-embedding-3-small"
+    dimension = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)  # little-endian float32, `dimension` values
+    last_message_id = db.Column(db.Integer, nullable=True)  # watermark: newest Message.id included
+    message_count = db.Column(db.Integer, nullable=False, default=0)  # messages the vector was built from
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def as_array(self):
+        return np.frombuffer(self.vector, dtype='<f4', count=self.dimension)
+
+    @staticmethod
+    def pack(vector):
+        return np.asarray(vector, dtype='<f4').tobytes()
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'model': self.model,
+            'dimension': self.dimension,
+            'last_message_id': self.last_message_id,
+            'message_count': self.message_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
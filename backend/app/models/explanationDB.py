@@ -0,0 +1,32 @@
+from app import db
+from datetime import datetime
+
+class ConversationExplanation(db.Model):
+    """Cached LLM explanation of two users' conversation similarity."""
+    __tablename__ = 'conversation_explanations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_a_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Newest Message.id from each user when the explanation was generated (0 if none)
+    watermark_a = db.Column(db.Integer, nullable=False, default=0)
+    watermark_b = db.Column(db.Integer, nullable=False, default=0)
+    model = db.Column(db.String(64), nullable=False)  # chat model that wrote the explanation
+    similarity = db.Column(db.Float, nullable=True)
+    explanation = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # One cached explanation per (ordered) user pair, replaced when messages change
+    __table_args__ = (db.UniqueConstraint('user_a_id', 'user_b_id', name='unique_explanation_pair'),)
+
+    def to_dict(self):
+        return {
+            'user_a_id': self.user_a_id,
+            'user_b_id': self.user_b_id,
+            'watermark_a': self.watermark_a,
+            'watermark_b': self.watermark_b,
+            'model': self.model,
+            'similarity': self.similarity,
+            'explanation': self.explanation,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
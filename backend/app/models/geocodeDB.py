@@ -0,0 +1,23 @@
+from app import db
+from datetime import datetime
+
+class GeocodeCacheEntry(db.Model):
+    """Reverse-geocoded city/state of a ~1 km grid cell (services/geocoding.py)."""
+    __tablename__ = 'geocode_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    cell_key = db.Column(db.String(32), nullable=False, unique=True)  # rounded "lat,lon"
+    city = db.Column(db.String(120), nullable=True)  # None when the lookup found no city (e.g. at sea)
+    state = db.Column(db.String(60), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # for LRU eviction
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cell_key': self.cell_key,
+            'city': self.city,
+            'state': self.state,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
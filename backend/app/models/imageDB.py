@@ -1,14 +1,16 @@
 from app import db
 
 class Image(db.Model):
+    __table_args__ = (db.Index('ix_image_user_id_position', 'user_id', 'position'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
+    # Display order within the user's profile; position 0 is the primary image
+    position = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def to_dict(self):
         return {
             "id": self.id,
-            "image_url": self.image_url
+            "image_url": self.image_url,
+            "position": self.position
         }
-
-
@@ -1,6 +1,8 @@
 from app import db
 
 class Message(db.Model):
+    # Conversation history is paged by message ID (see conversation_routes.py)
+    __table_args__ = (db.Index('ix_message_conversation_id_id', 'conversation_id', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,60 @@
+from app import db
+from sqlalchemy import JSON
+from datetime import datetime
+
+class NotificationOutbox(db.Model):
+    """Push notification waiting to be delivered by the notification dispatcher (services/notification_outbox.py)."""
+    __tablename__ = 'notification_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # "message" or "match"
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # recipient
+    payload = db.Column(JSON, nullable=False)  # message: sender_id, match_id, count; match: match_id, other_user_id
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, skipped, failed, coalesced
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # purge_outbox cutoff
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    # The dispatcher polls for due pending rows and checks recipients' recent pushes
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_notification_outbox_user_id_sent_at', 'user_id', 'sent_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'user_id': self.user_id,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+
+class PushTicketRecord(db.Model):
+    """Expo push ticket awaiting its receipt; removed once the receipt has been read."""
+    __tablename__ = 'push_tickets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    ticket_id = db.Column(db.String(64), nullable=False, unique=True)  # Expo ticket / receipt ID
+    token = db.Column(db.String(255), nullable=False)  # device the message was sent to
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # receipt checks that found no receipt
+    next_check_at = db.Column(db.DateTime, nullable=True, index=True)  # set after a check found none; backs off
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ticket_id': self.ticket_id,
+            'token': self.token,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'attempts': self.attempts,
+            'next_check_at': self.next_check_at.isoformat() if self.next_check_at else None
+        }
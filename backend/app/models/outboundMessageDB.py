@@ -0,0 +1,39 @@
+from app import db
+from sqlalchemy import JSON
+from datetime import datetime
+
+class OutboundMessage(db.Model):
+    """Verification / password reset email or SMS waiting to be sent (services/outbound_messages.py)."""
+    __tablename__ = 'outbound_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # "email" or "sms"
+    kind = db.Column(db.String(30), nullable=False)  # "verification" or "password_reset"
+    recipient = db.Column(db.String(120), nullable=False, index=True)  # email address or E.164 phone number
+    payload = db.Column(JSON, nullable=False)  # token, first_name
+    idempotency_key = db.Column(db.String(64), nullable=True, unique=True)  # sha256 of the client's Idempotency-Key
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # also the end of a sender's lease
+    last_error = db.Column(db.Text, nullable=True)
+    provider_message_id = db.Column(db.String(100), nullable=True)  # Resend email ID / Twilio message SID
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # purge_outbound cutoff
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    # The sender polls for due pending rows
+    __table_args__ = (db.Index('ix_outbound_messages_status_next_attempt_at', 'status', 'next_attempt_at'),)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'kind': self.kind,
+            'recipient': self.recipient,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'provider_message_id': self.provider_message_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
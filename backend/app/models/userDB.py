@@ -1,4 +1,5 @@
-from app import db, bcrypt
+from app import db
+from app.services.password_hashing import hash_password, verify_password
 from werkzeug.security import generate_password_hash, check_password_hash
 import uuid
 import secrets
@@ -7,12 +8,20 @@ from sqlalchemy.ext.mutable import MutableList
 from sqlalchemy import JSON
 from datetime import datetime
 
+# Columns read by the public profile projection (to_card_dict); pass to load_only() when loading users for it
+CARD_FIELDS = (
+    'id', 'role', 'first_name', 'last_name', 'bio', 'birthdate', 'age', 'gender', 'height',
+    'fontFamily', 'profileStyle', 'imageLayout', 'avatar', 'preferredAgeMin', 'preferredAgeMax',
+    'preferredGenders', 'city', 'state', 'show_location', 'unit', 'primary_image_url',
+)
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (db.Index('ix_users_latitude_longitude', 'latitude', 'longitude'),)
 
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), nullable=True)  # nullable to allow phone-only accounts
-    phone_number = db.Column(db.String(20), nullable=True)  # E.164 format: +1234567890
+    email = db.Column(db.String(120), nullable=True, index=True)  # nullable to allow phone-only accounts
+    phone_number = db.Column(db.String(20), nullable=True, index=True)  # E.164 format: +1234567890
     password_hash = db.Column(db.String(128), nullable=False)
     first_name = db.Column(db.String(120), nullable=True)
     last_name = db.Column(db.String(120), nullable=True)
@@ -27,8 +36,10 @@ class User(db.Model):
     profileStyle = db.Column(db.String(20), nullable=True, default='classic')
     imageLayout = db.Column(db.String(20), nullable=True, default='grid')
     avatar = db.Column(db.String(255), nullable=True)
+    primary_image_url = db.Column(db.String(255), nullable=True)  # URL of images[0]; kept in sync by services/profile_images.py
     latitude = db.Column(db.Float, nullable=True)
     longitude = db.Column(db.Float, nullable=True)
+    geo_cell = db.Column(db.Integer, nullable=True, index=True)  # grid cell of (latitude, longitude); see services/geo_index.py
     city = db.Column(db.String(120), nullable=True)
     state = db.Column(db.String(60), nullable=True)
     show_location = db.Column(db.Boolean, nullable=False, default=False)
@@ -66,7 +77,9 @@ class User(db.Model):
     preferredAgeMax = db.Column(db.Integer, nullable=True)
     preferredGenders = db.Column(MutableList.as_mutable(JSON), nullable=True)
 
-    images = db.relationship('Image', backref='user', lazy=True, cascade='all, delete-orphan')
+    images = db.relationship(
+        'Image', backref='user', lazy=True, cascade='all, delete-orphan',
+        order_by='(Image.position, Image.id)')
     # Clarify both sides of the Match relationships
     matches_as_user1 = db.relationship('Match', foreign_keys='Match.user_id_1', back_populates='user1')
     matches_as_user2 = db.relationship('Match', foreign_keys='Match.user_id_2', back_populates='user2')
@@ -100,10 +113,10 @@ class User(db.Model):
         return secrets.token_urlsafe(32)
     
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
     
     def get_linked_account(self):
         """Get the linked account (matchmaker or dater)"""
@@ -111,8 +124,48 @@ class User(db.Model):
             return User.query.get(self.linked_account_id)
         return None
 
+    def to_card_dict(self):
+        """
+        Public projection for feed and match list cards and for viewing another
+        user's profile (the app renders both with the same profile component):
+        no contact details, verification flags, referral/linking info or coordinates.
+        """
+        return {
+            "id": self.id,
+            "role": self.role,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "bio": self.bio,
+            "age": self.age,
+            "birthdate": self.birthdate.isoformat() if self.birthdate else None,
+            "gender": self.gender,
+            "height": self.height,
+            # Clients parse height by unit ("5'10" vs "178")
+            "unit": self.unit,
+            "fontFamily": self.fontFamily,
+            "profileStyle": self.profileStyle,
+            "imageLayout": self.imageLayout,
+            "avatar": self.avatar,
+            "images": [image.to_dict() for image in self.images],
+            "primary_image_url": self.primary_image_url,
+            "preferredAgeMin": self.preferredAgeMin,
+            "preferredAgeMax": self.preferredAgeMax,
+            "preferredGenders": self.preferredGenders,
+            # Sent as to_dict() always did; the clients decide whether to show them
+            "city": self.city,
+            "state": self.state,
+            "show_location": self.show_location,
+        }
+
     def to_dict(self):
-        linked_account = self.get_linked_account()
+        """Full self view, including private account fields."""
+        return self.build_dict(self.get_linked_account(), [d.id for d in self.get_linked_daters()])
+
+    def build_dict(self, linked_account, linked_dater_ids):
+        """
+        Serialize with the related rows supplied by the caller, so lists of
+        users can be serialized from batch-loaded data (see services/user_serialization.py).
+        """
         linked_account_info = None
         if linked_account:
             # Include only basic info to avoid infinite recursion
@@ -134,7 +187,7 @@ class User(db.Model):
             "referrer_id": self.referred_by_id,
             "linked_account_id": self.linked_account_id,
             "linked_account": linked_account_info,
-            "linked_daters": [d.id for d in self.get_linked_daters()],
+            "linked_daters": linked_dater_ids,
             "bio": self.bio,
             "age": self.age,
             "birthdate": self.birthdate.isoformat() if self.birthdate else None,
@@ -144,6 +197,7 @@ class User(db.Model):
             "profileStyle": self.profileStyle,
             "imageLayout": self.imageLayout,
             "images": [image.to_dict() for image in self.images],
+            "primary_image_url": self.primary_image_url,
             "preferredAgeMin": self.preferredAgeMin,
             "preferredAgeMax": self.preferredAgeMax,
             "preferredGenders": self.preferredGenders,
@@ -192,7 +246,7 @@ class ReferredUsers(db.Model):
                         "id": user.id,
                         "name": f"{user.first_name or ''}".strip(),
                         "referral_code": user.referral_code,
-                        "first_image": user.images[0].image_url if user.images else None,
+                        "first_image": user.primary_image_url,
                         "unit": user.unit,
                     })
         return {
@@ -205,8 +259,11 @@ class PushToken(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    token = db.Column(db.String(255), nullable=False)
+    token = db.Column(db.String(255), nullable=False, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Delivery health from Expo receipts (see services/push_receipts.py)
+    last_success_at = db.Column(db.DateTime, nullable=True)
+    failure_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # consecutive failed deliveries
     
     def __init__(self, user_id, token):
         self.user_id = user_id
@@ -217,7 +274,9 @@ class PushToken(db.Model):
             'id': self.id,
             'user_id': self.user_id,
             'token': self.token,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_success_at': self.last_success_at.isoformat() if self.last_success_at else None,
+            'failure_count': self.failure_count
         }
 
 @db.event.listens_for(User, 'after_insert')
@@ -228,3 +287,10 @@ def create_referral_row(mapper, connection, target):
             "linked_dater_1_id": target.referred_by_id  # set to the referring user's ID
         }
         connection.execute(ReferredUsers.__table__.insert().values(**values))
+
+@db.event.listens_for(User, 'before_insert')
+@db.event.listens_for(User, 'before_update')
+def update_geo_cell(mapper, connection, target):
+    # Keep the geospatial grid cell in sync with the coordinates
+    from app.services.geo_index import compute_geo_cell
+    target.geo_cell = compute_geo_cell(target.latitude, target.longitude)
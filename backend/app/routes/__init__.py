@@ -7,6 +7,7 @@ from .quiz_routes import quiz_bp
 from .referral_routes import referral_bp
 from .location_routes import location_bp
 from .notification_routes import notification_bp
+from .events_routes import events_bp
 
 def register_blueprints(app):
     app.register_blueprint(auth_bp, url_prefix="/auth")
@@ -17,4 +18,5 @@ def register_blueprints(app):
     app.register_blueprint(quiz_bp, url_prefix='/quiz')
     app.register_blueprint(referral_bp, url_prefix='/referral')
     app.register_blueprint(location_bp, url_prefix='/location')
-    app.register_blueprint(notification_bp, url_prefix='/notifications')
\ No newline at end of file
+    app.register_blueprint(notification_bp, url_prefix='/notifications')
+    app.register_blueprint(events_bp, url_prefix='/events')
\ No newline at end of file
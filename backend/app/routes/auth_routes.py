@@ -1,15 +1,22 @@
 from flask import Blueprint, request, jsonify
 from app.models import db, User
+from app.services.outbound_messages import queue_outbound_message
+from app.services.password_hashing import PasswordHashingBusy, RETRY_AFTER_SECONDS
 from flask_jwt_extended import create_access_token
 from flask import current_app
 from datetime import datetime, timedelta
-import resend
 import os
 import re
-from twilio.rest import Client
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
+@auth_bp.errorhandler(PasswordHashingBusy)
+def password_hashing_busy(error):
+    # Signups/logins beyond the hashing queue are shed instead of tying up worker threads
+    response = jsonify({'error': 'Too many sign-in requests right now, please try again shortly'})
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response, 503
+
 # Test mode configuration
 def is_test_mode_enabled():
     """Check if test mode is enabled"""
@@ -30,73 +37,6 @@ def is_test_email(email):
     test_domains = get_test_email_domains()
     return any(email.lower().endswith(domain.lower()) for domain in test_domains)
 
-# Initialize Resend API key
-resend.api_key = os.getenv("RESEND_API_KEY")
-SENDER_EMAIL = "donotreply@matchmatedating.com"
-
-def get_twilio_client():
-    """Get Twilio client"""
-    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-    if account_sid and auth_token:
-        return Client(account_sid, auth_token)
-    return None
-
-def send_verification_sms(phone_number, verification_token, first_name):
-    """Send verification SMS using Twilio"""
-    try:
-        client = get_twilio_client()
-        if not client:
-            print("Twilio credentials not configured")
-            return False
-        
-        twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
-        if not twilio_phone:
-            print("TWILIO_PHONE_NUMBER not configured")
-            return False
-
-        print('twilio phone', twilio_phone)
-        
-        message_body = f"Hello {first_name or 'there'}, your verification code is: {verification_token}. If you didn't create an account, please ignore this message."
-        
-        message = client.messages.create(
-            body=message_body,
-            from_=twilio_phone,
-            to=phone_number
-        )
-        print(f"Verification SMS sent to {phone_number}: {message.sid}")
-        return True
-    except Exception as e:
-        print(f"Error sending verification SMS: {str(e)}")
-        return False
-
-def send_verification_email(email, verification_token, first_name):
-    """Send verification email using Resend"""
-    try:
-        subject = "Verify Your Email Address"
-        body_html = f"""<html>
-            <head></head>
-            <body>
-              <h2>Hello {first_name or 'there'},</h2>
-              <p>Please verify your email address by entering the verification code in the app:</p>
-              <p><strong>Verification Code: {verification_token}</strong></p>
-              <p>If you didn't create an account, please ignore this email.</p>
-              <p>Best regards,<br>The MatchMate Team</p>
-            </body>
-            </html>"""
-        
-        response = resend.Emails.send({
-            "from": SENDER_EMAIL,
-            "to": [email],
-            "subject": subject,
-            "html": body_html,
-        })
-        print(f"Verification email sent to {email}: {response.get('id')}")
-        return True
-    except Exception as e:
-        print(f"Error sending verification email: {str(e)}")
-        return False
-
 def is_email(value):
     """Check if value is an email address"""
     email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -216,22 +156,22 @@ def register():
 
     # Normal flow: Generate verification token (temporary - not stored in DB)
     verification_token = User.generate_verification_token_static()
-    verification_sent = False
 
+    # Sent in the background after commit; a retried request (same Idempotency-Key) gets the first code back
     if email:
-        verification_sent = send_verification_email(email, verification_token, None)
-        if not verification_sent:
-            print(f"Warning: Failed to send verification email to {email}")
+        message = queue_outbound_message('email', email, 'verification', verification_token,
+                                         idempotency_key=request.headers.get('Idempotency-Key'))
     else:
-        verification_sent = send_verification_sms(phone_number, verification_token, None)
-        if not verification_sent:
-            print(f"Warning: Failed to send verification SMS to {phone_number}")
+        message = queue_outbound_message('sms', phone_number, 'verification', verification_token,
+                                         idempotency_key=request.headers.get('Idempotency-Key'))
+    verification_token = message.payload['token']
+    db.session.commit()
 
     # Return success without creating user
     method = 'email' if email else 'phone'
     return jsonify({
         'message': f'Verification code sent. Please verify your {method}.',
-        'verification_sent': verification_sent,
+        'verification_sent': True,
         'verification_method': method,
         'verification_token': verification_token  # Return token for verification
     }), 200
@@ -284,6 +224,31 @@ def register_matchmaker_web():
         'user_id': user.id
     }), 201
 
+def login_candidates(column, value):
+    """
+    Accounts registered with this email or phone number, most recently active
+    first (never-active accounts last, then newest first).
+    """
+    return User.query.filter(column == value).order_by(
+        User.last_active_at.desc().nulls_last(), User.id.desc()
+    ).all()
+
+def first_matching_account(users, password):
+    """
+    First of users whose password matches, or None.
+
+    Linked dater/matchmaker accounts are created with the same password hash,
+    so results are memoized per hash: bcrypt runs once per distinct hash at
+    most, and only until a match is found.
+    """
+    verified = {}
+    for user in users:
+        if user.password_hash not in verified:
+            verified[user.password_hash] = user.check_password(password)
+        if verified[user.password_hash]:
+            return user
+    return None
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.json
@@ -296,13 +261,13 @@ def login():
     # Determine if identifier is email or phone
     if is_email(identifier):
         # Login with email
-        users = User.query.filter_by(email=identifier).all()
+        users = login_candidates(User.email, identifier)
         identifier_type = 'email'
         identifier_value = identifier
     else:
         # Login with phone number (normalize it)
         phone_number = normalize_phone_number(identifier)
-        users = User.query.filter_by(phone_number=phone_number).all()
+        users = login_candidates(User.phone_number, phone_number)
         identifier_type = 'phone number'
         identifier_value = phone_number
 
@@ -313,20 +278,11 @@ def login():
         else:
             return jsonify({'error': 'No user with this phone number exists, please sign up'}), 401
 
-    # Find all users with matching password
-    matching_users = []
-    for u in users:
-        if u.check_password(password):
-            matching_users.append(u)
-
-    if not matching_users:
+    # If multiple accounts match, the one that was last active wins
+    user = first_matching_account(users, password)
+    if not user:
         return jsonify({'error': 'Invalid password'}), 401
     
-    # If multiple accounts match, prefer the one that was last active
-    # Sort by last_active_at (most recent first), with None values treated as oldest
-    matching_users.sort(key=lambda u: u.last_active_at if u.last_active_at else datetime.min, reverse=True)
-    user = matching_users[0]
-    
     # Update last_active_at to current time
     user.last_active_at = datetime.utcnow()
     db.session.commit()
@@ -471,13 +427,9 @@ def resend_verification():
         if not user.email_verification_token:
             user.email_verification_token = user.generate_verification_token()
             db.session.commit()
-        verification_sent = send_verification_email(
-            user.email,
-            user.email_verification_token,
-            user.first_name
-        )
-        if not verification_sent:
-            return jsonify({'msg': 'Failed to send verification email'}), 500
+        queue_outbound_message('email', user.email, 'verification', user.email_verification_token,
+                               user.first_name, idempotency_key=request.headers.get('Idempotency-Key'))
+        db.session.commit()
     else:
         # Normalize phone number
         phone_number = normalize_phone_number(phone_number)
@@ -491,13 +443,9 @@ def resend_verification():
         if not user.phone_verification_token:
             user.phone_verification_token = user.generate_verification_token()
             db.session.commit()
-        verification_sent = send_verification_sms(
-            user.phone_number,
-            user.phone_verification_token,
-            user.first_name
-        )
-        if not verification_sent:
-            return jsonify({'msg': 'Failed to send verification SMS'}), 500
+        queue_outbound_message('sms', user.phone_number, 'verification', user.phone_verification_token,
+                               user.first_name, idempotency_key=request.headers.get('Idempotency-Key'))
+        db.session.commit()
     
     method_text = 'email' if verification_method == 'email' else 'SMS'
     return jsonify({
@@ -506,68 +454,6 @@ def resend_verification():
         'verification_method': verification_method
     }), 200
 
-def send_password_reset_email(email, reset_token, first_name):
-    """Send password reset email using Resend"""
-    try:
-        frontend_url = (os.getenv("FRONTEND_URL") or "https://matchmatedating.com").rstrip("/")
-        reset_url = f"{frontend_url}/reset-password.html?token={reset_token}"
-        
-        subject = "Reset Your Password"
-        body_html = f"""<html>
-            <head></head>
-            <body>
-              <h2>Hello {first_name or 'there'},</h2>
-              <p>You requested to reset your password. Click the link below to reset it:</p>
-              <p><a href="{reset_url}" style="background-color: #6B46C1; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Reset Password</a></p>
-              <p>Or copy and paste this link into your browser:</p>
-              <p>{reset_url}</p>
-              <p>This link will expire in 1 hour.</p>
-              <p>If you didn't request a password reset, please ignore this email.</p>
-              <p>Best regards,<br>The MatchMate Team</p>
-            </body>
-            </html>"""
-        
-        response = resend.Emails.send({
-            "from": SENDER_EMAIL,
-            "to": [email],
-            "subject": subject,
-            "html": body_html,
-        })
-        print(f"Password reset email sent to {email}: {response.get('id')}")
-        return True
-    except Exception as e:
-        print(f"Error sending password reset email: {str(e)}")
-        return False
-
-def send_password_reset_sms(phone_number, reset_token, first_name):
-    """Send password reset SMS using Twilio"""
-    try:
-        client = get_twilio_client()
-        if not client:
-            print("Twilio credentials not configured")
-            return False
-        
-        twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
-        if not twilio_phone:
-            print("TWILIO_PHONE_NUMBER not configured")
-            return False
-        
-        frontend_url = (os.getenv("FRONTEND_URL") or "https://matchmatedating.com").rstrip("/")
-        reset_url = f"{frontend_url}/reset-password.html?token={reset_token}"
-        
-        message_body = f"Hello {first_name or 'there'}, you requested to reset your password. Click this link: {reset_url} This link expires in 1 hour. If you didn't request this, please ignore."
-        
-        message = client.messages.create(
-            body=message_body,
-            from_=twilio_phone,
-            to=phone_number
-        )
-        print(f"Password reset SMS sent to {phone_number}: {message.sid}")
-        return True
-    except Exception as e:
-        print(f"Error sending password reset SMS: {str(e)}")
-        return False
-
 @auth_bp.route('/forgot-password', methods=['POST'])
 def forgot_password():
     """Request password reset - sends email or SMS with reset link"""
@@ -592,20 +478,19 @@ def forgot_password():
             'message': 'If an account exists with that email or phone number, password reset instructions have been sent.'
         }), 200
     
-    # Generate reset token
+    # Generate reset token and queue the link via email or SMS in the same transaction
     reset_token = user.generate_password_reset_token()
-    user.password_reset_token = reset_token
-    user.password_reset_token_expires = datetime.utcnow() + timedelta(hours=1)
-    db.session.commit()
-    
-    # Send reset link via email or SMS
     if method == 'email':
-        sent = send_password_reset_email(user.email, reset_token, user.first_name)
+        message = queue_outbound_message('email', user.email, 'password_reset', reset_token, user.first_name,
+                                         idempotency_key=request.headers.get('Idempotency-Key'))
     else:
-        sent = send_password_reset_sms(user.phone_number, reset_token, user.first_name)
-    
-    if not sent:
-        return jsonify({'msg': 'Failed to send reset instructions. Please try again later.'}), 500
+        message = queue_outbound_message('sms', user.phone_number, 'password_reset', reset_token, user.first_name,
+                                         idempotency_key=request.headers.get('Idempotency-Key'))
+    # A retried request reuses the first message; the link it carries stays the valid one
+    if message.payload['token'] == reset_token:
+        user.password_reset_token = reset_token
+        user.password_reset_token_expires = datetime.utcnow() + timedelta(hours=1)
+    db.session.commit()
     
     return jsonify({
         'message': 'If an account exists with that email or phone number, password reset instructions have been sent.'
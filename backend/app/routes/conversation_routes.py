@@ -5,11 +5,16 @@ from app.models.matchDB import Match
 from app.models.userDB import User
 from app import db
 from datetime import datetime, timezone
-from app.routes.shared import token_required
-from app.services.notification_service import send_message_notification
+from app.routes.shared import identity_required
+from app.services.notification_outbox import queue_message_notification
+from app.services.realtime import publish_message
 
 conversation_bp = Blueprint('conversation', __name__)
 
+# Page size for GET /conversation/<match_id> when a cursor or limit is given
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 
 def _message_timestamp_utc_iso(dt):
     """Return message timestamp as ISO 8601 string in UTC (with Z suffix) so clients parse as UTC and can show in local time (EST, PST, etc.)."""
@@ -20,8 +25,66 @@ def _message_timestamp_utc_iso(dt):
         return dt.isoformat() + 'Z'
     return dt.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
 
+
+def _message_dict(msg):
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'receiver_id': msg.receiver_id,
+        'text': msg.text,
+        'puzzle_type': getattr(msg, 'puzzle_type', None),
+        'puzzle_link': getattr(msg, 'puzzle_link', None),
+        'timestamp': _message_timestamp_utc_iso(msg.timestamp)
+    }
+
+
+def _int_arg(name):
+    """Parse an optional positive integer query argument; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if value < 1:
+        raise ValueError(name)
+    return value
+
+
+def _prefers_minimal():
+    """Whether the client sent `Prefer: return=minimal` (only the new message in POST responses)."""
+    prefer = request.headers.get('Prefer', '')
+    return any(token.strip().lower() == 'return=minimal' for token in prefer.split(','))
+
+
+def _full_history(conversation_id):
+    """Every message in a conversation, oldest first."""
+    return Message.query.filter_by(conversation_id=conversation_id).order_by(Message.id).all()
+
+
+def _message_page(conversation_id, before=None, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a conversation by message ID cursor.
+
+    Args:
+        before: only messages with id < before
+        after: only messages with id > after; the page then starts right after
+            the cursor (oldest first), otherwise it is the newest messages
+        limit: page size
+
+    Returns:
+        (messages in ascending id order, whether more exist beyond the page)
+    """
+    query = Message.query.filter(Message.conversation_id == conversation_id)
+    if before is not None:
+        query = query.filter(Message.id < before)
+    if after is not None:
+        query = query.filter(Message.id > after)
+        rows = query.order_by(Message.id.asc()).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+    rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    return rows[:limit][::-1], len(rows) > limit
+
 @conversation_bp.route('/<int:match_id>', methods=['GET'])
-@token_required
+@identity_required
 def get_matched_conversations(current_user, match_id):
     # Check if user has permission to view this conversation
     match = Match.query.get(match_id)
@@ -56,33 +119,43 @@ def get_matched_conversations(current_user, match_id):
         if check_user_id not in liked_ids:
             return jsonify({'error': 'You do not have permission to view this conversation'}), 403
     
+    try:
+        before = _int_arg('before')
+        after = _int_arg('after')
+        limit = _int_arg('limit')
+    except ValueError:
+        return jsonify({'error': 'before, after and limit must be positive integers'}), 400
+
     conversation = Conversation.query.filter_by(match_id=match_id).first()
     if not conversation:
         return jsonify([]), 200
 
-    messages_data = [
-        {
-            'id': msg.id,
-            'sender_id': msg.sender_id,
-            'receiver_id': msg.receiver_id,
-            'text': msg.text,
-            'puzzle_type': getattr(msg, 'puzzle_type', None),
-            'puzzle_link': getattr(msg, 'puzzle_link', None),
-            'timestamp': _message_timestamp_utc_iso(msg.timestamp)
-        }
-        for msg in conversation.messages
-    ]
+    # Without a cursor or limit the whole history is returned, as older clients expect
+    if before is None and after is None and limit is None:
+        messages = _full_history(conversation.id)
+        return jsonify([{
+            'id': conversation.id,
+            'match_id': conversation.match_id,
+            'messages': [_message_dict(msg) for msg in messages]
+        }]), 200
 
+    messages, has_more = _message_page(
+        conversation.id,
+        before=before,
+        after=after,
+        limit=min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    )
     return jsonify([{
         'id': conversation.id,
         'match_id': conversation.match_id,
-        'messages': messages_data
+        'messages': [_message_dict(msg) for msg in messages],
+        'has_more': has_more
     }]), 200
 
 
 # POST a text message to conversation
 @conversation_bp.route('/<int:match_id>', methods=['POST'])
-@token_required
+@identity_required
 def add_to_conversation(current_user, match_id):
     # Check if user has permission to send messages in this conversation
     match = Match.query.get(match_id)
@@ -200,37 +273,22 @@ def add_to_conversation(current_user, match_id):
                     db.session.rollback()
                     return jsonify({"error": "Message limit reached. Please approve the match to continue."}), 400
 
+    # Push notification to the receiver (receiver_user_id already computed above), sent after commit
+    queue_message_notification(receiver_user_id, sender_user_id, match_id)
     db.session.commit()
 
-    # Send push notification to the receiver (receiver_user_id already computed above)
-    if match and (text or puzzle_type):
-        message_preview = text if text else f"Sent a {puzzle_type}" if puzzle_type else "You have a new message"
-        try:
-            send_message_notification(
-                receiver_id=receiver_user_id,
-                sender_id=sender_user_id,
-                match_id=match_id,
-                message_text=message_preview
-            )
-        except Exception as e:
-            # Log error but don't fail the request
-            print(f"Error sending push notification: {e}")
-
-    messages_data = [
-        {
-            'id': msg.id,
-            'sender_id': msg.sender_id,
-            'receiver_id': msg.receiver_id,
-            'text': msg.text,
-            'puzzle_type': getattr(msg, 'puzzle_type', None),
-            'puzzle_link': getattr(msg, 'puzzle_link', None),
-            'timestamp': _message_timestamp_utc_iso(msg.timestamp)
-        }
-        for msg in conversation.messages
-    ]
-
-    return jsonify({
+    message_data = _message_dict(message)
+    publish_message(match, message_data)
+
+    # Clients append the new message, or fetch ?after=<last id> for others
+    response = {
         'id': conversation.id,
         'match_id': conversation.match_id,
-        'messages': messages_data
-    }), 201
+        'message': message_data
+    }
+    if not _prefers_minimal():
+        # Compatibility for app builds that replace their list with `messages`:
+        # the full history, as a plain GET and the old POST return. Drop once those builds are retired.
+        messages = _full_history(conversation.id)
+        response['messages'] = [_message_dict(msg) for msg in messages]
+    return jsonify(response), 201
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from flask import Blueprint, Response, jsonify
+from app.routes.shared import identity_required
+from app.services.realtime import get_broker, user_channel, format_sse
+
+events_bp = Blueprint('events', __name__)
+
+# Comment frame sent when idle so proxies keep the connection open
+HEARTBEAT_SECONDS = int(os.getenv('REALTIME_HEARTBEAT_SECONDS', '15'))
+# Streams are closed after this long; EventSource clients reconnect automatically
+STREAM_MAX_SECONDS = int(os.getenv('REALTIME_STREAM_MAX_SECONDS', '300'))
+# Threads per worker process (gunicorn --threads, set from GUNICORN_THREADS in the Procfile)
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS', '64'))
+# Threads kept free for REST requests however many streams are open
+REST_THREADS = int(os.getenv('REALTIME_REST_THREADS', '16'))
+# Open streams per worker process. Each holds a thread (waiting on its queue, with
+# no database connection), so by default every thread not reserved for REST
+MAX_STREAMS = int(os.getenv('REALTIME_MAX_STREAMS', str(max(WORKER_THREADS - REST_THREADS, 1))))
+# Sent as Retry-After when a worker is at MAX_STREAMS; clients keep polling meanwhile
+RETRY_AFTER_SECONDS = 30
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+
+@events_bp.route('/stream', methods=['GET'])
+@identity_required
+def stream_events(current_user):
+    """
+    Server-sent events for the current user: `message` when a chat message is
+    sent in one of their matches, `match` when a match changes state, and
+    `resync` when events were dropped and the client should refetch.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        response = jsonify({'message': 'Too many open event streams, keep polling and retry later'})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 503
+
+    try:
+        # Subscribe before responding so nothing published meanwhile is missed
+        subscription = get_broker().subscribe(user_channel(current_user.id))
+    except Exception:
+        _stream_slots.release()
+        raise
+
+    closed = threading.Event()
+
+    def close():
+        # Called when the stream ends and again when the server closes the response
+        if not closed.is_set():
+            closed.set()
+            subscription.close()
+            _stream_slots.release()
+
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=min(HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0)))
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(event)
+        finally:
+            close()
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(close)
+    return response
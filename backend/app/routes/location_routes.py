@@ -1,31 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User
-import httpx
+from app.services.geocoding import cached_place, apply_place, defer_place_lookup
 
 location_bp = Blueprint('location', __name__)
 
 
-def _reverse_geocode(latitude, longitude):
-    """Fallback: derive city/state from lat/long via Nominatim when mobile didn't send them."""
-    try:
-        with httpx.Client(timeout=5.0) as client:
-            r = client.get(
-                "https://nominatim.openstreetmap.org/reverse",
-                params={"lat": latitude, "lon": longitude, "format": "json", "addressdetails": 1},
-                headers={"User-Agent": "MatchmateDating/1.0"},
-            )
-            if r.status_code != 200:
-                return None, None
-            data = r.json()
-            addr = data.get("address") or {}
-            city = addr.get("city") or addr.get("town") or addr.get("village") or addr.get("municipality")
-            state = addr.get("state")
-            return city, state
-    except Exception:
-        return None, None
-
-
 @location_bp.route('/update', methods=['POST'])
 @jwt_required()
 def update_location():
@@ -45,13 +25,15 @@ def update_location():
         if latitude is not None and longitude is not None:
             user.latitude = latitude
             user.longitude = longitude
-            # If mobile didn't send city/state, derive from coordinates
-            if (city is None or state is None) and latitude is not None and longitude is not None:
-                derived_city, derived_state = _reverse_geocode(latitude, longitude)
-                if city is None and derived_city:
-                    city = derived_city
-                if state is None and derived_state:
-                    state = derived_state
+            # If mobile didn't send city/state, derive from coordinates: from the geocode
+            # cache when the area is known, otherwise in the background after commit
+            missing = [field for field, value in (('city', city), ('state', state)) if value is None]
+            if missing:
+                place = cached_place(latitude, longitude)
+                if place is not None:
+                    apply_place(user, place, missing)
+                else:
+                    defer_place_lookup(user.id, latitude, longitude, missing)
 
         if city is not None:
             user.city = city
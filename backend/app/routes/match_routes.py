@@ -1,14 +1,31 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from app.models.userDB import User
 from app.models.matchDB import Match
 from app.models.skipDB import UserSkip
 from app.models.blockDB import UserBlock
 from app import db
-from app.routes.shared import token_required
-from app.services.ai_embeddings import get_conversation_similarity
+from app.routes.shared import token_required, identity_required
+from app.services.ai_embeddings import score_candidates, get_user_embedding
+from app.services.embedding_providers import get_embedding_provider
+from app.services.user_serialization import serialize_cards, CARD_LOAD_OPTIONS
+from app.services.match_list import load_match_participants, load_match_likers, match_card
+from app.services.style_index import get_style_index, exact_style_search, DEFAULT_NPROBE
+from app.services.candidate_feed import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    LOAD_CHUNK_SIZE,
+    load_feed_state,
+    eligible_candidate_ids,
+    paginate_candidate_ids,
+    encode_feed_cursor,
+    decode_feed_cursor,
+    load_users_in_order,
+    candidate_match_fields
+)
 import math
 from math import radians, sin, cos, sqrt, atan2
-from app.services.notification_service import send_match_notification
+from app.services.notification_outbox import queue_match_notification
+from app.services.realtime import publish_match_update
 
 match_bp = Blueprint('match', __name__)
 
@@ -25,214 +42,127 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return R * c
 
 @match_bp.route('/users_to_match', methods=['GET'])
-@token_required
+@identity_required
 def get_users_to_match(current_user):
     # Determine the acting user - for matchmakers, use their linked dater
-    acting_user = current_user
     referred_dater_id = None
     if current_user.role == 'matchmaker' and current_user.referred_by_id:
         referred_dater_id = current_user.referred_by_id
-        acting_user = User.query.get(referred_dater_id)
-        if not acting_user:
-            return jsonify([]), 404
-    
-    query = User.query.filter(
-        User.role == 'user',
-        User.id != acting_user.id,
-        User.match_radius.isnot(None),
-        User.match_radius > 0
-    )
-
-    # Add preferences filtering using acting_user (linked dater for matchmakers)
-    # Age filtering
-    if acting_user.preferredAgeMin and acting_user.preferredAgeMax:
-        query = query.filter(User.age.between(
-            acting_user.preferredAgeMin, 
-            acting_user.preferredAgeMax
-        ))
-
-    # Gender filtering
-    if acting_user.preferredGenders:
-        query = query.filter(User.gender.in_(acting_user.preferredGenders))
-
-    # If matchmaker, exclude their referred dater from the list
-    if current_user.role == 'matchmaker' and referred_dater_id:
-        liked_by_linked_dater = Match.query.filter(
-            (Match.user_id_1 == referred_dater_id) | (Match.user_id_2 == referred_dater_id)
-        ).all()
-
-        liked_user_ids = set()
-        for match in liked_by_linked_dater:
-            if any(u.id == referred_dater_id for u in match.liked_by):
-                if match.user_id_1 != referred_dater_id:
-                    liked_user_ids.add(match.user_id_1)
-                if match.user_id_2 != referred_dater_id:
-                    liked_user_ids.add(match.user_id_2)
-
-        matched_users = Match.query.filter(
-            ((Match.user_id_1 == referred_dater_id) | (Match.user_id_2 == referred_dater_id)) &
-            (Match.status == 'matched')
-        ).all()
-
-        matched_user_ids = set()
-        for match in matched_users:
-            if match.user_id_1 != referred_dater_id:
-                matched_user_ids.add(match.user_id_1)
-            if match.user_id_2 != referred_dater_id:
-                matched_user_ids.add(match.user_id_2)
-
-        query = query.filter(
-            ~User.id.in_(matched_user_ids),
-            ~User.id.in_(liked_user_ids),
-            User.id != referred_dater_id)
-
-    if acting_user.role == 'user':
-        existing_matches = Match.query.filter(
-            ((Match.user_id_1 == acting_user.id) | (Match.user_id_2 == acting_user.id)) &
-            (Match.status == 'matched')
-        ).all()
-
-        matched_user_ids = set()
-        for match in existing_matches:
-            if match.user_id_1 != acting_user.id:
-                matched_user_ids.add(match.user_id_1)
-            if match.user_id_2 != acting_user.id:
-                matched_user_ids.add(match.user_id_2)
-
-        query = query.filter(~User.id.in_(matched_user_ids))
-
-        pending_likes = Match.query.filter(
-            ((Match.user_id_1 == acting_user.id) | (Match.user_id_2 == acting_user.id)) &
-            (Match.status == 'pending')
-        ).all()
-
-        pending_user_ids = set()
-        for match in pending_likes:
-            if any(u.id == acting_user.id for u in match.liked_by):
-                if match.user_id_1 != acting_user.id:
-                    pending_user_ids.add(match.user_id_1)
-                if match.user_id_2 != acting_user.id:
-                    pending_user_ids.add(match.user_id_2)
-
-        query = query.filter(~User.id.in_(pending_user_ids))
-
-        # Also filter out users from pending_approval matches (when matchmaker likes back)
-        pending_approval_matches = Match.query.filter(
-            ((Match.user_id_1 == acting_user.id) | (Match.user_id_2 == acting_user.id)) &
-            (Match.status == 'pending_approval')
-        ).all()
-
-        pending_approval_user_ids = set()
-        for match in pending_approval_matches:
-            if any(u.id == acting_user.id for u in match.liked_by):
-                if match.user_id_1 != acting_user.id:
-                    pending_approval_user_ids.add(match.user_id_1)
-                if match.user_id_2 != acting_user.id:
-                    pending_approval_user_ids.add(match.user_id_2)
-
-        query = query.filter(~User.id.in_(pending_approval_user_ids))
-
-    users = query.all()
-    
-    # Get blocked user IDs (bidirectional - exclude if either user blocked the other)
-    blocked_user_ids = set()
-    # Users that the acting user has blocked
-    blocks_by_acting = UserBlock.query.filter_by(blocker_id=acting_user.id).all()
-    for block_record in blocks_by_acting:
-        blocked_user_ids.add(block_record.blocked_id)
-    # Users that have blocked the acting user
-    blocks_of_acting = UserBlock.query.filter_by(blocked_id=acting_user.id).all()
-    for block_record in blocks_of_acting:
-        blocked_user_ids.add(block_record.blocker_id)
-    
-    # Get skipped user IDs for the acting user
-    skipped_user_ids = set()
-    skipped_records = UserSkip.query.filter_by(user_id=acting_user.id).all()
-    for skip_record in skipped_records:
-        skipped_user_ids.add(skip_record.skipped_user_id)
-    
-    # Separate users into non-skipped and skipped (exclude blocked users completely)
-    non_skipped_users = []
-    skipped_users = []
-    for user in users:
-        # Exclude blocked users completely (they won't appear at all)
-        if user.id in blocked_user_ids:
-            continue
-        if user.id in skipped_user_ids:
-            skipped_users.append(user)
-        else:
-            non_skipped_users.append(user)
-    
-    # Combine: non-skipped first, then skipped (skipped users go to the end)
-    sorted_users = non_skipped_users + skipped_users
+    # The feed filters read the full profile (location, preferences) of the acting user
+    acting_user = User.query.get(referred_dater_id or current_user.id)
+    if not acting_user:
+        return jsonify([]), 404
     
-    users_data = []
-    for user in sorted_users:
-        # Use acting_user's location and radius (linked dater for matchmakers)
-        if acting_user.latitude and acting_user.longitude and user.latitude and user.longitude:
-            distance = haversine_distance(acting_user.latitude, acting_user.longitude,
-                                          user.latitude, user.longitude)
-            if distance is None:
-                continue
-            # user must be within acting_user's radius AND vice versa
-            acting_radius = acting_user.match_radius if acting_user.match_radius else 0
-            user_radius = user.match_radius if user.match_radius else 0
-            if acting_radius == 0 or user_radius == 0:
-                continue
-            if distance > acting_radius or distance > user_radius:
-                continue
-        # Check if user's age preferences match acting_user's age
-        if acting_user.preferredAgeMin and acting_user.preferredAgeMax and user.preferredAgeMin and user.preferredAgeMax:
-            if not (user.preferredAgeMin <= acting_user.age <= user.preferredAgeMax):
-                continue
-        # Check if user's gender preferences include acting_user's gender
-        # If user has preferences, acting_user's gender must be in them
-        # If user has no preferences, they're open to anyone (don't filter)
-        if user.preferredGenders:
-            if not acting_user.gender or acting_user.gender not in user.preferredGenders:
-                continue
-        liked_linked_dater = False
-        note_text = None
-        matched_by_matcher_user_1 = None
-        matched_by_matcher_user_2 = None
-
-        match = Match.query.filter(
-            ((Match.user_id_1 == acting_user.id) & (Match.user_id_2 == user.id)) |
-            ((Match.user_id_1 == user.id) & (Match.user_id_2 == acting_user.id))
-        ).first()
-
-        if match:
-            if match.note:
-                note_text = match.note
-            # read the two matcher columns directly
-            matched_by_matcher_user_1 = match.matched_by_user_id_1_matcher
-            matched_by_matcher_user_2 = match.matched_by_user_id_2_matcher
-
-        if current_user.role == 'matchmaker' and referred_dater_id:
-            match = Match.query.filter(
-                ((Match.user_id_1 == user.id) & (Match.user_id_2 == referred_dater_id)) |
-                ((Match.user_id_1 == referred_dater_id) & (Match.user_id_2 == user.id))
-            ).first()
-            if match and any(u.id == referred_dater_id for u in match.liked_by) and not any(u.id == user.id for u in match.liked_by):
-                liked_linked_dater = True
-
-        user_dict = user.to_dict()
-        user_dict['liked_linked_dater'] = liked_linked_dater
-        user_dict['note'] = note_text
-        user_dict['matched_by_matcher_user_1'] = matched_by_matcher_user_1
-        user_dict['matched_by_matcher_user_2'] = matched_by_matcher_user_2
-        if current_user.role == 'matchmaker' and referred_dater_id:
+    matchmaker_view = current_user.role == 'matchmaker' and bool(referred_dater_id)
+
+    # Exclusions and match metadata come from a fixed number of set-based queries
+    feed_state = load_feed_state(acting_user, matchmaker_view=matchmaker_view)
+
+    # Age/gender/radius pre-filters in SQL, then the mutual radius and reciprocal
+    # preference checks in one vectorized pass over plain column rows
+    eligible_ids = eligible_candidate_ids(acting_user, feed_state)
+
+    def ai_scores_for(user_ids):
+        # One batched matrix product per page/chunk instead of a call per candidate
+        if not matchmaker_view:
+            return {}
+        try:
+            scores = score_candidates(referred_dater_id, user_ids)
+        except Exception as e:
+            print(f"Error computing AI scores for user {referred_dater_id}: {e}")
+            return {user_id: None for user_id in user_ids}
+        return {
+            user_id: 0.0 if score is None or math.isnan(score) else round(float(score), 2)
+            for user_id, score in scores.items()
+        }
+
+    def serialize(user_ids):
+        # Card columns, images and AI scores are batch-loaded per page/chunk
+        users = load_users_in_order(user_ids, CARD_LOAD_OPTIONS)
+        ai_scores = ai_scores_for(user_ids)
+        user_dicts = serialize_cards(users)
+        for user, user_dict in zip(users, user_dicts):
+            user_dict.update(candidate_match_fields(feed_state['match_meta'], user.id))
+            if matchmaker_view:
+                user_dict['ai_score'] = ai_scores.get(user.id)
+        return user_dicts
+
+    # Paginated mode: ?limit=20&cursor=<next_cursor>; only the page is loaded and serialized
+    if 'limit' in request.args or 'cursor' in request.args:
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        if not limit or limit < 1:
+            return jsonify({'message': 'limit must be a positive integer'}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+
+        after = None
+        cursor = request.args.get('cursor')
+        if cursor:
             try:
-                ai_score = get_conversation_similarity(referred_dater_id, user.id)
-                if ai_score is None or math.isnan(ai_score):
-                    user_dict['ai_score'] = 0.0
-                else:
-                    user_dict['ai_score'] = round(float(ai_score), 2)
-            except Exception as e:
-                print(f"Error computing AI score for users {referred_dater_id} and {user.id}: {e}")
-                user_dict['ai_score'] = None
-        users_data.append(user_dict)
-    return jsonify(users_data)
+                after = decode_feed_cursor(cursor)
+            except ValueError:
+                return jsonify({'message': 'Invalid cursor'}), 400
+
+        page_ids, next_key = paginate_candidate_ids(eligible_ids, feed_state['skipped_ids'], after, limit)
+        return jsonify({
+            'users': serialize(page_ids),
+            'next_cursor': encode_feed_cursor(next_key) if next_key else None
+        })
+
+    # Full feed: stream the JSON array chunk by chunk instead of building it in memory
+    def generate():
+        yield '['
+        first = True
+        for start in range(0, len(eligible_ids), LOAD_CHUNK_SIZE):
+            for user_dict in serialize(eligible_ids[start:start + LOAD_CHUNK_SIZE]):
+                yield ('' if first else ',') + current_app.json.dumps(user_dict)
+                first = False
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+@match_bp.route('/similar_style', methods=['GET'])
+@identity_required
+def get_similar_style_candidates(current_user):
+    """Top-K eligible candidates whose conversation style is closest to the matchmaker's dater."""
+    if current_user.role != 'matchmaker':
+        return jsonify({'message': 'Only matchmakers can request style recommendations.'}), 403
+    if not current_user.referred_by_id:
+        return jsonify({'message': 'Matchmaker has no linked dater.'}), 403
+
+    dater = User.query.get(current_user.referred_by_id)
+    if not dater:
+        return jsonify({'message': 'Dater not found'}), 404
+
+    k = request.args.get('k', DEFAULT_PAGE_SIZE, type=int)
+    if not k or k < 1:
+        return jsonify({'message': 'k must be a positive integer'}), 400
+    k = min(k, MAX_PAGE_SIZE)
+    nprobe = request.args.get('nprobe', DEFAULT_NPROBE, type=int) or DEFAULT_NPROBE
+
+    # Same eligibility rules as the feed, applied before the similarity search
+    feed_state = load_feed_state(dater, matchmaker_view=True)
+    eligible_ids = eligible_candidate_ids(dater, feed_state)
+
+    try:
+        query = get_user_embedding(dater.id)
+    except Exception as e:
+        print(f"Error computing embedding for user {dater.id}: {e}")
+        return jsonify({'message': 'Could not compute conversation style'}), 503
+
+    index = get_style_index()
+    if index is not None and index.meta.get('model') == get_embedding_provider().model:
+        results = index.search(query, k=k, nprobe=nprobe, allowed_ids=eligible_ids)
+    else:
+        # No index built yet: exact scan over the eligible users' stored vectors
+        results = exact_style_search(query, eligible_ids, k=k)
+
+    scores = dict(results)
+    users = load_users_in_order([user_id for user_id, _ in results], CARD_LOAD_OPTIONS)
+    user_dicts = serialize_cards(users)
+    for user, user_dict in zip(users, user_dicts):
+        user_dict.update(candidate_match_fields(feed_state['match_meta'], user.id))
+        user_dict['ai_score'] = round(scores[user.id], 2)
+    return jsonify(user_dicts)
 
 @match_bp.route('/blind_match', methods=['POST'])
 @token_required
@@ -289,27 +219,16 @@ def blind_match(current_user):
             new_match.liked_by.append(liked_user)
         db.session.add(new_match)
 
-    db.session.commit()
-    
-    # Send push notifications to both users about the new match
-    try:
-        # Get user names for notifications
-        referred_dater = User.query.get(referred_dater_id)
-        liked_user = User.query.get(liked_user_id)
-        
-        if referred_dater and liked_user:
-            # Notify the referred dater
-            other_name = liked_user.first_name or 'Someone'
-            send_match_notification(referred_dater_id, new_match.id if not existing_match else existing_match.id, other_name)
-            
-            # Notify the liked user
-            other_name = referred_dater.first_name or 'Someone'
-            send_match_notification(liked_user_id, new_match.id if not existing_match else existing_match.id, other_name)
-    except Exception as e:
-        # Log error but don't fail the request
-        print(f"Error sending match notifications: {e}")
-    
     match_obj = existing_match if existing_match else new_match
+    # Push notifications to both users about the new match, sent after commit
+    if referred_dater and liked_user:
+        db.session.flush()  # assign match_obj.id
+        queue_match_notification(referred_dater_id, match_obj.id, liked_user_id)
+        queue_match_notification(liked_user_id, match_obj.id, referred_dater_id)
+
+    db.session.commit()
+    publish_match_update(match_obj)
+
     return jsonify({'message': 'Blind match created successfully', 'match': match_obj.to_dict()}), 201
 
 
@@ -376,29 +295,15 @@ def like_user(current_user):
                 existing_match.status = 'matched'
                 print(f"Match between User {existing_match.user_id_1} and User {existing_match.user_id_2} is now mutual!") 
 
+        # Push notifications when match becomes mutual or pending_approval, sent after commit
+        if existing_match.user_id_1 in liked_ids and existing_match.user_id_2 in liked_ids:
+            queue_match_notification(existing_match.user_id_1, existing_match.id, existing_match.user_id_2)
+            queue_match_notification(existing_match.user_id_2, existing_match.id, existing_match.user_id_1)
+
         db.session.add(existing_match)
         db.session.commit()
-        
-        # Send push notifications when match becomes mutual or pending_approval
-        if existing_match.user_id_1 in liked_ids and existing_match.user_id_2 in liked_ids:
-            try:
-                from app.services.notification_service import send_match_notification
-                
-                user1 = User.query.get(existing_match.user_id_1)
-                user2 = User.query.get(existing_match.user_id_2)
-                
-                if user1 and user2:
-                    # Notify user1
-                    other_name = user2.first_name or 'Someone'
-                    send_match_notification(existing_match.user_id_1, existing_match.id, other_name)
-                    
-                    # Notify user2
-                    other_name = user1.first_name or 'Someone'
-                    send_match_notification(existing_match.user_id_2, existing_match.id, other_name)
-            except Exception as e:
-                # Log error but don't fail the request
-                print(f"Error sending match notifications: {e}")
-        
+        publish_match_update(existing_match)
+
         return jsonify({'message': 'Like processed', 'match': existing_match.to_dict()}), 200
 
     # No existing match — create new pending match where user_id_1 is acting_dater_id
@@ -420,12 +325,14 @@ def like_user(current_user):
 
     db.session.add(new_match)
     db.session.commit()
+    # A one-sided like is only visible to the liker's side
+    publish_match_update(new_match, user_ids={acting_dater_id, current_user.id})
 
     print(f"New pending like created: {new_match.to_dict()}")
     return jsonify(new_match.to_dict()), 201
 
 @match_bp.route('/matches', methods=['GET'])
-@token_required
+@identity_required
 def get_mutual_matches(current_user):
     print(f"Fetching matches for User {current_user.id} or type {current_user.role}")
     matched_users = []
@@ -433,59 +340,42 @@ def get_mutual_matches(current_user):
 
     if current_user.role == 'matchmaker':
         linked_dater_id = current_user.referred_by_id
-        linked_user = User.query.get(linked_dater_id)
         if not linked_dater_id:
             return jsonify({'matched': matched_users, 'pending_approval': pending_approval_users})
         
         print(f"linked_dater: {linked_dater_id} for matchmaker {current_user.id}")
         
-        # Get approved matches
-        approved_matches = Match.query.filter(
+        # Approved and pending approval matches - only where this matchmaker is involved
+        matches = Match.query.filter(
             ((Match.user_id_1 == linked_dater_id) | (Match.user_id_2 == linked_dater_id)) &
-            (Match.status == 'matched') & 
+            (Match.status.in_(['matched', 'pending_approval'])) &
             ((Match.matched_by_user_id_1_matcher == current_user.id) | 
              (Match.matched_by_user_id_2_matcher == current_user.id))
-        ).all()
+        ).order_by(Match.id).all()
 
-        for match in approved_matches:
-            user1 = User.query.get(match.user_id_1)
-            user2 = User.query.get(match.user_id_2)
-            other_user = user1 if (user2 and user2.id == linked_dater_id) else user2
-            if not other_user:
-                other_user = user1 or user2
+        # Both participants of every match, plus the linked dater, with their images
+        users = load_match_participants(matches, extra_user_ids=[linked_dater_id])
+        linked_user = users.get(linked_dater_id)
 
-            user_dict = other_user.to_dict()
-            linked_dater_dict = linked_user.to_dict()
+        def other_user_of(match):
+            user1 = users.get(match.user_id_1)
+            user2 = users.get(match.user_id_2)
+            other_user = user1 if (user2 and user2.id == linked_dater_id) else user2
+            return other_user or user1 or user2
 
-            user_dict['first_image'] = other_user.images[0].image_url if other_user and other_user.images else None
-            linked_dater_dict['first_image'] = linked_user.images[0].image_url if linked_user.images else None
+        for match in matches:
+            if match.status != 'matched':
+                continue
             matched_users.append({
                 'match_id': match.id,
-                'match_user': user_dict,
-                'linked_dater': linked_dater_dict,
+                'match_user': match_card(other_user_of(match)),
+                'linked_dater': match_card(linked_user),
                 'blind_match': match.blind_match
             })
 
-        # Get pending approval matches - only show if this matchmaker is involved
-        pending_matches = Match.query.filter(
-            ((Match.user_id_1 == linked_dater_id) | (Match.user_id_2 == linked_dater_id)) &
-            (Match.status == 'pending_approval') & 
-            ((Match.matched_by_user_id_1_matcher == current_user.id) | 
-             (Match.matched_by_user_id_2_matcher == current_user.id))
-        ).all()
-
-        for match in pending_matches:
-            user1 = User.query.get(match.user_id_1)
-            user2 = User.query.get(match.user_id_2)
-            other_user = user1 if (user2 and user2.id == linked_dater_id) else user2
-            if not other_user:
-                other_user = user1 or user2
-
-            user_dict = other_user.to_dict()
-            linked_dater_dict = linked_user.to_dict()
-
-            user_dict['first_image'] = other_user.images[0].image_url if other_user and other_user.images else None
-            linked_dater_dict['first_image'] = linked_user.images[0].image_url if linked_user.images else None
+        for match in matches:
+            if match.status != 'pending_approval':
+                continue
             
             # Determine the correct message count for this matchmaker
             if match.matched_by_user_id_1_matcher == current_user.id:
@@ -514,8 +404,8 @@ def get_mutual_matches(current_user):
             
             pending_approval_users.append({
                 'match_id': match.id,
-                'match_user': user_dict,
-                'linked_dater': linked_dater_dict,
+                'match_user': match_card(other_user_of(match)),
+                'linked_dater': match_card(linked_user),
                 'blind_match': match.blind_match,
                 'status': match.status,
                 'message_count': message_count,
@@ -529,25 +419,27 @@ def get_mutual_matches(current_user):
         return jsonify({'matched': matched_users, 'pending_approval': pending_approval_users})
     
     elif current_user.role == 'user':
-        # Get approved matches
-        approved_matches = Match.query.filter(
+        matches = Match.query.filter(
             ((Match.user_id_1 == current_user.id) | (Match.user_id_2 == current_user.id)) &
-            (Match.status == 'matched')
-        ).all()
+            (Match.status.in_(['matched', 'pending_approval']))
+        ).order_by(Match.id).all()
+
+        users = load_match_participants(matches)
+        # Likers of pending approval matches, all in one query
+        likers = load_match_likers([match.id for match in matches if match.status == 'pending_approval'])
+
+        def other_user_of(match):
+            user2 = users.get(match.user_id_2)
+            return users.get(match.user_id_1) if (user2 and user2.id == current_user.id) else user2
 
-        for match in approved_matches:
+        for match in matches:
+            if match.status != 'matched':
+                continue
             # Determine whether both matchmakers were involved
             both_matchmakers_involved = bool(match.matched_by_user_id_1_matcher and match.matched_by_user_id_2_matcher)
             user1_matchmaker_involved = bool(match.matched_by_user_id_1_matcher)
             user2_matchmaker_involved = bool(match.matched_by_user_id_2_matcher)
 
-            user1 = User.query.get(match.user_id_1)
-            user2 = User.query.get(match.user_id_2)
-            other_user = user1 if (user2 and user2.id == current_user.id) else user2
-
-            user_dict = other_user.to_dict() if other_user else {}
-            user_dict['first_image'] = other_user.images[0].image_url if other_user and other_user.images else None
-
             # By default no linked_dater for this user's view
             linked_dater_dict = None
 
@@ -555,14 +447,14 @@ def get_mutual_matches(current_user):
             if match.matched_by_user_id_1_matcher or match.matched_by_user_id_2_matcher:
                 linked_dater_id = match.user_id_1 if match.matched_by_user_id_1_matcher else match.user_id_2
                 if linked_dater_id == current_user.id:
-                    linked = User.query.get(linked_dater_id)
-                    linked_dater_dict = linked.to_dict() if linked else None
-                    if linked and linked.images: 
-                        linked_dater_dict['first_image'] = linked.images[0].image_url
+                    linked = users.get(linked_dater_id)
+                    linked_dater_dict = linked.to_card_dict() if linked else None
+                    if linked and linked.primary_image_url:
+                        linked_dater_dict['first_image'] = linked.primary_image_url
 
             matched_users.append({
                 'match_id': match.id,
-                'match_user': user_dict,
+                'match_user': match_card(other_user_of(match)),
                 'linked_dater': linked_dater_dict,
                 'blind_match': match.blind_match,
                 'user_1_matchmaker_involved': user1_matchmaker_involved,
@@ -570,24 +462,12 @@ def get_mutual_matches(current_user):
                 'both_matchmakers_involved': both_matchmakers_involved
             })
 
-        # Get pending_approval matches - only show if current_user directly liked (is in liked_by)
-        pending_matches = Match.query.filter(
-            ((Match.user_id_1 == current_user.id) | (Match.user_id_2 == current_user.id)) &
-            (Match.status == 'pending_approval')
-        ).all()
-
-        for match in pending_matches:
-            # Only show if current_user is in liked_by (they directly liked)
-            liked_ids = {u.id for u in match.liked_by}
-            if current_user.id not in liked_ids:
+        # Pending approval matches - only show if current_user directly liked (is in liked_by)
+        for match in matches:
+            if match.status != 'pending_approval':
+                continue
+            if current_user.id not in likers.get(match.id, ()):
                 continue
-
-            user1 = User.query.get(match.user_id_1)
-            user2 = User.query.get(match.user_id_2)
-            other_user = user1 if (user2 and user2.id == current_user.id) else user2
-
-            user_dict = other_user.to_dict() if other_user else {}
-            user_dict['first_image'] = other_user.images[0].image_url if other_user and other_user.images else None
 
             # Determine whether matchmakers were involved
             both_matchmakers_involved = bool(match.matched_by_user_id_1_matcher and match.matched_by_user_id_2_matcher)
@@ -596,7 +476,7 @@ def get_mutual_matches(current_user):
 
             pending_approval_users.append({
                 'match_id': match.id,
-                'match_user': user_dict,
+                'match_user': match_card(other_user_of(match)),
                 'linked_dater': None,
                 'blind_match': match.blind_match,
                 'status': 'pending_approval',
@@ -737,6 +617,7 @@ def approve_match(current_user, match_id):
         if match.approved_by_matcher_1 and match.approved_by_matcher_2:
             match.status = 'matched'
             db.session.commit()
+            publish_match_update(match)
             return jsonify({
                 'message': 'Match approved successfully by both matchmakers.', 
                 'match_id': match.id,
@@ -745,6 +626,7 @@ def approve_match(current_user, match_id):
         else:
             # One matchmaker has approved, waiting for the other
             db.session.commit()
+            publish_match_update(match)
             return jsonify({
                 'message': 'Your approval has been recorded. Waiting for the other matchmaker to approve.', 
                 'match_id': match.id,
@@ -755,6 +637,7 @@ def approve_match(current_user, match_id):
         # Only one matchmaker involved, approve immediately
         match.status = 'matched'
         db.session.commit()
+        publish_match_update(match)
         return jsonify({
             'message': 'Match approved successfully.', 
             'match_id': match.id,
@@ -70,7 +70,10 @@ def register_token(current_user):
         ).first()
         
         if existing_token:
-            # Token already registered for this user
+            # Token already registered for this user; re-registering means the app has it again
+            if existing_token.failure_count:
+                existing_token.failure_count = 0
+                db.session.commit()
             return jsonify({
                 'message': 'Push token already registered',
                 'push_token': push_token
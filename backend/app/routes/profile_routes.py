@@ -10,6 +10,12 @@ from app.models.conversationDB import Conversation
 from app.models.quizDB import QuizResult
 from app.models.skipDB import UserSkip
 from app.models.blockDB import UserBlock
+from app.models.embeddingDB import UserEmbedding
+from app.models.notificationDB import NotificationOutbox
+from app.models.outboundMessageDB import OutboundMessage
+from app.services.explanation_cache import delete_user_explanations
+from app.services.user_serialization import CARD_LOAD_OPTIONS
+from app.services.profile_images import add_image, remove_image, reorder_images
 from flask import current_app
 from uuid import uuid4
 from app.routes.shared import token_required, calculate_age
@@ -31,9 +37,9 @@ def get_profile(current_user):
     
     referrer_data = None
     if current_user.referred_by_id:
-        referrer = User.query.get(current_user.referred_by_id)
+        referrer = User.query.options(*CARD_LOAD_OPTIONS).get(current_user.referred_by_id)
         if referrer:
-            referrer_data = referrer.to_dict()
+            referrer_data = referrer.to_card_dict()
 
     # print(f"Current user info for profile: {user_data}")
     return jsonify({
@@ -44,10 +50,10 @@ def get_profile(current_user):
 @token_required
 def get_user_basic_profile(current_user, user_id):
     # Anyone logged in can request this
-    user = User.query.get(user_id)
-    user_data = user.to_dict()
+    user = User.query.options(*CARD_LOAD_OPTIONS).get(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
+    user_data = user.to_card_dict()
 
     # Only return lightweight info (avoid exposing private fields)
     return jsonify({
@@ -157,8 +163,7 @@ def upload_image(current_user):
             return jsonify({'message': 'Failed to upload image to cloud storage'}), 500
         
         # Store the full URL in database
-        new_image = Image(user_id=current_user.id, image_url=image_url)
-        db.session.add(new_image)
+        new_image = add_image(current_user, image_url)
         db.session.commit()
         
         return jsonify(new_image.to_dict()), 201
@@ -173,8 +178,7 @@ def upload_image(current_user):
         image_file.save(file_path)
 
         image_url = f'/static/uploads/{unique_filename}'
-        new_image = Image(user_id=current_user.id, image_url=image_url)
-        db.session.add(new_image)
+        new_image = add_image(current_user, image_url)
         db.session.commit()
 
         return jsonify(new_image.to_dict()), 201
@@ -203,11 +207,28 @@ def delete_image(current_user, image_id):
         except Exception as e:
             current_app.logger.error(f"Error deleting file from filesystem: {e}")
 
-    db.session.delete(image)
+    remove_image(current_user, image)
     db.session.commit()
 
     return jsonify({'message': 'Image deleted successfully'}), 200
 
+@profile_bp.route('/reorder_images', methods=['PUT'])
+@token_required
+def reorder_profile_images(current_user):
+    data = request.get_json() or {}
+    image_ids = data.get('image_ids')
+    if not isinstance(image_ids, list) or not all(isinstance(i, int) for i in image_ids):
+        return jsonify({'message': 'image_ids must be a list of image IDs'}), 400
+
+    try:
+        images = reorder_images(current_user, image_ids)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    db.session.commit()
+
+    return jsonify({'images': [image.to_dict() for image in images]}), 200
+
 @profile_bp.route('/user/<int:user_id>/avatar', methods=['PATCH'])
 def update_avatar(user_id):
     print("Received request to update avatar")
@@ -446,8 +467,10 @@ def delete_account(current_user):
             (Message.sender_id == user_id) | (Message.receiver_id == user_id)
         ).delete()
         
-        # 3. Delete quiz results
+        # 3. Delete quiz results, the stored conversation-style embedding and cached explanations
         QuizResult.query.filter_by(user_id=user_id).delete()
+        UserEmbedding.query.filter_by(user_id=user_id).delete()
+        delete_user_explanations(user_id)
         
         # 4. Delete user skips (where user skipped others or was skipped)
         UserSkip.query.filter(
@@ -523,6 +546,11 @@ def delete_account(current_user):
         # Delete image database records
         Image.query.filter_by(user_id=user_id).delete()
         PushToken.query.filter_by(user_id=user_id).delete()
+        NotificationOutbox.query.filter_by(user_id=user_id).delete()
+        # Queued emails/SMS hold the address and a code or reset token
+        contacts = [contact for contact in (current_user.email, current_user.phone_number) if contact]
+        if contacts:
+            OutboundMessage.query.filter(OutboundMessage.recipient.in_(contacts)).delete(synchronize_session=False)
         
         # 10. Finally, delete the user account itself
         db.session.delete(current_user)
@@ -3,9 +3,10 @@ from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 from functools import wraps
 from app.models.userDB import User
+from app.services.auth_identity import load_identity
 from datetime import date
 
-def token_required(f):
+def _authenticated(f, load_user):
     @wraps(f)
     def decorated(*args, **kwargs):
         try:
@@ -17,7 +18,7 @@ def token_required(f):
                 return jsonify({'message': 'Invalid token: no user identity'}), 401
             
             # Get current user
-            current_user = User.query.get(user_id)
+            current_user = load_user(user_id)
             if not current_user:
                 return jsonify({'message': 'User not found'}), 404
                 
@@ -49,6 +50,18 @@ def token_required(f):
             
     return decorated
 
+def token_required(f):
+    """Authenticate the request and pass the caller's User row to the route."""
+    return _authenticated(f, lambda user_id: User.query.get(user_id))
+
+def identity_required(f):
+    """
+    Authenticate the request and pass the caller's cached AuthIdentity (id,
+    role, referred_by_id) instead of the User row. For routes that read nothing
+    else about the caller.
+    """
+    return _authenticated(f, load_identity)
+
 def calculate_age(birthdate: date) -> int:
     today = date.today()
     age = today.year - birthdate.year - (
@@ -2,12 +2,40 @@
 from openai import OpenAI
 import numpy as np
 from app.models.messageDB import Message
+from app.services.embedding_store import (
+    load_embeddings,
+    load_vectors,
+    count_new_messages,
+    needs_refresh,
+    save_embeddings,
+    find_stale_user_ids
+)
+from app.services.embedding_providers import (
+    DEFAULT_OPENAI_MODEL,
+    DEFAULT_DIMENSION,
+    get_embedding_provider
+)
+from app.services.vector_file import get_vector_file
+from app.services.explanation_cache import (
+    message_watermarks,
+    get_cached_explanation,
+    store_explanation
+)
 from sqlalchemy import or_
 import os
 import dotenv
 from dotenv import load_dotenv
 load_dotenv()
 
+EXPLANATION_MODEL = "gpt-4o-mini"  # or "gpt-4o" for higher quality
+EMBEDDING_MODEL = DEFAULT_OPENAI_MODEL
+EMBEDDING_DIMENSION = DEFAULT_DIMENSION
+# Texts per embeddings request
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+# When false (refresh-embeddings worker deployed), requests reuse stale vectors
+# and only compute embeddings for users that have none
+EMBEDDING_INLINE_REFRESH = os.getenv('EMBEDDING_INLINE_REFRESH', 'true').lower() in ('true', '1', 'yes')
+
 # Lazy initialization - only create client when needed
 _client = None
 
@@ -22,31 +50,53 @@ def get_openai_client():
     return _client
 
 
-def get_user_conversation_text(user_id: int, limit: int = 100) -> str:
+def get_user_recent_messages(user_id: int, limit: int = 100) -> list:
     """
-    Concatenates the most recent messages from a user for style analysis.
+    Returns the most recent messages sent by a user, newest first.
     """
-    messages = Message.query.filter(
+    return Message.query.filter(
         Message.sender_id == user_id
     ).order_by(Message.timestamp.desc()).limit(limit).all()
 
+
+def get_user_conversation_text(user_id: int, limit: int = 100) -> str:
+    """
+    Concatenates the most recent messages from a user for style analysis.
+    """
+    messages = get_user_recent_messages(user_id, limit)
+
     return " ".join([m.text for m in messages if m and m.text])
 
 
 def get_embedding(text: str) -> list:
     """
-    Calls OpenAI embeddings API and returns a vector.
+    Calls the embedding provider (OpenAI by default) and returns a vector.
     """
-    if not text.strip():
-        return [0] * 1536  # empty vector
+    return get_embeddings([text])[0]
 
-    client = get_openai_client()
-    response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
 
-    return response.data[0].embedding
+def get_embeddings(texts, batch_size: int = None) -> list:
+    """
+    Embeds many texts with one provider request per batch.
+    Empty texts get a zero vector without an API call.
+    """
+    provider = get_embedding_provider()
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+
+    vectors = [None] * len(texts)
+    pending = []
+    for index, text in enumerate(texts):
+        if text and text.strip():
+            pending.append(index)
+        else:
+            vectors[index] = [0] * provider.dimension  # empty vector
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        for index, vector in zip(batch, provider.embed([texts[i] for i in batch])):
+            vectors[index] = vector
+
+    return vectors
 
 def cosine_similarity(vec1, vec2):
     norm1 = np.linalg.norm(vec1)
@@ -55,22 +105,193 @@ def cosine_similarity(vec1, vec2):
         return 0.0  # no similarity if one user has no messages
     return float(np.dot(vec1, vec2) / (norm1 * norm2))
 
+def _compute_embeddings(user_ids, batch_size: int = None):
+    """
+    Embed the recent messages of several users with batched provider calls.
+
+    Returns:
+        ({user_id: embedding}, entries for save_embeddings)
+    """
+    provider = get_embedding_provider()
+    user_ids = list(dict.fromkeys(user_ids))
+
+    watermarks = {}
+    texts = []
+    for user_id in user_ids:
+        messages = get_user_recent_messages(user_id)
+        texts.append(" ".join([m.text for m in messages if m and m.text]))
+        watermarks[user_id] = (max((m.id for m in messages), default=None), len(messages))
+
+    vectors = get_embeddings(texts, batch_size=batch_size)
+
+    embeddings = {}
+    entries = []
+    for user_id, vector in zip(user_ids, vectors):
+        embeddings[user_id] = np.asarray(vector, dtype=np.float32)
+        last_message_id, message_count = watermarks[user_id]
+        entries.append({
+            'user_id': user_id,
+            'vector': embeddings[user_id],
+            'model': provider.model,
+            'last_message_id': last_message_id,
+            'message_count': message_count,
+        })
+    return embeddings, entries
+
+
+def refresh_user_embeddings(user_ids, batch_size: int = None) -> dict:
+    """
+    Recomputes conversation-style embeddings for several users with batched
+    provider calls and stores each with the watermark of the newest message it covers.
+
+    Returns:
+        {user_id: embedding}
+    """
+    embeddings, entries = _compute_embeddings(user_ids, batch_size=batch_size)
+    save_embeddings(entries)
+    return embeddings
+
+
+def refresh_user_embedding(user_id: int) -> np.ndarray:
+    """
+    Recomputes and stores a single user's conversation-style embedding.
+    """
+    return refresh_user_embeddings([user_id])[user_id]
+
+
+def refresh_stale_embeddings(limit: int = None, batch_size: int = None) -> int:
+    """
+    Finds users whose messages changed since their stored embedding and
+    recomputes them. Used by the refresh-embeddings worker.
+
+    Returns:
+        Number of users whose new embedding was stored (0 if saving failed)
+    """
+    provider = get_embedding_provider()
+    stale_ids = find_stale_user_ids(provider.model, provider.dimension, limit=limit)
+    if not stale_ids:
+        return 0
+    _, entries = _compute_embeddings(stale_ids, batch_size=batch_size)
+    return len(entries) if save_embeddings(entries) else 0
+
+
+def get_user_embeddings(user_ids, refresh_stale: bool = None) -> dict:
+    """
+    Returns {user_id: embedding} using stored vectors where they are still fresh.
+
+    Freshness for the whole batch is checked with two queries; users without
+    a usable stored vector are recomputed together in batched provider calls.
+    With refresh_stale=False (default when EMBEDDING_INLINE_REFRESH is off)
+    stale vectors are returned as-is and left to the background worker.
+    """
+    provider = get_embedding_provider()
+    if refresh_stale is None:
+        refresh_stale = EMBEDDING_INLINE_REFRESH
+
+    user_ids = list(dict.fromkeys(user_ids))
+    stored = load_embeddings(user_ids, with_vectors=False)
+    new_counts = count_new_messages(list(stored)) if refresh_stale else {}
+
+    reuse = {}
+    to_refresh = []
+    for user_id in user_ids:
+        row = stored.get(user_id)
+        if row is not None and row.model == provider.model and not refresh_stale:
+            reuse[user_id] = row
+        elif needs_refresh(row, new_counts.get(user_id, 0), provider.model, provider.dimension):
+            to_refresh.append(user_id)
+        else:
+            reuse[user_id] = row
+
+    embeddings = load_stored_vectors(reuse)
+    if to_refresh:
+        embeddings.update(refresh_user_embeddings(to_refresh))
+    return embeddings
+
+
+def load_stored_vectors(rows) -> dict:
+    """
+    Vectors for stored embedding rows ({user_id: UserEmbedding}).
+
+    Read from the memory-mapped vector file when it holds the same version
+    (model and message watermark); anything newer comes from the database.
+    """
+    if not rows:
+        return {}
+    vectors = {}
+    vector_file = get_vector_file()
+    if vector_file is not None:
+        current = {user_id: row for user_id, row in rows.items() if row.model == vector_file.model}
+        vectors = vector_file.lookup(
+            current, {user_id: row.last_message_id for user_id, row in current.items()}
+        )
+    missing = [user_id for user_id in rows if user_id not in vectors]
+    if missing:
+        vectors.update(load_vectors(missing))
+    return vectors
+
+
+def get_user_embedding(user_id: int) -> np.ndarray:
+    """
+    Returns a single user's conversation-style embedding (stored or refreshed).
+    """
+    return get_user_embeddings([user_id])[user_id]
+
+
 def get_conversation_similarity(user_a_id: int, user_b_id: int) -> float:
     """
     Returns cosine similarity (0–1) of conversation styles.
     """
-    text_a = get_user_conversation_text(user_a_id)
-    text_b = get_user_conversation_text(user_b_id)
+    embeddings = get_user_embeddings([user_a_id, user_b_id])
 
-    embedding_a = get_embedding(text_a)
-    embedding_b = get_embedding(text_b)
+    return cosine_similarity(embeddings[user_a_id], embeddings[user_b_id])
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Stacks vectors into a float32 matrix with unit-length rows.
+    All-zero rows (users with no messages) stay zero so they score 0.
+    """
+    matrix = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))[:, None]
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
 
-    return cosine_similarity(embedding_a, embedding_b)
 
-def explain_conversation_similarity(user_a_id: int, user_b_id: int) -> str:
+def score_candidates(dater_id: int, candidate_ids) -> dict:
+    """
+    Conversation-style similarity between one dater and many candidates.
+
+    Vectors are loaded in one batch, normalized into a matrix and scored with a
+    single matrix-vector product instead of one cosine_similarity call each.
+
+    Returns:
+        {candidate_id: similarity} with the same values cosine_similarity gives
+    """
+    candidate_ids = list(dict.fromkeys(candidate_ids))
+    if not candidate_ids:
+        return {}
+
+    embeddings = get_user_embeddings([dater_id] + candidate_ids)
+    dater_vector = normalize_rows(embeddings[dater_id])[0]
+    candidate_matrix = normalize_rows([embeddings[user_id] for user_id in candidate_ids])
+
+    scores = candidate_matrix @ dater_vector
+    return dict(zip(candidate_ids, scores.tolist()))
+
+
+def explain_conversation_similarity(user_a_id: int, user_b_id: int, use_cache: bool = True) -> str:
     """
     Uses GPT to explain why two users have a certain conversation similarity score.
+
+    Explanations are cached per user pair until either user sends a new
+    message; use_cache=False forces a fresh one (which replaces the cached copy).
     """
+    watermarks = message_watermarks([user_a_id, user_b_id])
+    if use_cache:
+        cached = get_cached_explanation(user_a_id, user_b_id, watermarks, EXPLANATION_MODEL)
+        if cached is not None:
+            return cached
+
     text_a = get_user_conversation_text(user_a_id)
     text_b = get_user_conversation_text(user_b_id)
 
@@ -98,11 +319,13 @@ def explain_conversation_similarity(user_a_id: int, user_b_id: int) -> str:
 
     client = get_openai_client()
     response = client.chat.completions.create(
-        model="gpt-4o-mini",  # or "gpt-4o" for higher quality 
+        model=EXPLANATION_MODEL,
         messages=[
             {"role": "system", "content": "You are a helpful conversation analyst."},
             {"role": "user", "content": prompt}
         ]
     )
 
-    return response.choices[0].message.content
+    explanation = response.choices[0].message.content
+    store_explanation(user_a_id, user_b_id, watermarks, EXPLANATION_MODEL, similarity_score, explanation)
+    return explanation
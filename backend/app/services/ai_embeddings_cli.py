@@ -1,15 +1,101 @@
+import time
 import click
-from .ai_embeddings import get_conversation_similarity, explain_conversation_similarity
+from app import db
+from .ai_embeddings import (
+    get_conversation_similarity,
+    explain_conversation_similarity,
+    refresh_stale_embeddings
+)
+from .embedding_providers import (
+    FakeEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+    get_embedding_provider,
+    set_embedding_provider
+)
+from .style_index import build_style_index, style_index_dir
+from .vector_file import VECTOR_FORMATS, DEFAULT_VECTOR_FORMAT, export_vector_file, vector_file_dir
 
 def register_commands(app):
     @app.cli.command("analyze-conversation")
     @click.argument("user_a_id", type=int)
     @click.argument("user_b_id", type=int)
-    def analyze_conversation(user_a_id, user_b_id):
+    @click.option("--no-cache", is_flag=True, default=False,
+                  help="Ignore any cached explanation and ask the model again.")
+    def analyze_conversation(user_a_id, user_b_id, no_cache):
         """Analyze conversation similarity between two users."""
         # Flask app context is automatically available
         similarity = get_conversation_similarity(user_a_id, user_b_id)
-        explanation = explain_conversation_similarity(user_a_id, user_b_id)
+        explanation = explain_conversation_similarity(user_a_id, user_b_id, use_cache=not no_cache)
 
         click.echo(f"Similarity score: {similarity:.2f}")
         click.echo(f"Explanation:\n{explanation}")
+
+    @app.cli.command("refresh-embeddings")
+    @click.option("--loop/--once", default=False, show_default=True,
+                  help="Keep polling for stale embeddings instead of exiting after one pass.")
+    @click.option("--interval", default=60, show_default=True, type=int,
+                  help="Seconds to sleep between passes when looping.")
+    @click.option("--batch-size", default=None, type=int,
+                  help="Texts per embeddings request (default EMBEDDING_BATCH_SIZE).")
+    @click.option("--limit", default=500, show_default=True, type=int,
+                  help="Maximum users refreshed per pass.")
+    @click.option("--provider", type=click.Choice(["openai", "fake"]), default=None,
+                  help="Override EMBEDDING_PROVIDER for this run.")
+    @click.option("--export-vectors", is_flag=True, default=False,
+                  help="Rewrite the memory-mapped vector file after each pass that changed anything.")
+    def refresh_embeddings(loop, interval, batch_size, limit, provider, export_vectors):
+        """Recompute conversation-style embeddings for users with new messages."""
+        if provider == "fake":
+            set_embedding_provider(FakeEmbeddingProvider())
+        elif provider == "openai":
+            set_embedding_provider(OpenAIEmbeddingProvider())
+
+        while True:
+            # Drain the backlog before sleeping
+            total = 0
+            try:
+                while True:
+                    refreshed = refresh_stale_embeddings(limit=limit, batch_size=batch_size)
+                    total += refreshed
+                    # A pass that stored nothing (e.g. the save failed) returns 0, so this
+                    # cannot spin on the same stale users
+                    if refreshed < limit:
+                        break
+                click.echo(f"Refreshed {total} embeddings")
+                if export_vectors and total:
+                    active = get_embedding_provider()
+                    exported = export_vector_file(active.model, active.dimension)
+                    click.echo(f"Exported {exported} vectors to {vector_file_dir()}")
+            except Exception as e:
+                # Provider outages must not kill the --loop worker; try again next pass
+                db.session.rollback()
+                click.echo(f"Error refreshing embeddings: {e}", err=True)
+                if not loop:
+                    raise
+
+            if not loop:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("build-style-index")
+    @click.option("--lists", "n_lists", default=None, type=int,
+                  help="Number of IVF lists (default ~sqrt of the user count).")
+    @click.option("--iterations", default=10, show_default=True, type=int,
+                  help="k-means iterations.")
+    def build_style_index_command(n_lists, iterations):
+        """Build the nearest-neighbour index used for conversation-style recommendations."""
+        provider = get_embedding_provider()
+        index = build_style_index(provider.model, provider.dimension, n_lists=n_lists, iterations=iterations)
+        if index is None:
+            click.echo(f"No stored {provider.model} embeddings to index; run refresh-embeddings first")
+            return
+        click.echo(f"Indexed {len(index)} users in {index.meta['lists']} lists at {style_index_dir()}")
+
+    @app.cli.command("export-embedding-vectors")
+    @click.option("--format", "fmt", type=click.Choice(VECTOR_FORMATS), default=DEFAULT_VECTOR_FORMAT,
+                  show_default=True, help="Storage format of the exported vectors.")
+    def export_embedding_vectors(fmt):
+        """Export stored embeddings to the compact memory-mapped vector file."""
+        provider = get_embedding_provider()
+        exported = export_vector_file(provider.model, provider.dimension, fmt)
+        click.echo(f"Exported {exported} {fmt} vectors to {vector_file_dir()}")
@@ -0,0 +1,93 @@
+# backend/app/services/auth_identity.py
+"""
+Cached identities for authenticated requests.
+
+Most polling routes (chat history, the event stream, the match list and the
+feed) only need the caller's ID, role and matchmaker link. identity_required
+hands them an AuthIdentity read from a per-worker LRU/TTL cache instead of
+loading the User row on every request.
+
+Any flushed change to a User (profile update, linking, account switch,
+deletion) drops its entry in this worker when the transaction commits;
+other workers pick the change up within AUTH_IDENTITY_CACHE_TTL seconds.
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models.userDB import User
+from app.services.ttl_cache import TTLCache
+
+AUTH_IDENTITY_CACHE_SIZE = int(os.getenv('AUTH_IDENTITY_CACHE_SIZE', '10000'))
+AUTH_IDENTITY_CACHE_TTL = int(os.getenv('AUTH_IDENTITY_CACHE_TTL', '60'))
+
+_identities = TTLCache(maxsize=AUTH_IDENTITY_CACHE_SIZE, ttl=AUTH_IDENTITY_CACHE_TTL)
+# session.info key: IDs of users changed in the current transaction
+_STALE_KEY = 'auth_identity_stale'
+
+
+class AuthIdentity:
+    """The fields of a User that authorization checks read."""
+
+    __slots__ = ('id', 'role', 'referred_by_id')
+
+    def __init__(self, id, role, referred_by_id):
+        self.id = id
+        self.role = role
+        self.referred_by_id = referred_by_id
+
+    def __repr__(self):
+        return f"<AuthIdentity {self.id} {self.role}>"
+
+
+def load_identity(user_id):
+    """
+    Identity of a user, from the cache or one narrow query.
+
+    Returns:
+        AuthIdentity, or None if the user does not exist
+    """
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    identity = _identities.get(user_id)
+    if identity is not None:
+        return identity
+    row = db.session.query(User.id, User.role, User.referred_by_id).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    identity = AuthIdentity(row.id, row.role, row.referred_by_id)
+    _identities.set(user_id, identity)
+    return identity
+
+
+def invalidate_identity(user_id):
+    """Drop a user's cached identity in this worker."""
+    _identities.pop(int(user_id), None)
+
+
+def clear_identities():
+    _identities.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault(_STALE_KEY, set()).update(changed)
+        # Also drop them now so this transaction's own requests don't reuse the old values
+        for user_id in changed:
+            invalidate_identity(user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    # Again after commit: another request may have cached the pre-commit row meanwhile
+    for user_id in session.info.pop(_STALE_KEY, ()):
+        invalidate_identity(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(_STALE_KEY, None)
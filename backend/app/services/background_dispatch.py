@@ -0,0 +1,68 @@
+# backend/app/services/background_dispatch.py
+"""Background thread that drains an outbox table inside the API process."""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """
+    Runs drain() on a single background thread whenever kick() is called.
+
+    drain() is called inside an app context and returns when it next needs to
+    run (a datetime, e.g. the earliest retry) or None; a timer kicks it again
+    then. Kicks that arrive while a run is queued are merged.
+    """
+
+    def __init__(self, name, drain, error_delay_seconds):
+        self.name = name
+        self.drain = drain
+        self.error_delay = timedelta(seconds=error_delay_seconds)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = False
+        self._timer = None
+
+    def kick(self, app):
+        with self._lock:
+            if self._queued:
+                return
+            self._queued = True
+        self._executor.submit(self._run, app)
+
+    def _run(self, app):
+        with self._lock:
+            self._queued = False
+        with app.app_context():
+            try:
+                due = self.drain()
+            except Exception as e:
+                logger.error(f"Error in {self.name}: {e}")
+                db.session.rollback()
+                due = datetime.utcnow() + self.error_delay
+            finally:
+                db.session.remove()
+        if due is not None:
+            self._schedule(app, max((due - datetime.utcnow()).total_seconds(), 1))
+
+    def _schedule(self, app, delay):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(delay, self.kick, args=(app,))
+            self._timer.daemon = True
+            self._timer.start()
+
+
+def kick_after_commit(dispatcher):
+    """Kick dispatcher for the current app; a no-op outside an app context."""
+    from flask import current_app
+    try:
+        dispatcher.kick(current_app._get_current_object())
+    except RuntimeError:
+        # Committed outside an app context; a worker or the next commit picks the rows up
+        pass
@@ -0,0 +1,984 @@
+# backend/app/services/benchmark_cli.py
+"""
+Benchmark commands for the hot paths of the API.
+
+Each benchmark builds a throwaway app backed by an in-memory SQLite database,
+seeds synthetic users and measures query counts / timings, so they can be run
+anywhere without touching the configured database.
+"""
+import contextlib
+import io
+import json
+import random
+import time
+import click
+from sqlalchemy import event
+from app import db
+
+
+class QueryCounter:
+    """Context manager counting SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        return False
+
+
+def make_benchmark_app():
+    """Create an app bound to a fresh in-memory database with all tables created."""
+    from app import create_app
+    from app.services.auth_identity import clear_identities
+    from app.services.geocoding import clear_place_cache
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with app.app_context():
+        db.create_all()
+    # User IDs restart at 1 in every fresh database, and per-worker caches must not outlive it
+    clear_identities()
+    clear_place_cache()
+    return app
+
+
+def seed_feed_population(candidate_count, seed=42):
+    """
+    Seed one dater plus candidate_count nearby candidates, with a mix of
+    matches, pending likes, skips and blocks.
+
+    Returns:
+        The acting dater (User)
+    """
+    from app.models.userDB import User
+    from app.models.matchDB import Match
+    from app.models.skipDB import UserSkip
+    from app.models.blockDB import UserBlock
+
+    rng = random.Random(seed)
+
+    dater = User(email='dater@example.com', role='user', first_name='Dater')
+    dater.password_hash = 'benchmark'
+    dater.age = 30
+    dater.gender = 'female'
+    dater.preferredAgeMin = 18
+    dater.preferredAgeMax = 60
+    dater.preferredGenders = ['male', 'female']
+    dater.latitude = 40.7128
+    dater.longitude = -74.0060
+    dater.match_radius = 100
+    db.session.add(dater)
+
+    candidates = []
+    for i in range(candidate_count):
+        user = User(email=f'candidate{i}@example.com', role='user', first_name=f'Candidate{i}')
+        user.password_hash = 'benchmark'
+        user.age = rng.randint(20, 55)
+        user.gender = rng.choice(['male', 'female'])
+        user.preferredAgeMin = 18
+        user.preferredAgeMax = 60
+        user.preferredGenders = ['male', 'female']
+        user.latitude = dater.latitude + rng.uniform(-1.0, 1.0)
+        user.longitude = dater.longitude + rng.uniform(-1.0, 1.0)
+        user.match_radius = rng.choice([25, 50, 100])
+        candidates.append(user)
+    db.session.add_all(candidates)
+    db.session.flush()
+
+    for i, user in enumerate(candidates):
+        if i % 10 == 0:
+            match = Match(user_id_1=dater.id, user_id_2=user.id, status='matched')
+            match.liked_by.extend([dater, user])
+            db.session.add(match)
+        elif i % 7 == 0:
+            match = Match(user_id_1=dater.id, user_id_2=user.id, status='pending')
+            match.liked_by.append(dater)
+            db.session.add(match)
+        elif i % 11 == 0:
+            match = Match(user_id_1=user.id, user_id_2=dater.id, status='pending', note='Hi there')
+            match.liked_by.append(user)
+            db.session.add(match)
+        if i % 5 == 0:
+            db.session.add(UserSkip(user_id=dater.id, skipped_user_id=user.id))
+        if i % 13 == 0:
+            db.session.add(UserBlock(blocker_id=user.id, blocked_id=dater.id))
+
+    db.session.commit()
+    return dater
+
+
+# (latitude, longitude) of metro areas used to spread synthetic users
+METROS = [
+    (40.7128, -74.0060), (34.0522, -118.2437), (41.8781, -87.6298), (29.7604, -95.3698),
+    (33.4484, -112.0740), (39.9526, -75.1652), (32.7157, -117.1611), (47.6062, -122.3321),
+    (25.7617, -80.1918), (39.7392, -104.9903), (42.3601, -71.0589), (38.9072, -77.0369),
+]
+
+
+def seed_metro_population(user_count, seed=42):
+    """
+    Bulk-insert user_count daters spread across METROS (~30 miles around each
+    center). Bulk inserts skip mapper events, so geo_cell is computed here.
+    """
+    from app.models.userDB import User
+    from app.services.geo_index import compute_geo_cell
+
+    rng = random.Random(seed)
+    rows = []
+    for i in range(user_count):
+        center_lat, center_lon = rng.choice(METROS)
+        latitude = center_lat + rng.uniform(-0.45, 0.45)
+        longitude = center_lon + rng.uniform(-0.55, 0.55)
+        rows.append({
+            'email': f'metro{i}@example.com',
+            'password_hash': 'benchmark',
+            'role': 'user',
+            'age': rng.randint(20, 55),
+            'gender': rng.choice(['male', 'female']),
+            'latitude': latitude,
+            'longitude': longitude,
+            'geo_cell': compute_geo_cell(latitude, longitude),
+            'match_radius': rng.choice([10, 25, 50]),
+            'preferredAgeMin': rng.randint(18, 30),
+            'preferredAgeMax': rng.randint(30, 60),
+            'preferredGenders': rng.choice([['male'], ['female'], ['male', 'female'], None]),
+            'show_location': False,
+            'unit': 'Imperial',
+            'notifications_enabled': False,
+            'email_verified': False,
+            'phone_verified': False,
+        })
+    db.session.execute(User.__table__.insert(), rows)
+    db.session.commit()
+
+
+def seed_serialization_population(user_count, seed=42):
+    """
+    Seed user_count daters with images plus matchmakers linked to some of
+    them, so every branch of User.to_dict() has related rows to load.
+
+    Returns:
+        list of user IDs (daters and matchmakers)
+    """
+    from app.models.userDB import User, ReferredUsers
+    from app.services.profile_images import add_image
+
+    rng = random.Random(seed)
+    daters = []
+    for i in range(user_count):
+        user = User(email=f'serialize{i}@example.com', role='user', first_name=f'User{i}')
+        user.password_hash = 'benchmark'
+        user.age = rng.randint(20, 55)
+        daters.append(user)
+    db.session.add_all(daters)
+    db.session.flush()
+
+    for user in daters:
+        for n in range(rng.randint(0, 3)):
+            add_image(user, f'/images/{user.id}/{n}.jpg')
+
+    # Every fourth dater has a matchmaker; the after_insert hook creates its referral row
+    matchmakers = []
+    for user in daters[::4]:
+        matchmaker = User(email=f'mm{user.id}@example.com', role='matchmaker',
+                          first_name=f'Matchmaker{user.id}', referred_by_id=user.id)
+        matchmaker.password_hash = 'benchmark'
+        matchmaker.linked_account_id = user.id
+        matchmakers.append(matchmaker)
+    db.session.add_all(matchmakers)
+    db.session.flush()
+    for matchmaker in matchmakers:
+        User.query.get(matchmaker.referred_by_id).linked_account_id = matchmaker.id
+        # A second linked dater on some referral rows
+        if matchmaker.id % 2:
+            ReferredUsers.query.get(matchmaker.id).linked_dater_2_id = rng.choice(daters).id
+
+    db.session.commit()
+    return [user.id for user in daters + matchmakers]
+
+
+def seed_match_list_population(match_count, seed=42):
+    """
+    Seed a dater with match_count matches (matched and pending approval, some
+    mediated by the dater's matchmaker), partners with images.
+
+    Returns:
+        (dater_id, matchmaker_id)
+    """
+    from app.models.userDB import User
+    from app.models.matchDB import Match
+    from app.services.profile_images import add_image
+
+    rng = random.Random(seed)
+    dater = User(email='dater@example.com', role='user', first_name='Dater')
+    dater.password_hash = 'benchmark'
+    db.session.add(dater)
+    db.session.flush()
+    matchmaker = User(email='matchmaker@example.com', role='matchmaker', first_name='Matchmaker',
+                      referred_by_id=dater.id)
+    matchmaker.password_hash = 'benchmark'
+    db.session.add(matchmaker)
+    db.session.flush()
+
+    for i in range(match_count):
+        partner = User(email=f'partner{i}@example.com', role='user', first_name=f'Partner{i}')
+        partner.password_hash = 'benchmark'
+        db.session.add(partner)
+        db.session.flush()
+        for n in range(rng.randint(0, 2)):
+            add_image(partner, f'/images/{partner.id}/{n}.jpg')
+
+        status = 'matched' if i % 2 else 'pending_approval'
+        match = Match(user_id_1=dater.id, user_id_2=partner.id, status=status)
+        if i % 3:
+            match.matched_by_user_id_1_matcher = matchmaker.id
+        match.liked_by.append(partner)
+        if i % 4:
+            match.liked_by.append(dater)
+        db.session.add(match)
+
+    db.session.commit()
+    return dater.id, matchmaker.id
+
+
+def seed_notification_population(user_count, devices, seed=42):
+    """
+    Seed user_count users with notifications on and `devices` push tokens
+    each, plus one pending match notification per user (pairs of users
+    matched with each other).
+
+    Returns:
+        Number of outbox rows queued
+    """
+    from app.models.userDB import User, PushToken
+    from app.models.notificationDB import NotificationOutbox
+
+    users = []
+    for i in range(user_count):
+        user = User(email=f'notify{i}@example.com', role='user', first_name=f'User{i}')
+        user.password_hash = 'benchmark'
+        user.notifications_enabled = True
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+
+    for user in users:
+        for n in range(devices):
+            db.session.add(PushToken(user.id, f'ExponentPushToken[{user.id}-{n}]'))
+    # Rows are added directly (not through queue_match_notification) so no dispatch thread starts
+    for i, user in enumerate(users):
+        other = users[i ^ 1] if (i ^ 1) < len(users) else users[0]
+        db.session.add(NotificationOutbox(kind='match', user_id=user.id,
+                                          payload={'match_id': i // 2 + 1, 'other_user_id': other.id}))
+    db.session.commit()
+    return len(users)
+
+
+def scalar_mutual_filter(acting_user, users):
+    """Reference per-candidate loop the vectorized filter replaced (kept for benchmark-mutual-filter)."""
+    from app.routes.match_routes import haversine_distance
+
+    kept = []
+    for user in users:
+        if acting_user.latitude and acting_user.longitude and user.latitude and user.longitude:
+            distance = haversine_distance(acting_user.latitude, acting_user.longitude,
+                                          user.latitude, user.longitude)
+            if distance is None:
+                continue
+            acting_radius = acting_user.match_radius if acting_user.match_radius else 0
+            user_radius = user.match_radius if user.match_radius else 0
+            if acting_radius == 0 or user_radius == 0:
+                continue
+            if distance > acting_radius or distance > user_radius:
+                continue
+        if acting_user.preferredAgeMin and acting_user.preferredAgeMax and user.preferredAgeMin and user.preferredAgeMax:
+            if not (user.preferredAgeMin <= acting_user.age <= user.preferredAgeMax):
+                continue
+        if user.preferredGenders:
+            if not acting_user.gender or acting_user.gender not in user.preferredGenders:
+                continue
+        kept.append(user)
+    return kept
+
+
+def parse_sizes(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def register_commands(app):
+    @app.cli.command("benchmark-feed")
+    @click.option("--sizes", default="100,500,2000", show_default=True,
+                  help="Comma-separated candidate counts to benchmark.")
+    def benchmark_feed(sizes):
+        """Show that the candidate feed engine issues a flat number of queries."""
+        from app.services.candidate_feed import load_feed_state, candidate_query
+
+        results = []
+        for size in parse_sizes(sizes):
+            bench_app = make_benchmark_app()
+            with bench_app.app_context():
+                dater = seed_feed_population(size)
+                db.session.expire_all()
+
+                start = time.perf_counter()
+                with QueryCounter(db.engine) as counter:
+                    feed_state = load_feed_state(dater)
+                    users = candidate_query(dater, feed_state['excluded_ids']).all()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                results.append((size, counter.count, len(users), elapsed_ms))
+                click.echo(f"candidates={size:>6}  queries={counter.count:>3}  "
+                           f"eligible={len(users):>6}  time={elapsed_ms:8.1f} ms")
+                db.session.remove()
+
+        query_counts = {count for _, count, _, _ in results}
+        if len(query_counts) > 1:
+            raise click.ClickException(f"Query count grew with candidate count: {sorted(query_counts)}")
+        click.echo("Query count is flat across candidate counts.")
+
+    @app.cli.command("benchmark-geo")
+    @click.option("--users", "user_count", default=20000, show_default=True, type=int)
+    @click.option("--radius", default=25, show_default=True, type=int, help="Acting dater's match radius in miles.")
+    def benchmark_geo(user_count, radius):
+        """Compare candidate rows loaded with and without the geospatial pre-filter."""
+        from app.models.userDB import User
+        from app.services.candidate_feed import candidate_query
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            seed_metro_population(user_count)
+            dater = User(email='dater@example.com', role='user')
+            dater.password_hash = 'benchmark'
+            dater.age = 30
+            dater.latitude, dater.longitude = METROS[0]
+            dater.match_radius = radius
+            db.session.add(dater)
+            db.session.commit()
+
+            for label, prefilter in (("no pre-filter", False), ("geo pre-filter", True)):
+                start = time.perf_counter()
+                users = candidate_query(dater, geo_prefilter=prefilter).all()
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                click.echo(f"{label:>15}: rows loaded={len(users):>7}  time={elapsed_ms:8.1f} ms")
+                db.session.expunge_all()
+                db.session.add(dater)
+
+    @app.cli.command("benchmark-mutual-filter")
+    @click.option("--users", "user_count", default=20000, show_default=True, type=int)
+    @click.option("--repeat", default=5, show_default=True, type=int)
+    def benchmark_mutual_filter(user_count, repeat):
+        """Micro-benchmark the vectorized mutual filter against the per-candidate loop."""
+        from app.models.userDB import User
+        from app.services.candidate_feed import FILTER_COLUMNS, filter_mutual_candidates
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            seed_metro_population(user_count)
+            acting_user = User(role='user')
+            acting_user.age = 31
+            acting_user.gender = 'female'
+            acting_user.preferredAgeMin = 25
+            acting_user.preferredAgeMax = 40
+            acting_user.latitude, acting_user.longitude = METROS[0]
+            acting_user.match_radius = 50
+
+            # Same column rows the feed pipeline filters on, without the geo pre-filter
+            rows = User.query.with_entities(*FILTER_COLUMNS).order_by(User.id).all()
+
+        results = {}
+        for label, fn in (("scalar loop", scalar_mutual_filter), ("vectorized", filter_mutual_candidates)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                kept = fn(acting_user, rows)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, [row.id for row in kept])
+            click.echo(f"{label:>12}: rows={len(rows):>7}  kept={len(kept):>6}  "
+                       f"best of {repeat}={best * 1000:8.2f} ms")
+
+        if results["scalar loop"][1] != results["vectorized"][1]:
+            raise click.ClickException("Vectorized filter disagrees with the scalar loop")
+        click.echo(f"Speedup: {results['scalar loop'][0] / results['vectorized'][0]:.1f}x (identical results)")
+
+    @app.cli.command("benchmark-ai-scores")
+    @click.option("--candidates", default=500, show_default=True, type=int)
+    @click.option("--dimension", default=1536, show_default=True, type=int)
+    @click.option("--repeat", default=5, show_default=True, type=int)
+    def benchmark_ai_scores(candidates, dimension, repeat):
+        """Compare per-candidate cosine_similarity calls with one matrix-vector product.
+
+        "matrix" includes stacking and normalizing the vectors; "product only" is
+        the single BLAS call on an already normalized matrix.
+        """
+        import numpy as np
+        from app.services.ai_embeddings import cosine_similarity, normalize_rows
+
+        rng = np.random.default_rng(42)
+        dater_vector = rng.standard_normal(dimension).astype(np.float32)
+        # One array per user, as get_user_embeddings returns them
+        vectors = list(rng.standard_normal((candidates, dimension)).astype(np.float32))
+        for index in range(0, candidates, 50):
+            vectors[index] = np.zeros(dimension, dtype=np.float32)  # users without messages
+        normalized = normalize_rows(vectors)
+        dater_unit = normalize_rows(dater_vector)[0]
+
+        def pairwise():
+            return [cosine_similarity(dater_vector, vector) for vector in vectors]
+
+        def matrix():
+            return (normalize_rows(vectors) @ normalize_rows(dater_vector)[0]).tolist()
+
+        def matrix_product_only():
+            return (normalized @ dater_unit).tolist()
+
+        results = {}
+        for label, fn in (("pairwise", pairwise), ("matrix", matrix), ("product only", matrix_product_only)):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                scores = fn()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, scores)
+            click.echo(f"{label:>12}: candidates={candidates:>6}  best of {repeat}={best * 1000:8.2f} ms")
+
+        if not np.allclose(results["pairwise"][1], results["matrix"][1], atol=1e-5):
+            raise click.ClickException("Matrix scores disagree with pairwise cosine_similarity")
+        click.echo(f"Speedup: {results['pairwise'][0] / results['matrix'][0]:.1f}x (same scores)")
+
+    @app.cli.command("benchmark-style-index")
+    @click.option("--users", "user_count", default=50000, show_default=True, type=int)
+    @click.option("--dimension", default=256, show_default=True, type=int)
+    @click.option("--queries", default=50, show_default=True, type=int)
+    @click.option("--k", default=20, show_default=True, type=int)
+    @click.option("--nprobe", default=8, show_default=True, type=int)
+    def benchmark_style_index(user_count, dimension, queries, k, nprobe):
+        """Recall and latency of the IVF style index against an exact scan."""
+        import tempfile
+        import numpy as np
+        from app.services.style_index import StyleIndex, _normalize, _top_k
+
+        # Clustered synthetic "styles" so the index has structure to exploit
+        rng = np.random.default_rng(42)
+        styles = rng.standard_normal((64, dimension)).astype(np.float32)
+        vectors = styles[rng.integers(0, len(styles), user_count)]
+        vectors += 0.5 * rng.standard_normal(vectors.shape).astype(np.float32)
+        user_ids = np.arange(1, user_count + 1)
+
+        start = time.perf_counter()
+        index = StyleIndex.build(user_ids, vectors, model='benchmark')
+        build_s = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as path:
+            index.save(f"{path}/index")
+            index = StyleIndex.load(f"{path}/index")
+            click.echo(f"built {len(index)} vectors into {index.meta['lists']} lists in {build_s:.1f} s")
+
+            normalized = _normalize(vectors)
+            query_rows = rng.choice(user_count, size=queries, replace=False)
+            exact_s = ann_s = 0.0
+            hits = 0
+            for row in query_rows:
+                query = vectors[row]
+
+                start = time.perf_counter()
+                exact = _top_k(user_ids, normalized @ _normalize(query)[0], k)
+                exact_s += time.perf_counter() - start
+
+                start = time.perf_counter()
+                approximate = index.search(query, k=k, nprobe=nprobe)
+                ann_s += time.perf_counter() - start
+
+                hits += len({user_id for user_id, _ in exact} & {user_id for user_id, _ in approximate})
+
+        click.echo(f"  exact scan: {exact_s / queries * 1000:8.2f} ms/query")
+        click.echo(f"   IVF index: {ann_s / queries * 1000:8.2f} ms/query  (nprobe={nprobe})")
+        click.echo(f"recall@{k}: {hits / (queries * k):.3f}")
+
+    @app.cli.command("benchmark-vector-file")
+    @click.option("--users", "user_count", default=20000, show_default=True, type=int)
+    @click.option("--dimension", default=1536, show_default=True, type=int)
+    @click.option("--lookup", "lookup_count", default=500, show_default=True, type=int,
+                  help="Users loaded per scoring call.")
+    def benchmark_vector_file(user_count, dimension, lookup_count):
+        """Compare loading embeddings from the database with the memory-mapped vector file."""
+        import tempfile
+        import numpy as np
+        from app.models.embeddingDB import UserEmbedding
+        from app.services.embedding_store import load_vectors
+        from app.services.vector_file import VECTOR_FORMATS, VectorFile
+
+        rng = np.random.default_rng(42)
+        vectors = rng.standard_normal((user_count, dimension)).astype(np.float32)
+        user_ids = np.arange(1, user_count + 1)
+        wanted = rng.choice(user_ids, size=lookup_count, replace=False).tolist()
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            # Embedding rows only; the foreign key is not enforced by SQLite
+            db.session.execute(UserEmbedding.__table__.insert(), [
+                {'user_id': int(user_id), 'model': 'benchmark', 'dimension': dimension,
+                 'vector': UserEmbedding.pack(vector), 'message_count': 1}
+                for user_id, vector in zip(user_ids, vectors)
+            ])
+            db.session.commit()
+
+            start = time.perf_counter()
+            load_vectors(wanted)
+            click.echo(f"{'database':>9}: {(time.perf_counter() - start) * 1000:8.2f} ms for {lookup_count} users  "
+                       f"({dimension * 4} bytes/user)")
+
+        with tempfile.TemporaryDirectory() as path:
+            for fmt in VECTOR_FORMATS:
+                VectorFile.write(f"{path}/{fmt}", user_ids, vectors, [None] * user_count, 'benchmark', fmt)
+                vector_file = VectorFile.load(f"{path}/{fmt}")
+                start = time.perf_counter()
+                decoded = vector_file.lookup(wanted)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                error = max(float(np.abs(decoded[user_id] - vectors[user_id - 1]).max()) for user_id in wanted)
+                click.echo(f"{fmt:>9}: {elapsed_ms:8.2f} ms for {lookup_count} users  "
+                           f"({vector_file.vectors.itemsize * dimension} bytes/user, max error {error:.4f})")
+
+    @app.cli.command("benchmark-serialization")
+    @click.option("--sizes", default="20,100,400", show_default=True,
+                  help="Comma-separated dater counts (a matchmaker is added per four daters). "
+                       "Keep totals within one IN chunk of 500 users.")
+    def benchmark_serialization(sizes):
+        """Show that batch user serialization issues a flat number of queries and matches to_dict()."""
+        from app.models.userDB import User
+        from app.services.candidate_feed import load_users_in_order
+        from app.services.user_serialization import serialize_users, serialize_cards, CARD_LOAD_OPTIONS
+
+        query_counts = set()
+        card_query_counts = set()
+        for size in parse_sizes(sizes):
+            bench_app = make_benchmark_app()
+            with bench_app.app_context():
+                user_ids = seed_serialization_population(size)
+
+                db.session.expunge_all()
+                expected = [user.to_dict() for user in load_users_in_order(user_ids)]
+
+                db.session.expunge_all()
+                users = load_users_in_order(user_ids)
+                start = time.perf_counter()
+                with QueryCounter(db.engine) as counter:
+                    serialized = serialize_users(users)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+
+                if serialized != expected:
+                    raise click.ClickException(f"serialize_users output differs from to_dict() for {size} users")
+                query_counts.add(counter.count)
+
+                # The feed's card projection: fewer columns loaded and a smaller payload
+                db.session.expunge_all()
+                with QueryCounter(db.engine) as card_counter:
+                    cards = serialize_cards(load_users_in_order(user_ids, CARD_LOAD_OPTIONS))
+                card_query_counts.add(card_counter.count)
+                full_bytes = len(json.dumps(serialized, default=str))
+                card_bytes = len(json.dumps(cards, default=str))
+
+                click.echo(f"users={len(users):>6}  queries={counter.count:>3}  time={elapsed_ms:8.1f} ms  "
+                           f"payload full={full_bytes:>8} B  card={card_bytes:>8} B ({card_counter.count} queries)")
+                db.session.remove()
+
+        if len(query_counts) > 1:
+            raise click.ClickException(f"Query count grew with user count: {sorted(query_counts)}")
+        if len(card_query_counts) > 1:
+            raise click.ClickException(f"Card query count grew with user count: {sorted(card_query_counts)}")
+        click.echo("Query counts are flat and output matches to_dict().")
+
+    @app.cli.command("benchmark-matches")
+    @click.option("--sizes", default="10,100,300", show_default=True,
+                  help="Comma-separated match counts for one dater.")
+    def benchmark_matches(sizes):
+        """Show that GET /match/matches issues a flat number of queries for daters and matchmakers."""
+        from flask_jwt_extended import create_access_token
+
+        query_counts = {'dater': set(), 'matchmaker': set()}
+        for size in parse_sizes(sizes):
+            bench_app = make_benchmark_app()
+            with bench_app.app_context():
+                dater_id, matchmaker_id = seed_match_list_population(size)
+                tokens = {
+                    'dater': create_access_token(identity=str(dater_id)),
+                    'matchmaker': create_access_token(identity=str(matchmaker_id)),
+                }
+                db.session.remove()
+
+                client = bench_app.test_client()
+                for role, token in tokens.items():
+                    # The route prints debug lines per request; keep them out of the results
+                    with QueryCounter(db.engine) as counter, contextlib.redirect_stdout(io.StringIO()):
+                        response = client.get('/match/matches', headers={'Authorization': f'Bearer {token}'})
+                    if response.status_code != 200:
+                        raise click.ClickException(f"/match/matches returned {response.status_code} for the {role}")
+                    body = response.get_json()
+                    query_counts[role].add(counter.count)
+                    click.echo(f"matches={size:>5}  {role:>10}: queries={counter.count:>3}  "
+                               f"matched={len(body['matched']):>4}  pending={len(body['pending_approval']):>4}")
+
+        grown = {role: sorted(counts) for role, counts in query_counts.items() if len(counts) > 1}
+        if grown:
+            raise click.ClickException(f"Query count grew with match count: {grown}")
+        click.echo("Query count is flat across match counts.")
+
+    @app.cli.command("benchmark-password-hashing")
+    @click.option("--burst", default=40, show_default=True, type=int, help="Concurrent hash requests.")
+    @click.option("--rounds", default=10, show_default=True, type=int, help="bcrypt cost factor.")
+    def benchmark_password_hashing(burst, rounds):
+        """Show that a burst of password hashes is bounded by the pool: excess calls are rejected, not queued."""
+        from concurrent.futures import ThreadPoolExecutor
+        from app.services.password_hashing import (
+            MAX_PENDING, PasswordHashingBusy, hash_password, password_hashing_stats, reset_password_hashing_stats)
+
+        bench_app = make_benchmark_app()
+        bench_app.config['BCRYPT_LOG_ROUNDS'] = rounds
+
+        def attempt(i):
+            started = time.perf_counter()
+            with bench_app.app_context():
+                try:
+                    hash_password(f'password-{i}')
+                    outcome = 'hashed'
+                except PasswordHashingBusy:
+                    outcome = 'rejected'
+            return outcome, (time.perf_counter() - started) * 1000
+
+        with bench_app.app_context():
+            hash_password('warm-up')  # starts the pool processes
+        reset_password_hashing_stats()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=burst) as executor:
+            results = list(executor.map(attempt, range(burst)))
+        elapsed = (time.perf_counter() - started) * 1000
+        stats = password_hashing_stats()
+
+        hashed = [ms for outcome, ms in results if outcome == 'hashed']
+        rejected = [ms for outcome, ms in results if outcome == 'rejected']
+        click.echo(f"burst={burst}  hashed={len(hashed)}  rejected={len(rejected)}  "
+                   f"peak in flight={stats['peak_in_flight']} (limit {MAX_PENDING})  total={elapsed:.0f} ms")
+        click.echo(f"slowest hash={max(hashed, default=0):.0f} ms  slowest rejection={max(rejected, default=0):.1f} ms  "
+                   f"avg queue wait={stats['avg_wait_ms']:.0f} ms  avg bcrypt={stats['avg_hash_ms']:.0f} ms")
+        if stats['peak_in_flight'] > MAX_PENDING:
+            raise click.ClickException("More hashes were in flight than PASSWORD_HASH_MAX_PENDING")
+        if len(hashed) + len(rejected) != burst:
+            raise click.ClickException("Some hash requests neither completed nor were rejected")
+        click.echo("Hashing load is bounded; excess requests fail fast.")
+
+    @app.cli.command("benchmark-auth")
+    @click.option("--matches", default=50, show_default=True, type=int)
+    @click.option("--polls", default=20, show_default=True, type=int)
+    def benchmark_auth(matches, polls):
+        """Show that polling routes authenticate from the identity cache instead of loading the user."""
+        from flask_jwt_extended import create_access_token
+        from app.models.userDB import User
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            dater_id, matchmaker_id = seed_match_list_population(matches)
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(matchmaker_id))}'}
+            db.session.remove()
+
+            client = bench_app.test_client()
+            counts = []
+            started = time.perf_counter()
+            for _ in range(polls):
+                with QueryCounter(db.engine) as counter:
+                    response = client.get('/match/matches', headers=headers)
+                if response.status_code != 200:
+                    raise click.ClickException(f"/match/matches returned {response.status_code}")
+                counts.append(counter.count)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            # A committed change to the user must reach the next request
+            matchmaker = db.session.get(User, matchmaker_id)
+            matchmaker.referred_by_id = None
+            db.session.commit()
+            db.session.remove()
+            relinked = client.get('/match/matches', headers=headers).get_json()
+
+        cold, warm = counts[0], counts[1:]
+        click.echo(f"polls={polls}  first request queries={cold}  cached requests queries={sorted(set(warm))}  "
+                   f"time={elapsed / polls:.1f} ms/request")
+        if any(count != cold - 1 for count in warm):
+            raise click.ClickException("Cached requests should skip exactly the user lookup")
+        if relinked['matched'] or relinked['pending_approval']:
+            raise click.ClickException("Identity cache served a stale matchmaker link after commit")
+        click.echo("Authentication costs no queries once the identity is cached.")
+
+    @app.cli.command("benchmark-login")
+    @click.option("--accounts", default="1,2,6", show_default=True,
+                  help="Comma-separated numbers of accounts sharing one email and password.")
+    @click.option("--population", default=2000, show_default=True, type=int,
+                  help="Other users in the table.")
+    @click.option("--rounds", default=10, show_default=True, type=int, help="bcrypt cost factor of the seeded hashes.")
+    @click.option("--logins", default=5, show_default=True, type=int, help="Logins timed per case.")
+    def benchmark_login(accounts, population, rounds, logins):
+        """Show that POST /auth/login runs bcrypt once per request, however many accounts share the credentials."""
+        from datetime import datetime, timedelta
+        from app import bcrypt
+        from app.models.userDB import User
+        from app.services.password_hashing import password_hashing_stats, reset_password_hashing_stats
+
+        password = 'benchmark-password'
+        password_hash = bcrypt.generate_password_hash(password, rounds).decode('utf-8')
+        for account_count in parse_sizes(accounts):
+            bench_app = make_benchmark_app()
+            with bench_app.app_context():
+                others = [User(email=f'other{i}@example.com', role='user') for i in range(population)]
+                for user in others:
+                    user.password_hash = 'benchmark'
+                db.session.add_all(others)
+                # Linked accounts copy the password hash; the second one was active last
+                now = datetime.utcnow()
+                shared = []
+                for i in range(account_count):
+                    user = User(email='shared@example.com', role='matchmaker' if i % 2 else 'user')
+                    user.password_hash = password_hash
+                    user.last_active_at = now - timedelta(hours=abs(i - 1))
+                    shared.append(user)
+                db.session.add_all(shared)
+                db.session.commit()
+                expected_id = shared[min(1, account_count - 1)].id
+                db.session.remove()
+
+                client = bench_app.test_client()
+                cases = {}
+                for case, attempt, status in (('valid', password, 200), ('invalid', 'wrong-password', 401)):
+                    reset_password_hashing_stats()
+                    started = time.process_time()
+                    with QueryCounter(db.engine) as counter:
+                        for _ in range(logins):
+                            response = client.post('/auth/login', json={
+                                'email': 'shared@example.com', 'password': attempt})
+                            if response.status_code != status:
+                                raise click.ClickException(
+                                    f"{case} login returned {response.status_code}, expected {status}")
+                            if status == 200 and response.get_json()['user']['id'] != expected_id:
+                                raise click.ClickException("Login did not pick the most recently active account")
+                    cpu = (time.process_time() - started) * 1000 / logins
+                    stats = password_hashing_stats()
+                    checks = stats['operations']['verify']['completed']
+                    cases[case] = (checks / logins, counter.count / logins, cpu, stats['avg_hash_ms'])
+
+            for case, (per_login, queries, cpu, hash_ms) in cases.items():
+                click.echo(f"accounts={account_count:>3}  {case:>7}: bcrypt checks={per_login:.0f} "
+                           f"(previously {account_count})  queries={queries:.0f}  "
+                           f"request cpu={cpu:6.1f} ms  bcrypt={hash_ms:6.1f} ms/check")
+                if per_login != 1:
+                    raise click.ClickException(f"Expected one bcrypt check per {case} login, got {per_login}")
+        click.echo("Login verifies one password hash per request.")
+
+    @app.cli.command("benchmark-location-update")
+    @click.option("--users", default=60, show_default=True, type=int)
+    @click.option("--cells", default=5, show_default=True, type=int, help="Distinct ~1 km areas the users are in.")
+    @click.option("--lookup-ms", default=300, show_default=True, type=int, help="Simulated geocoder latency.")
+    def benchmark_location_update(users, cells, lookup_ms):
+        """Show that POST /location/update never waits on the geocoder and looks each area up once."""
+        from flask_jwt_extended import create_access_token
+        from app.models.userDB import User
+        from app.services.geocoding import FakeGeocoder, pending_place_lookups, set_geocoder
+
+        geocoder = FakeGeocoder(delay=lookup_ms / 1000)
+        set_geocoder(geocoder)
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            seeded = [User(email=f'located{i}@example.com', role='user') for i in range(users)]
+            for user in seeded:
+                user.password_hash = 'benchmark'
+            db.session.add_all(seeded)
+            db.session.commit()
+            user_ids = [user.id for user in seeded]
+            headers = {user_id: {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+                       for user_id in user_ids}
+            db.session.remove()
+
+        client = bench_app.test_client()
+
+        def update_all(offset):
+            timings = []
+            for i, user_id in enumerate(user_ids):
+                # Same area per group of users; the offset moves within the ~1 km cell
+                body = {'latitude': 40.0 + (i % cells) * 0.1 + offset, 'longitude': -74.0 + offset}
+                started = time.perf_counter()
+                response = client.post('/location/update', json=body, headers=headers[user_id])
+                timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise click.ClickException(f"/location/update returned {response.status_code}")
+            return timings
+
+        rounds = {}
+        for name, offset in (('cold', 0.0), ('cached', 0.001)):
+            timings = update_all(offset)
+            deadline = time.monotonic() + 30 + cells * lookup_ms / 1000
+            while pending_place_lookups() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            with bench_app.app_context():
+                located = User.query.filter(User.city.isnot(None)).count()
+            rounds[name] = (max(timings), sum(timings) / len(timings), geocoder.lookups, located)
+
+        for name, (slowest, average, lookups, located) in rounds.items():
+            click.echo(f"{name:>6}: avg={average:6.1f} ms  slowest={slowest:6.1f} ms  "
+                       f"geocoder lookups so far={lookups}  users with a city={located}/{users}")
+        if rounds['cold'][0] >= lookup_ms:
+            raise click.ClickException("A location update waited on the geocoder")
+        if geocoder.lookups != cells:
+            raise click.ClickException(f"Expected one lookup per area ({cells}), made {geocoder.lookups}")
+        if rounds['cold'][3] != users:
+            raise click.ClickException("Deferred lookups did not fill in every user's city")
+        click.echo("Location updates return without waiting; each area is looked up once.")
+
+    @app.cli.command("benchmark-notifications")
+    @click.option("--sizes", default="2,50,400", show_default=True,
+                  help="Comma-separated recipient counts.")
+    @click.option("--devices", default=3, show_default=True, type=int,
+                  help="Push tokens per recipient.")
+    def benchmark_notifications(sizes, devices):
+        """Show that outbox delivery sends one Expo request per 100 messages, not one per device."""
+        import math
+        from app.services.notification_outbox import BATCH_SIZE, drain_outbox
+        from app.services.notification_service import FakePushClient, PUSH_CHUNK_SIZE, set_push_client
+
+        for size in parse_sizes(sizes):
+            bench_app = make_benchmark_app()
+            with bench_app.app_context():
+                queued = seed_notification_population(size, devices)
+                fake = FakePushClient()
+                set_push_client(fake)
+                db.session.remove()
+
+                started = time.perf_counter()
+                with QueryCounter(db.engine) as counter:
+                    processed = drain_outbox()
+                elapsed = (time.perf_counter() - started) * 1000
+
+            # One request per chunk of each claimed batch of rows
+            expected = sum(
+                math.ceil(min(BATCH_SIZE, queued - start) * devices / PUSH_CHUNK_SIZE)
+                for start in range(0, queued, BATCH_SIZE)
+            )
+            click.echo(f"recipients={size:>5}  rows={processed:>5}  messages={len(fake.published):>5}  "
+                       f"push requests={fake.requests:>3} (per-device: {len(fake.published):>5})  "
+                       f"queries={counter.count:>3}  time={elapsed:8.1f} ms")
+            if processed != queued or len(fake.published) != queued * devices:
+                raise click.ClickException(f"Expected {queued * devices} messages for {queued} rows")
+            if fake.requests != expected:
+                raise click.ClickException(f"Expected {expected} push requests, made {fake.requests}")
+        click.echo("Push requests scale with messages / chunk size.")
+
+    @app.cli.command("benchmark-notification-burst")
+    @click.option("--recipients", default=20, show_default=True, type=int)
+    @click.option("--matches", default=3, show_default=True, type=int,
+                  help="Conversations per recipient.")
+    @click.option("--messages", default=40, show_default=True, type=int,
+                  help="Messages per recipient, spread over its conversations.")
+    def benchmark_notification_burst(recipients, matches, messages):
+        """Show that a burst of chat messages yields one push per conversation carrying a count."""
+        from datetime import datetime, timedelta
+        from app.models.notificationDB import NotificationOutbox
+        from app.models.userDB import User
+        from app.services.notification_outbox import COALESCE_SECONDS, RATE_LIMIT, RATE_WINDOW_SECONDS, drain_outbox
+        from app.services.notification_service import FakePushClient, set_push_client
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            seed_notification_population(recipients, 1)
+            NotificationOutbox.query.delete()
+            user_ids = [row.id for row in db.session.query(User.id).order_by(User.id)]
+            for n in range(messages):
+                for i, user_id in enumerate(user_ids):
+                    db.session.add(NotificationOutbox(kind='message', user_id=user_id, payload={
+                        'sender_id': user_ids[(i + 1) % len(user_ids)], 'match_id': n % matches + 1}))
+            db.session.commit()
+            fake = FakePushClient()
+            set_push_client(fake)
+            db.session.remove()
+
+            started = time.perf_counter()
+            with QueryCounter(db.engine) as counter:
+                processed = drain_outbox()
+            elapsed = (time.perf_counter() - started) * 1000
+            burst_pushes = len(fake.published)
+            bodies = sorted({message.body for message in fake.published})
+
+            # A follow-up message inside the window waits for it to pass
+            follow_up = NotificationOutbox(kind='message', user_id=user_ids[0],
+                                           payload={'sender_id': user_ids[1], 'match_id': 1})
+            db.session.add(follow_up)
+            db.session.commit()
+            follow_up_id = follow_up.id
+            drain_outbox()
+            deferred = db.session.get(NotificationOutbox, follow_up_id).status == 'pending'
+            earlier = datetime.utcnow() - timedelta(seconds=max(COALESCE_SECONDS, RATE_WINDOW_SECONDS) + 1)
+            NotificationOutbox.query.update({NotificationOutbox.sent_at: earlier})
+            NotificationOutbox.query.filter_by(status='pending').update({NotificationOutbox.next_attempt_at: earlier})
+            db.session.commit()
+            drain_outbox()
+            released = db.session.get(NotificationOutbox, follow_up_id).status == 'sent'
+
+        expected = recipients * min(matches, RATE_LIMIT)
+        click.echo(f"recipients={recipients}  rows={processed}  pushes={burst_pushes} "
+                   f"(uncoalesced: {recipients * messages})  bodies={bodies}  "
+                   f"queries={counter.count}  time={elapsed:.1f} ms")
+        if burst_pushes != expected:
+            raise click.ClickException(f"Expected {expected} pushes, sent {burst_pushes}")
+        if not deferred or not released:
+            raise click.ClickException("Follow-up message was not held back until the coalescing window passed")
+        click.echo("Pushes scale with conversations, not messages.")
+
+    @app.cli.command("benchmark-push-receipts")
+    @click.option("--tickets", default=50, show_default=True, type=int)
+    @click.option("--passes", default=3, show_default=True, type=int,
+                  help="Dispatcher passes run back to back.")
+    def benchmark_push_receipts(tickets, passes):
+        """Show that receipts Expo doesn't return (or can't be read) are re-checked after a backoff."""
+        from datetime import datetime, timedelta
+        from app.models.notificationDB import PushTicketRecord
+        from app.services.notification_outbox import _dispatch
+        from app.services.notification_service import FakePushClient, set_push_client
+        from app.services.push_receipts import RECEIPT_DELAY_SECONDS, RECEIPT_RETRY_SECONDS, next_receipt_check_at
+
+        bench_app = make_benchmark_app()
+        with bench_app.app_context():
+            # Tickets the fake client never issued, so no receipt comes back for them
+            sent_at = datetime.utcnow() - timedelta(seconds=RECEIPT_DELAY_SECONDS + 1)
+            db.session.execute(PushTicketRecord.__table__.insert(), [
+                {'ticket_id': f'missing-{n}', 'token': f'ExponentPushToken[{n}]', 'created_at': sent_at, 'attempts': 0}
+                for n in range(tickets)
+            ])
+            db.session.commit()
+            fake = FakePushClient()
+            set_push_client(fake)
+
+            results = {}
+            for label, failures in (("missing", 0), ("failing", passes)):
+                fake.requests = 0
+                fake.fail_next = failures
+                # Make every ticket due again
+                PushTicketRecord.query.update({PushTicketRecord.next_check_at: datetime.utcnow()})
+                db.session.commit()
+                started = datetime.utcnow()
+                due = [_dispatch() for _ in range(passes)]
+                results[label] = (fake.requests, min(due), started)
+                click.echo(f"{label:>8}: passes={passes}  receipt requests={fake.requests}  "
+                           f"next check in {(min(due) - started).total_seconds():.0f} s")
+            attempts = {row.attempts for row in PushTicketRecord.query.all()}
+            click.echo(f"attempts per ticket={sorted(attempts)}  next check at={next_receipt_check_at()}")
+
+        for label, (requests, due, started) in results.items():
+            if requests != 1:
+                raise click.ClickException(f"{label}: expected 1 receipt request over {passes} passes, made {requests}")
+            if due < started + timedelta(seconds=RECEIPT_RETRY_SECONDS):
+                raise click.ClickException(f"{label}: next receipt check scheduled before the retry delay")
+        if attempts != {2}:
+            raise click.ClickException(f"Expected every ticket to have 2 attempts, got {sorted(attempts)}")
+        click.echo("Unavailable receipts are re-checked after a backoff, not every pass.")
@@ -0,0 +1,360 @@
+# backend/app/services/candidate_feed.py
+"""
+Candidate feed engine for /match/users_to_match.
+
+Everything the feed needs to know about the acting dater's existing
+relationships (matches, likes, blocks, skips) is loaded up front in a fixed
+number of set-based queries, so the cost of building a feed no longer grows
+with the number of candidates.
+"""
+import base64
+import json
+from bisect import bisect_right
+import numpy as np
+from sqlalchemy import case, or_, select
+from app import db
+from app.models.userDB import User
+from app.models.matchDB import Match, match_likes
+from app.models.skipDB import UserSkip
+from app.models.blockDB import UserBlock
+from app.services.geo_index import has_location, haversine_miles, radius_prefilter
+
+# Columns the mutual filter needs; loaded as plain rows so rejected candidates are never hydrated
+FILTER_COLUMNS = (
+    User.id,
+    User.latitude,
+    User.longitude,
+    User.match_radius,
+    User.preferredAgeMin,
+    User.preferredAgeMax,
+    User.preferredGenders,
+)
+# Keep IN lists well under SQLite's bound-parameter limit
+LOAD_CHUNK_SIZE = 500
+
+# Paginated feed (GET /match/users_to_match?limit=&cursor=)
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def load_feed_state(acting_user, matchmaker_view=False):
+    """
+    Load exclusions and per-candidate match metadata for the acting dater.
+
+    Issues exactly three queries (matches + likes, blocks, skips) regardless
+    of how many matches or candidates exist.
+
+    Args:
+        acting_user: The dater the feed is built for (the linked dater when
+            a matchmaker is browsing)
+        matchmaker_view: True when a matchmaker is browsing on behalf of
+            acting_user
+
+    Returns:
+        dict with:
+            excluded_ids: user IDs that must never appear in the feed
+            blocked_ids: user IDs blocked in either direction
+            skipped_ids: user IDs the acting dater skipped (shown last)
+            match_meta: {user_id: {...}} metadata for candidates that already
+                share a match with the acting dater
+    """
+    acting_id = acting_user.id
+    other_id = case(
+        (Match.user_id_1 == acting_id, Match.user_id_2),
+        else_=Match.user_id_1,
+    )
+    liked_by_acting = select(match_likes.c.user_id).where(
+        match_likes.c.match_id == Match.id,
+        match_likes.c.user_id == acting_id,
+    ).exists()
+    liked_by_other = select(match_likes.c.user_id).where(
+        match_likes.c.match_id == Match.id,
+        match_likes.c.user_id == other_id,
+    ).exists()
+
+    rows = db.session.query(
+        other_id.label('other_id'),
+        Match.status,
+        Match.note,
+        Match.matched_by_user_id_1_matcher,
+        Match.matched_by_user_id_2_matcher,
+        liked_by_acting.label('liked_by_acting'),
+        liked_by_other.label('liked_by_other'),
+    ).filter(
+        or_(Match.user_id_1 == acting_id, Match.user_id_2 == acting_id)
+    ).order_by(Match.id).all()
+
+    excluded_ids = set()
+    match_meta = {}
+    for row in rows:
+        # Matched users never show up again
+        if row.status == 'matched':
+            excluded_ids.add(row.other_id)
+
+        if matchmaker_view:
+            # Anyone the linked dater already liked is hidden from the matchmaker
+            if row.liked_by_acting:
+                excluded_ids.add(row.other_id)
+
+        if acting_user.role == 'user':
+            # Outgoing likes that are still waiting on the other side
+            if row.status in ('pending', 'pending_approval') and row.liked_by_acting:
+                excluded_ids.add(row.other_id)
+
+        # Keep the first match per pair, mirroring the old .first() lookup
+        if row.other_id not in match_meta:
+            match_meta[row.other_id] = {
+                'note': row.note or None,
+                'matched_by_matcher_user_1': row.matched_by_user_id_1_matcher,
+                'matched_by_matcher_user_2': row.matched_by_user_id_2_matcher,
+                'liked_linked_dater': bool(
+                    matchmaker_view and row.liked_by_acting and not row.liked_by_other
+                ),
+            }
+
+    if matchmaker_view:
+        excluded_ids.add(acting_id)
+
+    # Blocks are bidirectional - exclude if either user blocked the other
+    blocked_ids = {
+        user_id for (user_id,) in
+        db.session.query(UserBlock.blocked_id).filter(UserBlock.blocker_id == acting_id).union(
+            db.session.query(UserBlock.blocker_id).filter(UserBlock.blocked_id == acting_id)
+        ).all()
+    }
+
+    skipped_ids = {
+        user_id for (user_id,) in
+        db.session.query(UserSkip.skipped_user_id).filter(UserSkip.user_id == acting_id).all()
+    }
+
+    return {
+        'excluded_ids': excluded_ids | blocked_ids,
+        'blocked_ids': blocked_ids,
+        'skipped_ids': skipped_ids,
+        'match_meta': match_meta,
+    }
+
+
+def candidate_query(acting_user, excluded_ids=(), geo_prefilter=True):
+    """
+    Base SQL query for feed candidates: active daters with a radius that match
+    the acting dater's age/gender preferences and are not excluded.
+
+    When the acting dater has a location, a bounding-box / grid-cell
+    pre-filter is pushed into SQL so far-away users are never loaded.
+    """
+    query = User.query.filter(
+        User.role == 'user',
+        User.id != acting_user.id,
+        User.match_radius.isnot(None),
+        User.match_radius > 0
+    )
+
+    # Age filtering
+    if acting_user.preferredAgeMin and acting_user.preferredAgeMax:
+        query = query.filter(User.age.between(
+            acting_user.preferredAgeMin,
+            acting_user.preferredAgeMax
+        ))
+
+    # Gender filtering
+    if acting_user.preferredGenders:
+        query = query.filter(User.gender.in_(acting_user.preferredGenders))
+
+    if excluded_ids:
+        query = query.filter(~User.id.in_(excluded_ids))
+
+    # Radius pre-filter; the exact mutual haversine check still runs afterwards
+    if geo_prefilter and has_location(acting_user.latitude, acting_user.longitude):
+        query = query.filter(radius_prefilter(
+            acting_user.latitude,
+            acting_user.longitude,
+            acting_user.match_radius or 0
+        ))
+
+    return query
+
+
+def _candidate_columns(users, attrs):
+    """
+    Transpose candidates into {attr: tuple of values}.
+
+    Rows from a column query (anything with _fields) are transposed with zip,
+    which avoids a per-row attribute lookup; other objects fall back to getattr.
+    """
+    if hasattr(users[0], '_fields'):
+        transposed = dict(zip(users[0]._fields, zip(*users)))
+        return {attr: transposed[attr] for attr in attrs}
+    return {attr: tuple(getattr(u, attr) for u in users) for attr in attrs}
+
+
+def _as_array(values):
+    """Float array with None/falsy values mapped to 0 (matching the old truthiness checks)."""
+    return np.fromiter((v or 0 for v in values), dtype=np.float64, count=len(values))
+
+
+def mutual_filter_mask(acting_user, users):
+    """
+    Evaluate the mutual feed checks for all candidates in one vectorized pass.
+
+    A candidate is kept when:
+        - both have a location: the distance is within both match radii
+        - both have age preferences: acting_user's age is in the candidate's range
+        - the candidate has gender preferences: acting_user's gender is in them
+
+    Args:
+        acting_user: The dater the feed is built for
+        users: Candidates (User objects or rows exposing the same attributes)
+
+    Returns:
+        numpy bool array, True for candidates that pass every check
+    """
+    count = len(users)
+    keep = np.ones(count, dtype=bool)
+    if count == 0:
+        return keep
+
+    columns = _candidate_columns(users, (
+        'latitude', 'longitude', 'match_radius',
+        'preferredAgeMin', 'preferredAgeMax', 'preferredGenders',
+    ))
+
+    # Distance within both users' match radius
+    if has_location(acting_user.latitude, acting_user.longitude):
+        latitudes = _as_array(columns['latitude'])
+        longitudes = _as_array(columns['longitude'])
+        radii = _as_array(columns['match_radius'])
+        acting_radius = acting_user.match_radius or 0
+        located = (latitudes != 0) & (longitudes != 0)
+        distances = haversine_miles(acting_user.latitude, acting_user.longitude, latitudes, longitudes)
+        in_range = (acting_radius > 0) & (radii > 0) & (distances <= acting_radius) & (distances <= radii)
+        keep &= ~located | in_range
+
+    # Acting user's age inside the candidate's preferred range
+    if acting_user.preferredAgeMin and acting_user.preferredAgeMax:
+        age_mins = _as_array(columns['preferredAgeMin'])
+        age_maxs = _as_array(columns['preferredAgeMax'])
+        has_age_prefs = (age_mins != 0) & (age_maxs != 0)
+        if acting_user.age is None:
+            age_ok = np.zeros(count, dtype=bool)
+        else:
+            age_ok = (age_mins <= acting_user.age) & (acting_user.age <= age_maxs)
+        keep &= ~has_age_prefs | age_ok
+
+    # Acting user's gender in the candidate's preferred genders (no preferences = open to anyone)
+    gender = acting_user.gender
+    gender_ok = np.fromiter(
+        (not genders or (bool(gender) and gender in genders) for genders in columns['preferredGenders']),
+        dtype=bool,
+        count=count,
+    )
+    keep &= gender_ok
+
+    return keep
+
+
+def filter_mutual_candidates(acting_user, users):
+    """Return the candidates that pass mutual_filter_mask, preserving order."""
+    mask = mutual_filter_mask(acting_user, users)
+    return [user for user, keep in zip(users, mask) if keep]
+
+
+def order_candidates(users, skipped_ids):
+    """Non-skipped candidates first, then skipped ones, keeping query order within each group."""
+    non_skipped_users = [u for u in users if u.id not in skipped_ids]
+    skipped_users = [u for u in users if u.id in skipped_ids]
+    return non_skipped_users + skipped_users
+
+
+def eligible_candidate_ids(acting_user, feed_state):
+    """
+    Run the whole candidate pipeline on lightweight column rows.
+
+    Returns:
+        Eligible candidate IDs in feed order (non-skipped first, then skipped;
+        by user ID within each group)
+    """
+    rows = candidate_query(acting_user, feed_state['excluded_ids']).with_entities(
+        *FILTER_COLUMNS
+    ).order_by(User.id).all()
+    rows = order_candidates(rows, feed_state['skipped_ids'])
+    return [row.id for row in filter_mutual_candidates(acting_user, rows)]
+
+
+def encode_feed_cursor(sort_key):
+    """Opaque cursor for a (skipped, user_id) feed position."""
+    skipped, user_id = sort_key
+    raw = json.dumps({'s': int(skipped), 'id': int(user_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_feed_cursor(cursor):
+    """
+    Decode a cursor produced by encode_feed_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return bool(data['s']), int(data['id'])
+    except (KeyError, TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def paginate_candidate_ids(ordered_ids, skipped_ids, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset-paginate feed IDs ordered by (skipped, user_id).
+
+    Positions are keys rather than offsets, so candidates appearing or
+    disappearing between requests never shift or repeat a page.
+
+    Args:
+        ordered_ids: Output of eligible_candidate_ids
+        skipped_ids: Skipped user IDs from load_feed_state
+        after: (skipped, user_id) key of the last item already returned
+        limit: Page size
+
+    Returns:
+        (page_ids, next_key) where next_key is None on the last page
+    """
+    keys = [(user_id in skipped_ids, user_id) for user_id in ordered_ids]
+    start = bisect_right(keys, after) if after is not None else 0
+    page_keys = keys[start:start + limit]
+    has_more = start + limit < len(keys)
+    next_key = page_keys[-1] if page_keys and has_more else None
+    return [user_id for _, user_id in page_keys], next_key
+
+
+def iter_users_in_order(user_ids, options=()):
+    """
+    Yield User objects for user_ids in the given order, loading one IN-query chunk at a time.
+    options are extra query options, e.g. load_only() for a profile projection.
+    """
+    for start in range(0, len(user_ids), LOAD_CHUNK_SIZE):
+        chunk = user_ids[start:start + LOAD_CHUNK_SIZE]
+        users = User.query.options(*options).filter(User.id.in_(chunk)).all()
+        users_by_id = {user.id: user for user in users}
+        for user_id in chunk:
+            if user_id in users_by_id:
+                yield users_by_id[user_id]
+
+
+def load_users_in_order(user_ids, options=()):
+    """Load User objects for user_ids with IN queries, returned in the given order."""
+    return list(iter_users_in_order(user_ids, options))
+
+
+def candidate_match_fields(match_meta, user_id):
+    """Per-candidate match metadata merged into each feed entry."""
+    meta = match_meta.get(user_id)
+    if not meta:
+        return {
+            'liked_linked_dater': False,
+            'note': None,
+            'matched_by_matcher_user_1': None,
+            'matched_by_matcher_user_2': None,
+        }
+    return dict(meta)
@@ -0,0 +1,82 @@
+# backend/app/services/embedding_providers.py
+"""
+Pluggable embedding providers.
+
+Providers turn a batch of texts into vectors. The OpenAI provider is used in
+production; the fake provider is deterministic and fully offline so the
+refresh worker and scoring code can be exercised without an API key.
+
+Select one with EMBEDDING_PROVIDER=openai|fake, or call set_embedding_provider().
+"""
+import hashlib
+import os
+import re
+import numpy as np
+
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+DEFAULT_DIMENSION = 1536
+
+
+class OpenAIEmbeddingProvider:
+    """Embeddings from the OpenAI API; one request per batch of texts."""
+
+    def __init__(self, model=DEFAULT_OPENAI_MODEL, dimension=DEFAULT_DIMENSION):
+        self.model = model
+        self.dimension = dimension
+
+    def embed(self, texts):
+        # Imported lazily so the client is only created when needed
+        from app.services.ai_embeddings import get_openai_client
+
+        client = get_openai_client()
+        response = client.embeddings.create(input=list(texts), model=self.model)
+        # The API returns one item per input, tagged with its position
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class FakeEmbeddingProvider:
+    """
+    Deterministic offline provider: a hashed bag-of-words vector.
+
+    Texts sharing words get similar vectors, which keeps similarity scores
+    meaningful in tests and local development.
+    """
+
+    def __init__(self, model="fake-embedding", dimension=DEFAULT_DIMENSION):
+        self.model = model
+        self.dimension = dimension
+        self.calls = 0  # number of embed() batches, handy for asserting batching
+
+    def embed(self, texts):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            vector = np.zeros(self.dimension, dtype=np.float32)
+            for word in re.findall(r"[a-z0-9']+", text.lower()):
+                digest = hashlib.md5(word.encode('utf-8')).digest()
+                vector[int.from_bytes(digest[:4], 'little') % self.dimension] += 1.0
+            vectors.append(vector.tolist())
+        return vectors
+
+
+_provider = None
+
+
+def get_embedding_provider():
+    """Return the active provider, creating it from EMBEDDING_PROVIDER on first use."""
+    global _provider
+    if _provider is None:
+        name = os.getenv('EMBEDDING_PROVIDER', 'openai').lower()
+        if name == 'fake':
+            _provider = FakeEmbeddingProvider()
+        elif name == 'openai':
+            _provider = OpenAIEmbeddingProvider()
+        else:
+            raise ValueError(f"Unknown EMBEDDING_PROVIDER: {name}")
+    return _provider
+
+
+def set_embedding_provider(provider):
+    """Swap the active provider (e.g. a FakeEmbeddingProvider in tests)."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,188 @@
+# backend/app/services/embedding_store.py
+"""
+Persistence for per-user conversation-style embeddings.
+
+Each user has at most one stored vector (user_embeddings table) tagged with the
+model that produced it and a watermark of the newest message it covers. A
+stored vector is reused until the user has sent enough new messages to make
+recomputing it worthwhile.
+"""
+import os
+import logging
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import defer
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models.embeddingDB import UserEmbedding
+from app.models.messageDB import Message
+
+logger = logging.getLogger(__name__)
+
+# New messages a user must send before their stored embedding is recomputed
+REFRESH_MIN_NEW_MESSAGES = int(os.getenv('EMBEDDING_REFRESH_MIN_MESSAGES', '10'))
+
+
+def load_embeddings(user_ids, with_vectors=True):
+    """
+    Return {user_id: UserEmbedding} for the users that have a stored embedding.
+    With with_vectors=False only the metadata is loaded (see load_vectors).
+    """
+    if not user_ids:
+        return {}
+    query = UserEmbedding.query.filter(UserEmbedding.user_id.in_(list(user_ids)))
+    if not with_vectors:
+        query = query.options(defer(UserEmbedding.vector, raiseload=True))
+    return {row.user_id: row for row in query.all()}
+
+
+def load_vectors(user_ids):
+    """Return {user_id: float32 array} of stored vectors, in one query."""
+    if not user_ids:
+        return {}
+    rows = db.session.query(
+        UserEmbedding.user_id, UserEmbedding.dimension, UserEmbedding.vector
+    ).filter(UserEmbedding.user_id.in_(list(user_ids))).all()
+    return {
+        user_id: np.frombuffer(vector, dtype='<f4', count=dimension)
+        for user_id, dimension, vector in rows
+    }
+
+
+def count_new_messages(user_ids):
+    """
+    Count messages each user sent after their stored watermark, in one query.
+
+    Returns:
+        {user_id: count} (users with no new messages are omitted)
+    """
+    if not user_ids:
+        return {}
+    rows = db.session.query(
+        Message.sender_id, func.count(Message.id)
+    ).join(
+        UserEmbedding, UserEmbedding.user_id == Message.sender_id
+    ).filter(
+        Message.sender_id.in_(list(user_ids)),
+        Message.id > func.coalesce(UserEmbedding.last_message_id, 0)
+    ).group_by(Message.sender_id).all()
+    return {sender_id: count for sender_id, count in rows}
+
+
+def needs_refresh(stored, new_message_count, model, dimension):
+    """Decide whether a stored embedding must be recomputed."""
+    if stored is None:
+        return True
+    if stored.model != model or stored.dimension != dimension:
+        return True
+    return _has_enough_new_messages(stored.message_count, new_message_count)
+
+
+def _has_enough_new_messages(stored_message_count, new_message_count):
+    # An empty-history vector is worthless as soon as the user says anything
+    if not stored_message_count and new_message_count > 0:
+        return True
+    return new_message_count >= REFRESH_MIN_NEW_MESSAGES
+
+
+def save_embeddings(entries):
+    """
+    Insert or replace stored embeddings in one transaction.
+
+    Written and committed through a session of their own: request paths
+    refresh embeddings while serializing users, and committing (or rolling
+    back) db.session there would expire the users they already loaded or
+    discard the caller's pending changes.
+
+    Args:
+        entries: iterable of dicts with user_id, vector, model, last_message_id, message_count
+
+    Returns:
+        bool: True if they were stored; a concurrent writer winning the race is not an error
+    """
+    entries = list(entries)
+    if not entries:
+        return True
+    session = db.session.session_factory()
+    try:
+        existing = {
+            row.user_id: row
+            for row in session.query(UserEmbedding).options(
+                defer(UserEmbedding.vector, raiseload=True)
+            ).filter(UserEmbedding.user_id.in_([entry['user_id'] for entry in entries])).all()
+        }
+        for entry in entries:
+            row = existing.get(entry['user_id'])
+            if row is None:
+                row = UserEmbedding(user_id=entry['user_id'])
+                session.add(row)
+            row.model = entry['model']
+            row.dimension = len(entry['vector'])
+            row.vector = UserEmbedding.pack(entry['vector'])
+            row.last_message_id = entry['last_message_id']
+            row.message_count = entry['message_count']
+        session.commit()
+        return True
+    except SQLAlchemyError as e:
+        session.rollback()
+        logger.warning(f"Could not store {len(entries)} embeddings: {e}")
+        return False
+    finally:
+        session.close()
+
+
+def save_embedding(user_id, vector, model, last_message_id, message_count):
+    """Insert or replace a single user's stored embedding (committed at once)."""
+    return save_embeddings([{
+        'user_id': user_id,
+        'vector': vector,
+        'model': model,
+        'last_message_id': last_message_id,
+        'message_count': message_count,
+    }])
+
+
+def find_stale_user_ids(model, dimension, limit=None):
+    """
+    Users whose stored embedding needs recomputing: they have messages but no
+    vector, enough new messages since their watermark, or a vector from a
+    different model.
+
+    Returns:
+        list of user IDs, lowest first
+    """
+    rows = db.session.query(
+        Message.sender_id,
+        func.count(Message.id),
+        UserEmbedding.user_id,
+        UserEmbedding.model,
+        UserEmbedding.dimension,
+        UserEmbedding.message_count,
+    ).outerjoin(
+        UserEmbedding, UserEmbedding.user_id == Message.sender_id
+    ).filter(
+        Message.id > func.coalesce(UserEmbedding.last_message_id, 0)
+    ).group_by(
+        Message.sender_id,
+        UserEmbedding.user_id,
+        UserEmbedding.model,
+        UserEmbedding.dimension,
+        UserEmbedding.message_count,
+    ).all()
+
+    stale = set()
+    for sender_id, new_count, stored_id, stored_model, stored_dimension, stored_count in rows:
+        if stored_id is None:
+            stale.add(sender_id)
+        elif stored_model != model or stored_dimension != dimension:
+            stale.add(sender_id)
+        elif _has_enough_new_messages(stored_count, new_count):
+            stale.add(sender_id)
+
+    # Vectors from another model are stale even without new messages
+    stale.update(user_id for (user_id,) in db.session.query(UserEmbedding.user_id).filter(
+        (UserEmbedding.model != model) | (UserEmbedding.dimension != dimension)
+    ).all())
+
+    stale_ids = sorted(stale)
+    return stale_ids[:limit] if limit else stale_ids
@@ -0,0 +1,96 @@
+# backend/app/services/explanation_cache.py
+"""
+Cache for LLM explanations of conversation similarity.
+
+An explanation is keyed by the (ordered) user pair plus each user's message
+watermark (their newest Message.id), so it stays valid until one of them
+sends a new message. Lookups go through a per-process LRU/TTL cache first and
+the conversation_explanations table second; only a miss in both pays for the
+embedding and chat completion calls.
+"""
+import os
+import logging
+from sqlalchemy import func, or_
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.models.explanationDB import ConversationExplanation
+from app.models.messageDB import Message
+from app.services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+EXPLANATION_CACHE_SIZE = int(os.getenv('EXPLANATION_CACHE_SIZE', '1024'))
+EXPLANATION_CACHE_TTL = int(os.getenv('EXPLANATION_CACHE_TTL', '3600'))
+
+_memory = TTLCache(maxsize=EXPLANATION_CACHE_SIZE, ttl=EXPLANATION_CACHE_TTL)
+
+
+def message_watermarks(user_ids):
+    """
+    Newest message ID sent by each user, in one query.
+
+    Returns:
+        {user_id: message_id}, 0 for users without messages
+    """
+    watermarks = {user_id: 0 for user_id in user_ids}
+    rows = db.session.query(
+        Message.sender_id, func.max(Message.id)
+    ).filter(Message.sender_id.in_(list(user_ids))).group_by(Message.sender_id).all()
+    watermarks.update({sender_id: latest or 0 for sender_id, latest in rows})
+    return watermarks
+
+
+def _cache_key(user_a_id, user_b_id, watermarks, model):
+    return (user_a_id, user_b_id, watermarks[user_a_id], watermarks[user_b_id], model)
+
+
+def get_cached_explanation(user_a_id, user_b_id, watermarks, model):
+    """Return the cached explanation for the pair at these watermarks, or None."""
+    key = _cache_key(user_a_id, user_b_id, watermarks, model)
+    explanation = _memory.get(key)
+    if explanation is not None:
+        return explanation
+
+    row = ConversationExplanation.query.filter_by(user_a_id=user_a_id, user_b_id=user_b_id).first()
+    if row is None or row.model != model:
+        return None
+    if row.watermark_a != watermarks[user_a_id] or row.watermark_b != watermarks[user_b_id]:
+        return None
+
+    _memory.set(key, row.explanation)
+    return row.explanation
+
+
+def store_explanation(user_a_id, user_b_id, watermarks, model, similarity, explanation):
+    """
+    Save an explanation, replacing the pair's previous one, and commit.
+
+    Returns:
+        bool: True if it was persisted (it is cached in memory either way)
+    """
+    _memory.set(_cache_key(user_a_id, user_b_id, watermarks, model), explanation)
+    try:
+        row = ConversationExplanation.query.filter_by(user_a_id=user_a_id, user_b_id=user_b_id).first()
+        if row is None:
+            row = ConversationExplanation(user_a_id=user_a_id, user_b_id=user_b_id)
+            db.session.add(row)
+        row.watermark_a = watermarks[user_a_id]
+        row.watermark_b = watermarks[user_b_id]
+        row.model = model
+        row.similarity = similarity
+        row.explanation = explanation
+        db.session.commit()
+        return True
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning(f"Could not store explanation for users {user_a_id} and {user_b_id}: {e}")
+        return False
+
+
+def delete_user_explanations(user_id):
+    """Remove cached explanations involving a user (caller commits)."""
+    ConversationExplanation.query.filter(or_(
+        ConversationExplanation.user_a_id == user_id,
+        ConversationExplanation.user_b_id == user_id
+    )).delete(synchronize_session=False)
+    # In-memory entries are keyed by watermark and age out on their own
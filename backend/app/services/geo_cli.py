@@ -0,0 +1,64 @@
+import click
+from sqlalchemy import or_
+from app import db
+from app.models.userDB import User
+from .geo_index import compute_geo_cell
+
+def register_commands(app):
+    @app.cli.command("backfill-geo-cells")
+    @click.option("--batch-size", default=1000, show_default=True, type=int)
+    def backfill_geo_cells(batch_size):
+        """Populate users.geo_cell for rows written before the geospatial index existed."""
+        updated = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(User.id, User.latitude, User.longitude, User.geo_cell).filter(
+                User.id > last_id
+            ).order_by(User.id).limit(batch_size).all()
+            if not rows:
+                break
+            changes = []
+            for row in rows:
+                cell = compute_geo_cell(row.latitude, row.longitude)
+                if cell != row.geo_cell:
+                    changes.append({'id': row.id, 'geo_cell': cell})
+            if changes:
+                db.session.execute(User.__table__.update().where(
+                    User.__table__.c.id == db.bindparam('b_id')
+                ).values(geo_cell=db.bindparam('b_geo_cell')), [
+                    {'b_id': c['id'], 'b_geo_cell': c['geo_cell']} for c in changes
+                ])
+                db.session.commit()
+                updated += len(changes)
+            last_id = rows[-1].id
+
+        click.echo(f"Updated geo_cell for {updated} users")
+
+    @app.cli.command("backfill-user-places")
+    @click.option("--batch-size", default=100, show_default=True, type=int)
+    def backfill_user_places(batch_size):
+        """Fill in city/state for located users that lack them (e.g. lookups lost to a restart)."""
+        from .geocoding import GeocodeUnavailable, apply_place, lookup_place
+
+        filled = failed = 0
+        last_id = 0
+        while True:
+            users = User.query.filter(
+                User.id > last_id,
+                User.latitude.isnot(None),
+                User.longitude.isnot(None),
+                or_(User.city.is_(None), User.state.is_(None))
+            ).order_by(User.id).limit(batch_size).all()
+            if not users:
+                break
+            for user in users:
+                missing = [field for field in ('city', 'state') if getattr(user, field) is None]
+                try:
+                    apply_place(user, lookup_place(user.latitude, user.longitude), missing)
+                    filled += 1
+                except GeocodeUnavailable as e:
+                    click.echo(f"User {user.id}: {e}")
+                    failed += 1
+            db.session.commit()
+            last_id = users[-1].id
+        click.echo(f"Looked up places for {filled} users ({failed} failed)")
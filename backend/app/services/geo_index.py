@@ -0,0 +1,120 @@
+# backend/app/services/geo_index.py
+"""
+Grid-cell geospatial index over User.latitude/longitude.
+
+Every located user is assigned an integer grid cell (GEO_CELL_DEGREES wide)
+stored in users.geo_cell. Radius searches are turned into a bounding box plus
+the list of cells it covers, both of which are plain indexed comparisons that
+work the same on SQLite and PostgreSQL.
+"""
+import math
+import numpy as np
+from sqlalchemy import and_, or_
+from app.models.userDB import User
+
+EARTH_RADIUS_MILES = 3958.8
+GEO_CELL_DEGREES = 0.5
+CELLS_PER_ROW = int(360 / GEO_CELL_DEGREES)
+# Past this many cells the IN list stops paying for itself; fall back to the bounding box alone
+MAX_QUERY_CELLS = 400
+
+
+def has_location(latitude, longitude):
+    """Mirrors the truthiness checks used by the feed (0.0 counts as no location)."""
+    return bool(latitude) and bool(longitude)
+
+
+def compute_geo_cell(latitude, longitude):
+    """Return the grid cell ID for a coordinate, or None when it has no location."""
+    if not has_location(latitude, longitude):
+        return None
+    row = int(math.floor((min(max(latitude, -90.0), 90.0) + 90.0) / GEO_CELL_DEGREES))
+    col = int(math.floor(((longitude + 180.0) % 360.0) / GEO_CELL_DEGREES))
+    return row * CELLS_PER_ROW + col
+
+
+def haversine_miles(latitude, longitude, latitudes, longitudes):
+    """Vectorized haversine: distances in miles from one coordinate to arrays of coordinates."""
+    lat1 = np.radians(latitude)
+    lon1 = np.radians(longitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2 = np.radians(np.asarray(longitudes, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bounding_box(latitude, longitude, radius_miles):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing every point within
+    radius_miles of the coordinate.
+
+    min_lon/max_lon are None when the box spans all longitudes (near the poles
+    or when the radius is huge) and may wrap past +/-180 otherwise.
+    """
+    angular = (radius_miles or 0) / EARTH_RADIUS_MILES
+    delta_lat = math.degrees(angular)
+    min_lat = max(latitude - delta_lat, -90.0)
+    max_lat = min(latitude + delta_lat, 90.0)
+
+    cos_lat = math.cos(math.radians(latitude))
+    if min_lat <= -90.0 or max_lat >= 90.0 or cos_lat <= 0 or math.sin(angular) >= cos_lat:
+        return min_lat, max_lat, None, None
+    delta_lon = math.degrees(math.asin(math.sin(angular) / cos_lat))
+    return min_lat, max_lat, longitude - delta_lon, longitude + delta_lon
+
+
+def cells_for_box(min_lat, max_lat, min_lon, max_lon):
+    """Return the grid cells covering a bounding box, or None if there are too many."""
+    if min_lon is None:
+        return None
+    first_row = int(math.floor((min_lat + 90.0) / GEO_CELL_DEGREES))
+    last_row = min(int(math.floor((max_lat + 90.0) / GEO_CELL_DEGREES)), int(180 / GEO_CELL_DEGREES) - 1)
+    first_col = int(math.floor((min_lon + 180.0) / GEO_CELL_DEGREES))
+    last_col = int(math.floor((max_lon + 180.0) / GEO_CELL_DEGREES))
+
+    if (last_row - first_row + 1) * (last_col - first_col + 1) > MAX_QUERY_CELLS:
+        return None
+    return [
+        row * CELLS_PER_ROW + (col % CELLS_PER_ROW)
+        for row in range(first_row, last_row + 1)
+        for col in range(first_col, last_col + 1)
+    ]
+
+
+def _longitude_filter(min_lon, max_lon):
+    if min_lon is None:
+        return None
+    if min_lon < -180.0:
+        return or_(User.longitude >= min_lon + 360.0, User.longitude <= max_lon)
+    if max_lon > 180.0:
+        return or_(User.longitude >= min_lon, User.longitude <= max_lon - 360.0)
+    return User.longitude.between(min_lon, max_lon)
+
+
+def radius_prefilter(latitude, longitude, radius_miles):
+    """
+    SQL filter keeping users plausibly within radius_miles of a coordinate.
+
+    This is a superset of the exact haversine check: anything it drops is
+    guaranteed to be out of range. Users without a location are kept because
+    the feed does not distance-filter them.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(latitude, longitude, radius_miles)
+
+    in_box = [User.latitude.between(min_lat, max_lat)]
+    lon_filter = _longitude_filter(min_lon, max_lon)
+    if lon_filter is not None:
+        in_box.append(lon_filter)
+
+    cells = cells_for_box(min_lat, max_lat, min_lon, max_lon)
+    if cells is not None:
+        # Rows written before geo_cell existed have no cell until backfilled
+        in_box.append(or_(User.geo_cell.in_(cells), User.geo_cell.is_(None)))
+
+    unlocated = or_(
+        User.latitude.is_(None),
+        User.longitude.is_(None),
+        User.latitude == 0,
+        User.longitude == 0,
+    )
+    return or_(unlocated, and_(*in_box))
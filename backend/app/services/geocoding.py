@@ -0,0 +1,300 @@
+# backend/app/services/geocoding.py
+"""
+Reverse geocoding (coordinates -> city/state) for /location/update.
+
+Results are cached per grid cell of GEOCODE_CELL_DECIMALS decimal places
+(2 = about 1 km): first in a per-worker LRU/TTL cache, then in the
+geocode_cache table, which keeps the GEOCODE_CACHE_MAX_ROWS most recently
+used cells. A location update whose cell is not cached never waits on
+Nominatim: the user is queued and a background thread looks the cell up
+(at most one request per NOMINATIM_MIN_INTERVAL seconds per process), stores
+it and fills in the user's city/state. Nominatim's usage policy allows one
+request per second in total, so the interval defaults to one second per API
+worker process (WEB_CONCURRENCY, gunicorn's -w).
+
+Queued lookups live in process memory; `flask backfill-user-places` fills
+in any that were lost to a restart.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import httpx
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models.geocodeDB import GeocodeCacheEntry
+from app.models.userDB import User
+from app.services.background_dispatch import Dispatcher, kick_after_commit
+from app.services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CELL_DECIMALS = int(os.getenv('GEOCODE_CELL_DECIMALS', '2'))
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', '10000'))
+GEOCODE_CACHE_TTL = 86400
+GEOCODE_CACHE_MAX_ROWS = int(os.getenv('GEOCODE_CACHE_MAX_ROWS', '100000'))
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+# Every worker process throttles on its own, so each gets an equal share of 1 request/second
+WORKER_PROCESSES = max(int(os.getenv('WEB_CONCURRENCY', '4')), 1)
+NOMINATIM_MIN_INTERVAL = float(os.getenv('NOMINATIM_MIN_INTERVAL', str(float(WORKER_PROCESSES))))
+LOOKUP_TIMEOUT_SECONDS = 5.0
+MAX_ATTEMPTS = 3
+RETRY_SECONDS = 60
+# Cache hits refresh last_used_at at most this often, so reads rarely write
+TOUCH_INTERVAL = timedelta(hours=12)
+
+_memory = TTLCache(maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL)
+# Session.info key set when a transaction deferred lookups
+_PENDING_KEY = 'geocode_lookups_pending'
+
+
+class GeocodeUnavailable(Exception):
+    """Nominatim could not be reached or answered with an error; worth retrying later."""
+
+
+def cell_key(latitude, longitude):
+    """Cache key of the grid cell containing a coordinate, e.g. "40.71,-74.01"."""
+    # + 0.0 turns -0.0 into 0.0 so both sides of the equator/meridian share a key
+    lat = round(float(latitude), CELL_DECIMALS) + 0.0
+    lon = round(float(longitude), CELL_DECIMALS) + 0.0
+    return f"{lat:.{CELL_DECIMALS}f},{lon:.{CELL_DECIMALS}f}"
+
+
+def cached_place(latitude, longitude):
+    """
+    (city, state) of the coordinate's cell if it has been looked up before,
+    otherwise None. Either value may be None (no city found there).
+    """
+    key = cell_key(latitude, longitude)
+    place = _memory.get(key)
+    if place is not None:
+        return place
+    entry = GeocodeCacheEntry.query.filter_by(cell_key=key).first()
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+    if entry.last_used_at < now - TOUCH_INTERVAL:
+        entry.last_used_at = now
+    place = (entry.city, entry.state)
+    _memory.set(key, place)
+    return place
+
+
+def clear_place_cache():
+    """Empty this worker's in-memory cells (the table is untouched)."""
+    _memory.clear()
+
+
+def store_place(key, city, state):
+    """Save a looked-up cell. The caller commits."""
+    entry = GeocodeCacheEntry.query.filter_by(cell_key=key).first()
+    if entry is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(GeocodeCacheEntry(cell_key=key, city=city, state=state))
+        except IntegrityError:
+            # Another process stored the cell meanwhile
+            entry = GeocodeCacheEntry.query.filter_by(cell_key=key).one()
+    if entry is not None:
+        entry.city, entry.state, entry.last_used_at = city, state, datetime.utcnow()
+    _memory.set(key, (city, state))
+
+
+def evict_places(max_rows=GEOCODE_CACHE_MAX_ROWS):
+    """Delete the least recently used cells beyond max_rows. The caller commits."""
+    excess = db.session.query(db.func.count(GeocodeCacheEntry.id)).scalar() - max_rows
+    if excess <= 0:
+        return 0
+    oldest = db.session.query(GeocodeCacheEntry.id).order_by(
+        GeocodeCacheEntry.last_used_at, GeocodeCacheEntry.id
+    ).limit(excess).subquery()
+    return GeocodeCacheEntry.query.filter(GeocodeCacheEntry.id.in_(db.select(oldest.c.id))).delete(
+        synchronize_session=False)
+
+
+_client = None
+_client_lock = threading.Lock()
+_last_request = 0.0
+
+
+def _http_client():
+    global _client
+    if _client is None:
+        # One pooled client per process instead of a new connection per lookup
+        _client = httpx.Client(timeout=LOOKUP_TIMEOUT_SECONDS, headers={"User-Agent": "MatchmateDating/1.0"})
+    return _client
+
+
+def reverse_geocode(latitude, longitude):
+    """
+    Look a coordinate up on Nominatim (blocking; not for request handlers).
+
+    Returns:
+        (city, state); either may be None
+
+    Raises:
+        GeocodeUnavailable: on network errors, non-200 responses and bodies that aren't JSON
+    """
+    global _last_request
+    with _client_lock:
+        wait = _last_request + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
+        client = _http_client()
+    try:
+        r = client.get(NOMINATIM_URL, params={
+            "lat": latitude, "lon": longitude, "format": "json", "addressdetails": 1})
+    except httpx.HTTPError as e:
+        raise GeocodeUnavailable(str(e)) from e
+    if r.status_code != 200:
+        raise GeocodeUnavailable(f"Nominatim returned {r.status_code}")
+    try:
+        addr = r.json().get("address") or {}
+    except (ValueError, AttributeError) as e:
+        # e.g. an HTML error page served with 200
+        raise GeocodeUnavailable(f"Unexpected Nominatim response: {e}") from e
+    city = addr.get("city") or addr.get("town") or addr.get("village") or addr.get("municipality")
+    return city, addr.get("state")
+
+
+class FakeGeocoder:
+    """Stand-in for Nominatim that names places after their cell; `delay` simulates network time."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lookups = 0
+
+    def __call__(self, latitude, longitude):
+        self.lookups += 1
+        time.sleep(self.delay)
+        return f"City {cell_key(latitude, longitude)}", "Test State"
+
+
+_geocoder = None
+
+
+def get_geocoder():
+    """The active lookup, chosen by GEOCODER (nominatim or fake) on first use."""
+    global _geocoder
+    if _geocoder is None:
+        name = os.getenv('GEOCODER', 'nominatim').lower()
+        if name == 'fake':
+            _geocoder = FakeGeocoder()
+        elif name == 'nominatim':
+            _geocoder = reverse_geocode
+        else:
+            raise ValueError(f"Unknown GEOCODER: {name}")
+    return _geocoder
+
+
+def set_geocoder(geocoder):
+    """Swap the lookup: a callable (latitude, longitude) -> (city, state), e.g. a FakeGeocoder."""
+    global _geocoder
+    _geocoder = geocoder
+
+
+def lookup_place(latitude, longitude):
+    """(city, state) from the cache, or from the geocoder (then cached). The caller commits."""
+    place = cached_place(latitude, longitude)
+    if place is None:
+        place = tuple(get_geocoder()(latitude, longitude))
+        store_place(cell_key(latitude, longitude), *place)
+    return place
+
+
+def apply_place(user, place, fields):
+    """Copy the found city/state onto the user's fields listed in fields ('city', 'state')."""
+    city, state = place
+    if 'city' in fields and city:
+        user.city = city
+    if 'state' in fields and state:
+        user.state = state
+
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def defer_place_lookup(user_id, latitude, longitude, fields):
+    """
+    Look the coordinate up in the background once the caller commits and
+    set the user's fields ('city', 'state') from it, unless the user has
+    moved to another cell by then.
+    """
+    with _pending_lock:
+        _pending[user_id] = {
+            'key': cell_key(latitude, longitude),
+            'latitude': latitude,
+            'longitude': longitude,
+            'fields': tuple(fields),
+            'attempts': 0,
+            'due': datetime.utcnow(),
+        }
+    db.session.info[_PENDING_KEY] = True
+
+
+def pending_place_lookups():
+    with _pending_lock:
+        return len(_pending)
+
+
+def process_place_lookups():
+    """
+    Run the due deferred lookups, committing after each user.
+
+    Returns:
+        When the next retry is due, or None
+    """
+    now = datetime.utcnow()
+    with _pending_lock:
+        due = [(user_id, job) for user_id, job in _pending.items() if job['due'] <= now]
+    for user_id, job in due:
+        try:
+            place = lookup_place(job['latitude'], job['longitude'])
+            user = db.session.get(User, user_id)
+            # Skip users who moved (or cleared their location) since the update
+            if user and user.latitude is not None and user.longitude is not None \
+                    and cell_key(user.latitude, user.longitude) == job['key']:
+                apply_place(user, place, job['fields'])
+            db.session.commit()
+        except Exception as e:
+            # Any failure (Nominatim, the database) uses up an attempt; the other jobs still run
+            db.session.rollback()
+            job['attempts'] += 1
+            if job['attempts'] >= MAX_ATTEMPTS:
+                logger.warning(f"Giving up on reverse geocoding for user {user_id}: {e}")
+                _finish(user_id, job)
+            else:
+                job['due'] = datetime.utcnow() + timedelta(seconds=RETRY_SECONDS)
+            continue
+        _finish(user_id, job)
+    if due:
+        evict_places()
+        db.session.commit()
+    with _pending_lock:
+        return min((job['due'] for job in _pending.values()), default=None)
+
+
+def _finish(user_id, job):
+    with _pending_lock:
+        # A newer update for the same user replaces the job; keep that one
+        if _pending.get(user_id) is job:
+            del _pending[user_id]
+
+
+_dispatcher = Dispatcher('geocode-dispatch', process_place_lookups, RETRY_SECONDS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_after_commit(session):
+    if session.info.pop(_PENDING_KEY, False):
+        kick_after_commit(_dispatcher)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
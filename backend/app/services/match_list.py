@@ -0,0 +1,52 @@
+# backend/app/services/match_list.py
+"""
+Batch loading for the /match/matches listing.
+
+Participants, their images and match likers are fetched for all listed
+matches at once, so assembling the response costs a fixed number of
+queries however many matches a user has.
+"""
+from collections import defaultdict
+from app import db
+from app.models.userDB import User
+from app.models.matchDB import match_likes
+from app.services.user_serialization import CARD_LOAD_OPTIONS, id_chunks, preload_images
+
+
+def load_match_participants(matches, extra_user_ids=()):
+    """
+    Load both participants of every match (plus extra_user_ids) with card
+    columns and images.
+
+    Returns:
+        {user_id: User}
+    """
+    user_ids = {user_id for match in matches for user_id in (match.user_id_1, match.user_id_2)}
+    user_ids.update(user_id for user_id in extra_user_ids if user_id)
+
+    users = []
+    for chunk in id_chunks(user_ids):
+        users.extend(User.query.options(*CARD_LOAD_OPTIONS).filter(User.id.in_(chunk)).all())
+    preload_images(users)
+    return {user.id: user for user in users}
+
+
+def load_match_likers(match_ids):
+    """Return {match_id: set of user IDs who liked it} in one query per chunk."""
+    likers = defaultdict(set)
+    for chunk in id_chunks(match_ids):
+        rows = db.session.query(match_likes.c.match_id, match_likes.c.user_id).filter(
+            match_likes.c.match_id.in_(chunk)
+        ).all()
+        for match_id, user_id in rows:
+            likers[match_id].add(user_id)
+    return likers
+
+
+def match_card(user):
+    """Card projection plus the primary image URL, as the match list renders it."""
+    if user is None:
+        return {'first_image': None}
+    card = user.to_card_dict()
+    card['first_image'] = user.primary_image_url
+    return card
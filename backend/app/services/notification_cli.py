@@ -0,0 +1,50 @@
+import time
+import click
+from .notification_outbox import drain_outbox, purge_outbox, BATCH_SIZE, PURGE_INTERVAL_SECONDS
+from .push_receipts import drain_push_receipts, RECEIPT_DELAY_SECONDS
+from .notification_service import FakePushClient, set_push_client
+
+def register_commands(app):
+    @app.cli.command("notification-worker")
+    @click.option("--loop/--once", default=True, show_default=True,
+                  help="Keep polling the outbox instead of exiting after one pass.")
+    @click.option("--interval", default=2.0, show_default=True, type=float,
+                  help="Seconds to sleep when the outbox is empty.")
+    @click.option("--batch-size", default=BATCH_SIZE, show_default=True, type=int,
+                  help="Notifications claimed per transaction.")
+    @click.option("--fake", is_flag=True, default=False,
+                  help="Record notifications with a fake push client instead of sending them.")
+    @click.option("--receipt-interval", default=300, show_default=True, type=int,
+                  help="Seconds between push receipt checks.")
+    def notification_worker(loop, interval, batch_size, fake, receipt_interval):
+        """Deliver queued push notifications (use with NOTIFICATION_DISPATCH=worker)."""
+        if fake:
+            set_push_client(FakePushClient())
+
+        last_receipt_check = None
+        last_purge = None
+        while True:
+            processed = drain_outbox(limit=batch_size)
+            if processed:
+                click.echo(f"Processed {processed} notifications")
+            if last_receipt_check is None or time.monotonic() - last_receipt_check >= receipt_interval:
+                checked = drain_push_receipts()
+                if checked:
+                    click.echo(f"Read {checked} push receipts")
+                last_receipt_check = time.monotonic()
+            if last_purge is None or time.monotonic() - last_purge >= PURGE_INTERVAL_SECONDS:
+                purged = purge_outbox()
+                if purged:
+                    click.echo(f"Purged {purged} old notifications")
+                last_purge = time.monotonic()
+            if not loop:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("check-push-receipts")
+    @click.option("--delay", default=RECEIPT_DELAY_SECONDS, show_default=True, type=int,
+                  help="Only read receipts for tickets at least this many seconds old.")
+    def check_push_receipts_command(delay):
+        """Read Expo push receipts and prune device tokens reported as unregistered."""
+        checked = drain_push_receipts(delay_seconds=delay)
+        click.echo(f"Read {checked} push receipts")
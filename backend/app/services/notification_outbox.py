@@ -0,0 +1,359 @@
+# backend/app/services/notification_outbox.py
+"""
+Outbox for push notifications.
+
+Routes queue a NotificationOutbox row in the same transaction as the change
+it announces (a chat message, a match) instead of calling Expo inline. Once
+the transaction commits, the rows are delivered by either:
+
+    thread  a background thread in the API process, started after each
+            commit that queued something (default, NOTIFICATION_DISPATCH)
+    worker  a separate `flask notification-worker` process; the API only
+            writes rows
+
+Failed deliveries are retried with exponential backoff up to
+NOTIFICATION_MAX_ATTEMPTS. Message pushes are coalesced per (recipient, match)
+and every recipient is rate limited, so a burst of chat messages produces a
+push with a count rather than one per message. A batch of rows shares its recipient, sender and
+token lookups, and its push messages are sent together in chunks of up to
+100 per Expo request. The dispatcher also reads push receipts to prune dead
+device tokens (see push_receipts.py).
+
+Delivered, skipped, coalesced and failed rows are kept for
+NOTIFICATION_RETENTION_DAYS (coalescing and rate limiting read the recent
+ones) and then purged by the dispatcher or worker.
+"""
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from exponent_server_sdk import DeviceNotRegisteredError, MessageTooBigError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models.notificationDB import NotificationOutbox
+from app.models.userDB import User, PushToken
+from app.services.background_dispatch import Dispatcher, kick_after_commit
+from app.services.notification_service import (
+    build_push_message,
+    publish_push_batch,
+    ticket_error,
+    message_notification_content,
+    match_notification_content,
+    device_tokens,
+)
+from app.services.push_receipts import record_push_results, drain_push_receipts, next_receipt_check_at
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_MODE = os.getenv('NOTIFICATION_DISPATCH', 'thread').lower()
+MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '6'))
+RETRY_BASE_SECONDS = int(os.getenv('NOTIFICATION_RETRY_BASE_SECONDS', '30'))
+MAX_RETRY_SECONDS = 3600
+BATCH_SIZE = 100
+# At most one message push per (recipient, match) in this many seconds; later ones are merged into a count
+COALESCE_SECONDS = int(os.getenv('NOTIFICATION_COALESCE_SECONDS', '30'))
+# At most RATE_LIMIT pushes per recipient in any RATE_WINDOW_SECONDS
+RATE_LIMIT = int(os.getenv('NOTIFICATION_RATE_LIMIT', '10'))
+RATE_WINDOW_SECONDS = int(os.getenv('NOTIFICATION_RATE_WINDOW_SECONDS', '300'))
+# Finished rows older than this are deleted; must stay well above the coalescing and rate windows
+RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', '7'))
+PURGE_INTERVAL_SECONDS = 3600
+
+# Session.info key set when a transaction queued notifications
+_PENDING_KEY = 'notification_outbox_pending'
+
+
+def _queue(kind, user_id, payload):
+    if not user_id:
+        return None
+    row = NotificationOutbox(kind=kind, user_id=user_id, payload=payload)
+    db.session.add(row)
+    db.session.info[_PENDING_KEY] = True
+    return row
+
+
+def queue_message_notification(receiver_id, sender_id, match_id):
+    """Queue a new-message notification; it is sent once the caller commits."""
+    return _queue('message', receiver_id, {'sender_id': sender_id, 'match_id': match_id})
+
+
+def queue_match_notification(user_id, match_id, other_user_id):
+    """Queue a new-match notification; it is sent once the caller commits."""
+    return _queue('match', user_id, {'match_id': match_id, 'other_user_id': other_user_id})
+
+
+def retry_delay(attempts):
+    """Backoff before attempt number attempts + 1."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_SECONDS))
+
+
+def _render(row, users):
+    """(title, body, data) for an outbox row, or None if it can no longer be rendered."""
+    payload = row.payload or {}
+    if row.kind == 'message':
+        sender = users.get(payload.get('sender_id'))
+        if not sender:
+            return None
+        return message_notification_content(sender, payload.get('match_id'), payload.get('count', 1))
+    if row.kind == 'match':
+        other = users.get(payload.get('other_user_id'))
+        other_name = (other.first_name if other else None) or 'Someone'
+        return match_notification_content(payload.get('match_id'), other_name)
+    return None
+
+
+def _messages_for(row, users, tokens_by_user):
+    """Push messages for every device of a row's recipient ([] if there is nothing to send)."""
+    recipient = users.get(row.user_id)
+    if not recipient or not recipient.notifications_enabled:
+        return []
+    content = _render(row, users)
+    if content is None:
+        return []
+    title, body, data = content
+    return [
+        build_push_message(token, title, body, data)
+        for token in device_tokens(recipient, tokens_by_user.get(row.user_id))
+    ]
+
+
+def _outcome(row, results):
+    """
+    Status of a row from the tickets of its messages.
+
+    Returns:
+        (status, error): status is 'sent', 'skipped' or 'retry'
+    """
+    delivered = 0
+    error = None
+    for message, result in results:
+        failure = ticket_error(result)
+        if failure is None:
+            delivered += 1
+        elif isinstance(failure, DeviceNotRegisteredError):
+            logger.warning(f"Device not registered: {message.to}")
+        elif isinstance(failure, MessageTooBigError):
+            # Resending would fail the same way
+            logger.error(f"Notification {row.id} rejected as too big: {failure}")
+        else:
+            error = f"{type(failure).__name__}: {failure}"
+    if delivered:
+        # Partially delivered rows are not retried, to avoid duplicates on the devices that got it
+        return 'sent', error
+    if error:
+        return 'retry', error
+    return 'skipped', None
+
+
+def _coalesce_key(row):
+    # Message pushes for the same conversation can be merged
+    if row.kind == 'message':
+        return (row.user_id, (row.payload or {}).get('match_id'))
+    return None
+
+
+def _throttle(rows, now):
+    """
+    Apply coalescing and the per-recipient rate limit to a batch of due rows.
+
+    Pending message rows for the same (recipient, match), whether due or not,
+    are merged into the newest one, which carries the total count; the others
+    are marked 'coalesced'.
+    Rows that would break the coalescing window or the rate limit get a later
+    next_attempt_at (without using up an attempt).
+
+    Returns:
+        The rows to send now
+    """
+    horizon = now - timedelta(seconds=max(COALESCE_SECONDS, RATE_WINDOW_SECONDS))
+    recent = db.session.query(
+        NotificationOutbox.user_id, NotificationOutbox.kind, NotificationOutbox.payload, NotificationOutbox.sent_at
+    ).filter(
+        NotificationOutbox.user_id.in_({row.user_id for row in rows}),
+        NotificationOutbox.status == 'sent',
+        NotificationOutbox.sent_at >= horizon
+    ).all()
+    last_sent = {}
+    sent_times = {}
+    rate_start = now - timedelta(seconds=RATE_WINDOW_SECONDS)
+    for sent in recent:
+        if sent.kind == 'message':
+            key = (sent.user_id, (sent.payload or {}).get('match_id'))
+            last_sent[key] = max(last_sent.get(key, sent.sent_at), sent.sent_at)
+        if sent.sent_at >= rate_start:
+            sent_times.setdefault(sent.user_id, []).append(sent.sent_at)
+
+    groups = {}
+    ready = []
+    for row in rows:
+        key = _coalesce_key(row)
+        if key is None:
+            ready.append(row)
+        else:
+            groups.setdefault(key, []).append(row)
+    if groups:
+        # Rows of the same conversations that are not due yet (e.g. held back by the window)
+        waiting = NotificationOutbox.query.filter(
+            NotificationOutbox.user_id.in_({user_id for user_id, _ in groups}),
+            NotificationOutbox.kind == 'message',
+            NotificationOutbox.status == 'pending',
+            NotificationOutbox.id.notin_([row.id for row in rows])
+        ).with_for_update(skip_locked=True).all()
+        for row in waiting:
+            key = _coalesce_key(row)
+            if key in groups:
+                groups[key].append(row)
+    for key, group in groups.items():
+        group.sort(key=lambda row: row.id)
+        primary = group[-1]
+        if len(group) > 1:
+            primary.payload = dict(primary.payload, count=sum((row.payload or {}).get('count', 1) for row in group))
+            for row in group[:-1]:
+                row.status = 'coalesced'
+        window_end = last_sent[key] + timedelta(seconds=COALESCE_SECONDS) if key in last_sent else None
+        if window_end is not None and window_end > now:
+            primary.next_attempt_at = window_end
+        else:
+            ready.append(primary)
+
+    allowed = []
+    for row in sorted(ready, key=lambda row: row.id):
+        times = sent_times.setdefault(row.user_id, [])
+        if len(times) >= RATE_LIMIT:
+            # Wait until the oldest push in the window ages out
+            row.next_attempt_at = min(times) + timedelta(seconds=RATE_WINDOW_SECONDS)
+            continue
+        times.append(now)
+        allowed.append(row)
+    return allowed
+
+
+def process_outbox(limit=BATCH_SIZE):
+    """
+    Deliver up to limit due notifications and commit the outcome. Messages
+    for all devices of all rows go out together, PUSH_CHUNK_SIZE per request.
+
+    Returns:
+        Number of rows processed
+    """
+    now = datetime.utcnow()
+    rows = NotificationOutbox.query.filter(
+        NotificationOutbox.status == 'pending',
+        NotificationOutbox.next_attempt_at <= now
+    ).order_by(NotificationOutbox.id).limit(limit).with_for_update(skip_locked=True).all()
+    if not rows:
+        db.session.rollback()
+        return 0
+    processed = len(rows)
+    rows = _throttle(rows, now)
+
+    user_ids = {row.user_id for row in rows}
+    for row in rows:
+        payload = row.payload or {}
+        user_ids.update(filter(None, (payload.get('sender_id'), payload.get('other_user_id'))))
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()} if rows else {}
+    tokens_by_user = {}
+    if rows:
+        for token in PushToken.query.filter(PushToken.user_id.in_({row.user_id for row in rows})).all():
+            tokens_by_user.setdefault(token.user_id, []).append(token)
+
+    messages = []
+    owners = []
+    for row in rows:
+        for message in _messages_for(row, users, tokens_by_user):
+            messages.append(message)
+            owners.append(row.id)
+    # Map every ticket back to its row (and, through the message, its token)
+    results = publish_push_batch(messages)
+    results_by_row = {}
+    for row_id, message, result in zip(owners, messages, results):
+        results_by_row.setdefault(row_id, []).append((message, result))
+    # Keep tickets for the receipt check and drop tokens Expo already rejected
+    record_push_results([(message.to, result) for message, result in zip(messages, results)])
+
+    for row in rows:
+        results = results_by_row.get(row.id)
+        status, error = _outcome(row, results) if results else ('skipped', None)
+        row.attempts += 1
+        row.last_error = error
+        if status == 'retry':
+            if row.attempts >= MAX_ATTEMPTS:
+                row.status = 'failed'
+                logger.error(f"Giving up on notification {row.id} after {row.attempts} attempts: {error}")
+            else:
+                row.next_attempt_at = now + retry_delay(row.attempts)
+        else:
+            row.status = status
+            if status == 'sent':
+                row.sent_at = datetime.utcnow()
+    db.session.commit()
+    return processed
+
+
+def drain_outbox(limit=BATCH_SIZE):
+    """Process batches until no due rows remain. Returns the number processed."""
+    total = 0
+    while True:
+        processed = process_outbox(limit)
+        total += processed
+        if processed < limit:
+            return total
+
+
+def next_retry_at():
+    """When the earliest pending retry is due, or None."""
+    return db.session.query(db.func.min(NotificationOutbox.next_attempt_at)).filter(
+        NotificationOutbox.status == 'pending'
+    ).scalar()
+
+
+def purge_outbox(retention_days=RETENTION_DAYS):
+    """
+    Delete rows that are no longer pending and older than retention_days, and commit.
+
+    Returns:
+        Number of rows deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    deleted = NotificationOutbox.query.filter(
+        NotificationOutbox.status != 'pending',
+        NotificationOutbox.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+_last_purge = None
+
+
+def _purge_if_due():
+    global _last_purge
+    if _last_purge is None or time.monotonic() - _last_purge >= PURGE_INTERVAL_SECONDS:
+        _last_purge = time.monotonic()
+        purge_outbox()
+
+
+def _dispatch():
+    """One dispatcher pass: deliver due rows, read due receipts and purge old rows. Returns when to run next."""
+    drain_outbox()
+    _purge_if_due()
+    receipts_due = next_receipt_check_at()
+    if receipts_due is not None and receipts_due <= datetime.utcnow():
+        drain_push_receipts()
+        receipts_due = next_receipt_check_at()
+    return min(filter(None, (next_retry_at(), receipts_due)), default=None)
+
+
+_dispatcher = Dispatcher('notification-dispatch', _dispatch, RETRY_BASE_SECONDS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_after_commit(session):
+    if session.info.pop(_PENDING_KEY, False) and DISPATCH_MODE == 'thread':
+        kick_after_commit(_dispatcher)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -3,203 +3,180 @@ from exponent_server_sdk import (
     PushClient,
     PushMessage,
     PushServerError,
-    DeviceNotRegisteredError,
-    InvalidCredentialsError,
+    PushTicket,
+    PushReceipt,
 )
-from app.models.userDB import User, PushToken
-from app import db
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
-# Initialize Expo Push Client
-push_client = PushClient()
 
-def send_push_notification(push_token, title, body, data=None):
+class FakePushClient:
     """
-    Send a push notification to a single device.
-    
-    Args:
-        push_token: Expo push token (string)
-        title: Notification title
-        body: Notification body
-        data: Optional data payload (dict)
-    
-    Returns:
-        bool: True if notification was sent successfully, False otherwise
+    Stand-in for the Expo PushClient that records messages instead of sending
+    them. Tokens in `unregistered` get DeviceNotRegistered error tickets, and
+    the next `fail_next` requests (sends or receipt checks) raise
+    PushServerError. `requests` counts round trips.
     """
-    if not push_token:
-        return False
-    
-    try:
-        # Create push message
-        message = PushMessage(
-            to=push_token,
-            title=title,
-            body=body,
-            data=data or {},
-            sound='default',
-        )
-        
-        # Send the notification
-        response = push_client.publish(message)
-        
-        # The response is a PushResponse object
-        # Check if it was successful
-        if response and hasattr(response, 'status'):
-            if response.status == 'ok':
-                return True
+
+    def __init__(self):
+        self.published = []
+        self.unregistered = set()
+        self.fail_next = 0
+        self.requests = 0
+
+    def publish_multiple(self, messages):
+        self.requests += 1
+        if self.fail_next:
+            self.fail_next -= 1
+            raise PushServerError("Fake push server error", None)
+        tickets = []
+        for message in messages:
+            if message.to in self.unregistered:
+                tickets.append(PushTicket(message, PushTicket.ERROR_STATUS, f"{message.to} is not registered",
+                                          {'error': PushTicket.ERROR_DEVICE_NOT_REGISTERED}, None))
             else:
-                logger.warning(f"Failed to send notification: {response}")
-                return False
-        return True  # If no error was raised, assume success
-    except DeviceNotRegisteredError:
-        logger.warning(f"Device not registered: {push_token}")
-        return False
-    except InvalidCredentialsError:
-        logger.error("Invalid credentials for push notifications")
-        return False
-    except PushServerError as e:
-        logger.error(f"Push server error: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"Error sending push notification: {e}")
-        return False
+                self.published.append(message)
+                tickets.append(PushTicket(message, PushTicket.SUCCESS_STATUS, None, None,
+                                          f"fake-{len(self.published)}"))
+        return tickets
+
+    def publish(self, message):
+        return self.publish_multiple([message])[0]
+
+    def check_receipts_multiple(self, tickets):
+        """Receipts for tickets this client issued; tokens now in `unregistered` get error receipts."""
+        self.requests += 1
+        if self.fail_next:
+            self.fail_next -= 1
+            raise PushServerError("Fake push server error", None)
+        issued = {f"fake-{n}": message.to for n, message in enumerate(self.published, start=1)}
+        receipts = []
+        for ticket in tickets:
+            token = issued.get(ticket.id)
+            if token is None:
+                continue
+            if token in self.unregistered:
+                receipts.append(PushReceipt(ticket.id, PushReceipt.ERROR_STATUS, f"{token} is not registered",
+                                            {'error': PushReceipt.ERROR_DEVICE_NOT_REGISTERED}))
+            else:
+                receipts.append(PushReceipt(ticket.id, PushReceipt.SUCCESS_STATUS, None, None))
+        return receipts
+
+
+_push_client = None
+
+
+def get_push_client():
+    """Return the active push client, creating it from PUSH_CLIENT (expo or fake) on first use."""
+    global _push_client
+    if _push_client is None:
+        name = os.getenv('PUSH_CLIENT', 'expo').lower()
+        if name == 'fake':
+            _push_client = FakePushClient()
+        elif name == 'expo':
+            _push_client = PushClient()
+        else:
+            raise ValueError(f"Unknown PUSH_CLIENT: {name}")
+    return _push_client
+
+
+def set_push_client(client):
+    """Swap the active push client (e.g. a FakePushClient in tests)."""
+    global _push_client
+    _push_client = client
+
+
+# Messages per Expo push request (the API's limit)
+PUSH_CHUNK_SIZE = 100
+
+
+def build_push_message(push_token, title, body, data=None):
+    return PushMessage(
+        to=push_token,
+        title=title,
+        body=body,
+        data=data or {},
+        sound='default',
+    )
 
-def send_notification_to_user(user_id, title, body, data=None):
+
+def publish_push_batch(messages):
     """
-    Send a push notification to a user by their user ID.
-    Sends to all registered devices for the user.
-    
-    Args:
-        user_id: User ID (int)
-        title: Notification title
-        body: Notification body
-        data: Optional data payload (dict)
-    
+    Send messages with one request per PUSH_CHUNK_SIZE messages.
+
     Returns:
-        bool: True if at least one notification was sent successfully, False otherwise
+        One result per message, in order: its PushTicket, or the exception
+        that failed its chunk (other chunks are still sent)
     """
-    user = User.query.get(user_id)
-    if not user:
-        return False
-    
-    # Check if user has notifications enabled
-    if not user.notifications_enabled:
-        return False
-    
-    # Get all push tokens for this user
-    push_tokens = PushToken.query.filter_by(user_id=user_id).all()
-    
-    if not push_tokens:
-        # Fallback to legacy push_token field for backward compatibility
-        if user.push_token:
-            return send_push_notification(user.push_token, title, body, data)
-        return False
-    
-    # Send to all registered devices
-    success_count = 0
-    for token_obj in push_tokens:
-        if send_push_notification(token_obj.token, title, body, data):
-            success_count += 1
-    
-    return success_count > 0
-
-def send_message_notification(receiver_id, sender_id, match_id, message_text):
+    client = get_push_client()
+    results = []
+    for start in range(0, len(messages), PUSH_CHUNK_SIZE):
+        chunk = messages[start:start + PUSH_CHUNK_SIZE]
+        try:
+            results.extend(client.publish_multiple(chunk))
+        except Exception as e:
+            logger.error(f"Error publishing {len(chunk)} push notifications: {e}")
+            results.extend([e] * len(chunk))
+    return results
+
+
+def ticket_error(result):
     """
-    Send a push notification for a new message.
-    Sends to all registered devices for the receiver.
-    
-    Args:
-        receiver_id: ID of the user receiving the message
-        sender_id: ID of the user sending the message
-        match_id: ID of the match/conversation
-        message_text: Text of the message (for preview)
+    None if a publish_push_batch result is a successful ticket, otherwise the
+    exception for it (DeviceNotRegisteredError, PushServerError, ...).
     """
-    receiver = User.query.get(receiver_id)
-    sender = User.query.get(sender_id)
-    print(f"receiver {receiver}")
-    
-    if not receiver:
-        return False
-    
-    # Check if receiver has notifications enabled
-    if not receiver.notifications_enabled:
-        return False
-    
-    if not sender:
-        return False
-    
+    if isinstance(result, Exception):
+        return result
+    try:
+        result.validate_response()
+    except Exception as e:
+        return e
+    return None
+
+
+def message_notification_content(sender, match_id, count=1):
+    """(title, body, data) of a notification for count new messages."""
     sender_name = sender.first_name or 'Someone'
     title = f"New message from {sender_name}"
     # Privacy: Don't send message content in notification to avoid exposing sensitive data on lock screen
     # Users can read the message when they open the app
-    body = "You have a new message"
-    
+    body = "You have a new message" if count == 1 else f"You have {count} new messages"
+
     # Data minimization: Only include matchId needed for navigation
     # senderId is not needed - app can fetch sender info when opening conversation
     data = {
         'type': 'message',
         'matchId': str(match_id),
     }
-    
-    # Get all push tokens for this user
-    push_tokens = PushToken.query.filter_by(user_id=receiver_id).all()
-    
-    if not push_tokens:
-        # Fallback to legacy push_token field for backward compatibility
-        if receiver.push_token:
-            return send_push_notification(receiver.push_token, title, body, data)
-        return False
-    
-    # Send to all registered devices
-    success_count = 0
-    for token_obj in push_tokens:
-        if send_push_notification(token_obj.token, title, body, data):
-            success_count += 1
-    
-    return success_count > 0
-
-def send_match_notification(user_id, match_id, other_user_name):
-    """
-    Send a push notification for a new match.
-    Sends to all registered devices for the user.
-    
-    Args:
-        user_id: ID of the user receiving the match notification
-        match_id: ID of the new match
-        other_user_name: Name of the matched user
-    """
-    user = User.query.get(user_id)
-    if not user:
-        return False
-    
-    # Check if user has notifications enabled
-    if not user.notifications_enabled:
-        return False
-    
+    return title, body, data
+
+
+def match_notification_content(match_id, other_user_name):
+    """(title, body, data) of a new-match notification."""
     title = "New Match!"
     body = f"You have a new match with {other_user_name}"
-    
     data = {
         'type': 'match',
         'matchId': str(match_id),
     }
-    
-    # Get all push tokens for this user
-    push_tokens = PushToken.query.filter_by(user_id=user_id).all()
-    
-    if not push_tokens:
-        # Fallback to legacy push_token field for backward compatibility
-        if user.push_token:
-            return send_push_notification(user.push_token, title, body, data)
-        return False
-    
-    # Send to all registered devices
-    success_count = 0
-    for token_obj in push_tokens:
-        if send_push_notification(token_obj.token, title, body, data):
-            success_count += 1
-    
-    return success_count > 0
+    return title, body, data
+
 
+# Tokens that failed this many deliveries in a row are no longer sent to
+PUSH_TOKEN_MAX_FAILURES = int(os.getenv('PUSH_TOKEN_MAX_FAILURES', '5'))
+
+
+def device_tokens(user, push_tokens):
+    """
+    Tokens to notify for user: registered devices that are not failing,
+    else the legacy users.push_token.
+    """
+    if push_tokens:
+        return [
+            token_obj.token for token_obj in push_tokens
+            if (token_obj.failure_count or 0) < PUSH_TOKEN_MAX_FAILURES
+        ]
+    # Fallback to legacy push_token field for backward compatibility
+    return [user.push_token] if user.push_token else []
@@ -0,0 +1,32 @@
+import time
+import click
+from .outbound_messages import drain_outbound, purge_outbound, BATCH_SIZE, PURGE_INTERVAL_SECONDS, FakeTransport, set_transport
+
+def register_commands(app):
+    @app.cli.command("outbound-worker")
+    @click.option("--loop/--once", default=True, show_default=True,
+                  help="Keep polling the queue instead of exiting after one pass.")
+    @click.option("--interval", default=1.0, show_default=True, type=float,
+                  help="Seconds to sleep when the queue is empty.")
+    @click.option("--batch-size", default=BATCH_SIZE, show_default=True, type=int,
+                  help="Messages claimed per transaction.")
+    @click.option("--fake", is_flag=True, default=False,
+                  help="Record messages with a fake transport instead of sending them.")
+    def outbound_worker(loop, interval, batch_size, fake):
+        """Send queued verification and password reset emails/SMS (use with OUTBOUND_DISPATCH=worker)."""
+        if fake:
+            set_transport(FakeTransport())
+
+        last_purge = None
+        while True:
+            processed = drain_outbound(limit=batch_size)
+            if processed:
+                click.echo(f"Processed {processed} outbound messages")
+            if last_purge is None or time.monotonic() - last_purge >= PURGE_INTERVAL_SECONDS:
+                purged = purge_outbound()
+                if purged:
+                    click.echo(f"Purged {purged} old outbound messages")
+                last_purge = time.monotonic()
+            if not loop:
+                break
+            time.sleep(interval)
@@ -0,0 +1,350 @@
+# backend/app/services/outbound_messages.py
+"""
+Queue for verification and password reset emails (Resend) and SMS (Twilio).
+
+Auth routes queue an OutboundMessage row and return without waiting on the
+provider; the row is sent after commit by either:
+
+    thread  a background thread in the API process (default, OUTBOUND_DISPATCH)
+    worker  a separate `flask outbound-worker` process
+
+Rows are claimed with a short lease and each outcome is committed right after
+its send, so no row lock is held while a provider is called. Failed sends are
+retried with exponential backoff up to OUTBOUND_MAX_ATTEMPTS. Sent and failed
+rows, whose payload holds the code or reset token, are deleted after
+OUTBOUND_RETENTION_HOURS. A request carrying an Idempotency-Key header queues at
+most one message per key, and re-sending a code that is still waiting in the
+queue reuses the queued row. OUTBOUND_TRANSPORT=fake records messages
+instead of calling the providers (local development and tests).
+"""
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+import resend
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from twilio.rest import Client
+from app import db
+from app.models.outboundMessageDB import OutboundMessage
+from app.services.background_dispatch import Dispatcher, kick_after_commit
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_MODE = os.getenv('OUTBOUND_DISPATCH', 'thread').lower()
+MAX_ATTEMPTS = int(os.getenv('OUTBOUND_MAX_ATTEMPTS', '5'))
+RETRY_BASE_SECONDS = int(os.getenv('OUTBOUND_RETRY_BASE_SECONDS', '15'))
+MAX_RETRY_SECONDS = 600
+BATCH_SIZE = 50
+# A claimed message is leased for this long; if the sender dies mid-send it becomes due again
+CLAIM_SECONDS = 300
+# Sent and failed rows (their payload holds the code or reset token) are deleted after this long
+RETENTION_HOURS = int(os.getenv('OUTBOUND_RETENTION_HOURS', '24'))
+PURGE_INTERVAL_SECONDS = 3600
+
+resend.api_key = os.getenv("RESEND_API_KEY")
+SENDER_EMAIL = "donotreply@matchmatedating.com"
+
+# Session.info key set when a transaction queued messages
+_PENDING_KEY = 'outbound_messages_pending'
+
+
+class TransportNotConfigured(Exception):
+    """The provider's credentials are missing; retrying cannot help."""
+
+
+class ResendEmailTransport:
+    def send(self, recipient, content):
+        response = resend.Emails.send({
+            "from": SENDER_EMAIL,
+            "to": [recipient],
+            "subject": content['subject'],
+            "html": content['html'],
+        })
+        return response.get('id')
+
+
+class TwilioSmsTransport:
+    def send(self, recipient, content):
+        account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+        auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+        twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
+        if not (account_sid and auth_token and twilio_phone):
+            raise TransportNotConfigured("Twilio credentials or TWILIO_PHONE_NUMBER not configured")
+        message = Client(account_sid, auth_token).messages.create(
+            body=content['body'],
+            from_=twilio_phone,
+            to=recipient
+        )
+        return message.sid
+
+
+class FakeTransport:
+    """
+    Records messages instead of sending them. The next `fail_next` sends
+    raise, to exercise retries.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.fail_next = 0
+
+    def send(self, recipient, content):
+        if self.fail_next:
+            self.fail_next -= 1
+            raise RuntimeError("Fake transport failure")
+        self.sent.append((recipient, content))
+        return f"fake-{len(self.sent)}"
+
+
+_transports = None
+
+
+def get_transport(channel):
+    """Transport for 'email' or 'sms', chosen by OUTBOUND_TRANSPORT (live or fake) on first use."""
+    global _transports
+    if _transports is None:
+        name = os.getenv('OUTBOUND_TRANSPORT', 'live').lower()
+        if name == 'fake':
+            fake = FakeTransport()
+            _transports = {'email': fake, 'sms': fake}
+        elif name == 'live':
+            _transports = {'email': ResendEmailTransport(), 'sms': TwilioSmsTransport()}
+        else:
+            raise ValueError(f"Unknown OUTBOUND_TRANSPORT: {name}")
+    return _transports[channel]
+
+
+def set_transport(transport):
+    """Use one transport for both channels (e.g. a FakeTransport in tests)."""
+    global _transports
+    _transports = {'email': transport, 'sms': transport}
+
+
+def _reset_url(token):
+    frontend_url = (os.getenv("FRONTEND_URL") or "https://matchmatedating.com").rstrip("/")
+    return f"{frontend_url}/reset-password.html?token={token}"
+
+
+def render_message(kind, channel, payload):
+    """Email ({'subject', 'html'}) or SMS ({'body'}) content of a queued message."""
+    name = payload.get('first_name') or 'there'
+    token = payload['token']
+    if kind == 'verification':
+        if channel == 'sms':
+            return {'body': f"Hello {name}, your verification code is: {token}. If you didn't create an account, please ignore this message."}
+        return {
+            'subject': "Verify Your Email Address",
+            'html': f"""<html>
+            <head></head>
+            <body>
+              <h2>Hello {name},</h2>
+              <p>Please verify your email address by entering the verification code in the app:</p>
+              <p><strong>Verification Code: {token}</strong></p>
+              <p>If you didn't create an account, please ignore this email.</p>
+              <p>Best regards,<br>The MatchMate Team</p>
+            </body>
+            </html>""",
+        }
+    if kind == 'password_reset':
+        reset_url = _reset_url(token)
+        if channel == 'sms':
+            return {'body': f"Hello {name}, you requested to reset your password. Click this link: {reset_url} This link expires in 1 hour. If you didn't request this, please ignore."}
+        return {
+            'subject': "Reset Your Password",
+            'html': f"""<html>
+            <head></head>
+            <body>
+              <h2>Hello {name},</h2>
+              <p>You requested to reset your password. Click the link below to reset it:</p>
+              <p><a href="{reset_url}" style="background-color: #6B46C1; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Reset Password</a></p>
+              <p>Or copy and paste this link into your browser:</p>
+              <p>{reset_url}</p>
+              <p>This link will expire in 1 hour.</p>
+              <p>If you didn't request a password reset, please ignore this email.</p>
+              <p>Best regards,<br>The MatchMate Team</p>
+            </body>
+            </html>""",
+        }
+    raise ValueError(f"Unknown outbound message kind: {kind}")
+
+
+def _scoped_key(kind, channel, recipient, idempotency_key):
+    # Scoped so the same client key on different requests can't collide
+    return hashlib.sha256(f"{kind}:{channel}:{recipient}:{idempotency_key}".encode('utf-8')).hexdigest()
+
+
+def queue_outbound_message(channel, recipient, kind, token, first_name=None, idempotency_key=None):
+    """
+    Queue an email or SMS; it is sent once the caller commits.
+
+    Args:
+        channel: 'email' or 'sms'
+        kind: 'verification' or 'password_reset'
+        idempotency_key: client-supplied key (the Idempotency-Key header); a
+            repeated key returns the message queued the first time
+
+    Returns:
+        The OutboundMessage row (new or reused)
+    """
+    scoped = _scoped_key(kind, channel, recipient, idempotency_key) if idempotency_key else None
+    if scoped:
+        existing = OutboundMessage.query.filter_by(idempotency_key=scoped).first()
+        if existing:
+            return existing
+    # The same code still waiting to go out (e.g. a double-tapped "resend") is not queued twice
+    for pending in OutboundMessage.query.filter_by(recipient=recipient, channel=channel, kind=kind, status='pending'):
+        if (pending.payload or {}).get('token') == token:
+            return pending
+
+    row = OutboundMessage(channel=channel, recipient=recipient, kind=kind,
+                          payload={'token': token, 'first_name': first_name}, idempotency_key=scoped)
+    try:
+        with db.session.begin_nested():
+            db.session.add(row)
+    except IntegrityError:
+        # A concurrent request with the same key won the race
+        return OutboundMessage.query.filter_by(idempotency_key=scoped).one()
+    db.session.info[_PENDING_KEY] = True
+    return row
+
+
+def retry_delay(attempts):
+    """Backoff before attempt number attempts + 1."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAX_RETRY_SECONDS))
+
+
+def _claim(limit):
+    """
+    Lease up to limit due rows to this sender and commit, so no row lock is
+    held while the providers are called.
+
+    Returns:
+        (number of rows claimed, [(row id, attempt number, channel, kind, recipient, payload)])
+    """
+    now = datetime.utcnow()
+    rows = OutboundMessage.query.filter(
+        OutboundMessage.status == 'pending',
+        OutboundMessage.next_attempt_at <= now
+    ).order_by(OutboundMessage.id).limit(limit).with_for_update(skip_locked=True).all()
+    claims = []
+    for row in rows:
+        if row.attempts >= MAX_ATTEMPTS:
+            # Every lease ran out without an outcome: the sender died mid-send each time
+            row.status = 'failed'
+            row.last_error = row.last_error or "Sender stopped before recording the outcome"
+            logger.error(f"Giving up on {row.kind} {row.channel} {row.id} after {row.attempts} interrupted attempts")
+            continue
+        row.attempts += 1
+        row.next_attempt_at = now + timedelta(seconds=CLAIM_SECONDS)
+        claims.append((row.id, row.attempts, row.channel, row.kind, row.recipient, row.payload or {}))
+    db.session.commit()
+    return len(rows), claims
+
+
+def _record(row_id, attempt, **values):
+    """Store a send's outcome and commit, unless the lease was lost to another sender meanwhile."""
+    OutboundMessage.query.filter(
+        OutboundMessage.id == row_id,
+        OutboundMessage.status == 'pending',
+        OutboundMessage.attempts == attempt
+    ).update(values, synchronize_session=False)
+    db.session.commit()
+
+
+def process_outbound(limit=BATCH_SIZE):
+    """
+    Send up to limit due messages, committing each outcome right after its send.
+
+    A crash mid-batch re-sends at most the message that was being sent, once
+    its lease (CLAIM_SECONDS) runs out.
+
+    Returns:
+        Number of rows processed
+    """
+    processed, claims = _claim(limit)
+    for row_id, attempt, channel, kind, recipient, payload in claims:
+        try:
+            content = render_message(kind, channel, payload)
+            provider_message_id = get_transport(channel).send(recipient, content)
+        except (TransportNotConfigured, ValueError, KeyError) as e:
+            logger.error(f"Cannot send {kind} {channel} {row_id}: {e}")
+            _record(row_id, attempt, status='failed', last_error=f"{type(e).__name__}: {e}")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempt >= MAX_ATTEMPTS:
+                logger.error(f"Giving up on {kind} {channel} {row_id} after {attempt} attempts: {e}")
+                _record(row_id, attempt, status='failed', last_error=error)
+            else:
+                logger.warning(f"Error sending {kind} {channel} {row_id}, retrying: {e}")
+                _record(row_id, attempt, last_error=error,
+                        next_attempt_at=datetime.utcnow() + retry_delay(attempt))
+        else:
+            _record(row_id, attempt, status='sent', last_error=None,
+                    provider_message_id=provider_message_id, sent_at=datetime.utcnow())
+    return processed
+
+
+def drain_outbound(limit=BATCH_SIZE):
+    """Process batches until no due rows remain. Returns the number processed."""
+    total = 0
+    while True:
+        processed = process_outbound(limit)
+        total += processed
+        if processed < limit:
+            return total
+
+
+def next_outbound_retry_at():
+    """When the earliest pending retry is due, or None."""
+    return db.session.query(db.func.min(OutboundMessage.next_attempt_at)).filter(
+        OutboundMessage.status == 'pending'
+    ).scalar()
+
+
+def purge_outbound(retention_hours=RETENTION_HOURS):
+    """
+    Delete sent and failed messages older than retention_hours, and commit.
+
+    Returns:
+        Number of rows deleted
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    deleted = OutboundMessage.query.filter(
+        OutboundMessage.status != 'pending',
+        OutboundMessage.created_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+_last_purge = None
+
+
+def _purge_if_due():
+    global _last_purge
+    if _last_purge is None or time.monotonic() - _last_purge >= PURGE_INTERVAL_SECONDS:
+        _last_purge = time.monotonic()
+        purge_outbound()
+
+
+def _dispatch():
+    drain_outbound()
+    _purge_if_due()
+    return next_outbound_retry_at()
+
+
+_dispatcher = Dispatcher('outbound-dispatch', _dispatch, RETRY_BASE_SECONDS)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_after_commit(session):
+    if session.info.pop(_PENDING_KEY, False) and DISPATCH_MODE == 'thread':
+        kick_after_commit(_dispatcher)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
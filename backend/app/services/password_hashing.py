@@ -0,0 +1,218 @@
+# backend/app/services/password_hashing.py
+"""
+bcrypt hashing and verification off the request threads.
+
+A bcrypt call holds a CPU for ~250 ms at cost 12, so a burst of logins or
+signups running inline would occupy every worker thread and stall feeds and
+chat. By default (PASSWORD_HASH_POOL=process) each API process sends them to
+a small pool of PASSWORD_HASH_WORKERS helper processes instead. At most
+PASSWORD_HASH_MAX_PENDING calls may be running or queued per process; past
+that, or when a call waits longer than PASSWORD_HASH_TIMEOUT seconds,
+PasswordHashingBusy is raised and the auth routes answer 503 with
+Retry-After, so a spike is shed rather than queued without bound.
+
+The cost factor is BCRYPT_LOG_ROUNDS (Flask-Bcrypt's setting). Hashes stay
+Flask-Bcrypt compatible, so existing hashes keep verifying.
+PASSWORD_HASH_POOL=inline runs bcrypt on the calling thread (CLI scripts,
+debugging).
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+POOL_MODE = os.getenv('PASSWORD_HASH_POOL', 'process').lower()
+POOL_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', '16'))
+TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+# Sent to clients as Retry-After when hashing is saturated
+RETRY_AFTER_SECONDS = 2
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hashes are queued in this process; retry later."""
+
+
+def _hasher(settings):
+    # Flask-Bcrypt only reads app.config, so a stand-in object carries the settings
+    from flask_bcrypt import Bcrypt
+    return Bcrypt(SimpleNamespace(config=settings))
+
+
+def _run(operation, settings, *args):
+    """Executed in a pool process. Returns (result, seconds spent hashing)."""
+    started = time.perf_counter()
+    hasher = _hasher(settings)
+    if operation == 'hash':
+        result = hasher.generate_password_hash(*args).decode('utf-8')
+    else:
+        result = hasher.check_password_hash(*args)
+    return result, time.perf_counter() - started
+
+
+def _settings():
+    from flask import current_app
+    config = current_app.config
+    return {
+        'BCRYPT_LOG_ROUNDS': config.get('BCRYPT_LOG_ROUNDS', 12),
+        'BCRYPT_HASH_PREFIX': config.get('BCRYPT_HASH_PREFIX', '2b'),
+        'BCRYPT_HANDLE_LONG_PASSWORDS': config.get('BCRYPT_HANDLE_LONG_PASSWORDS', False),
+    }
+
+
+class _Metrics:
+    """Per-process counters, read with password_hashing_stats()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {operation: {'completed': 0, 'rejected': 0, 'timed_out': 0, 'failed': 0}
+                           for operation in ('hash', 'verify')}
+            self.in_flight = 0
+            self.peak_in_flight = 0
+            self.wait_seconds = 0.0
+            self.max_wait_seconds = 0.0
+            self.hash_seconds = 0.0
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def count(self, operation, outcome):
+        with self._lock:
+            self.counts[operation][outcome] += 1
+
+    def completed(self, operation, wait_seconds, hash_seconds):
+        with self._lock:
+            self.counts[operation]['completed'] += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self.hash_seconds += hash_seconds
+
+    def snapshot(self):
+        with self._lock:
+            completed = sum(counts['completed'] for counts in self.counts.values())
+            return {
+                'mode': POOL_MODE,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'max_pending': MAX_PENDING,
+                'operations': {operation: dict(counts) for operation, counts in self.counts.items()},
+                'avg_wait_ms': round(self.wait_seconds * 1000 / completed, 2) if completed else 0.0,
+                'max_wait_ms': round(self.max_wait_seconds * 1000, 2),
+                'avg_hash_ms': round(self.hash_seconds * 1000 / completed, 2) if completed else 0.0,
+            }
+
+
+_metrics = _Metrics()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Started lazily in each API process (after gunicorn forks); forkserver
+                # children don't inherit this process's threads or connections
+                _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS,
+                                            mp_context=multiprocessing.get_context('forkserver'))
+    return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _call(operation, *args):
+    settings = _settings()
+    if POOL_MODE == 'inline':
+        started = time.perf_counter()
+        result, hash_seconds = _run(operation, settings, *args)
+        _metrics.completed(operation, time.perf_counter() - started - hash_seconds, hash_seconds)
+        return result
+
+    if not _slots.acquire(blocking=False):
+        _metrics.count(operation, 'rejected')
+        logger.warning(f"Password hashing saturated ({MAX_PENDING} pending); rejecting {operation}")
+        raise PasswordHashingBusy()
+    _metrics.started()
+
+    def release(_future):
+        _metrics.finished()
+        _slots.release()
+
+    pool = _get_pool()
+    started = time.perf_counter()
+    try:
+        future = pool.submit(_run, operation, settings, *args)
+    except (BrokenProcessPool, RuntimeError) as e:
+        release(None)
+        _reset_pool(pool)
+        _metrics.count(operation, 'failed')
+        logger.error(f"Password hashing pool unavailable: {e}")
+        raise PasswordHashingBusy() from e
+    # The slot stays taken until the job really finishes, even if the caller stops waiting
+    future.add_done_callback(release)
+    try:
+        result, hash_seconds = future.result(timeout=TIMEOUT_SECONDS)
+    except FutureTimeoutError as e:
+        _metrics.count(operation, 'timed_out')
+        logger.warning(f"Password {operation} waited over {TIMEOUT_SECONDS}s; rejecting")
+        raise PasswordHashingBusy() from e
+    except BrokenProcessPool as e:
+        _reset_pool(pool)
+        _metrics.count(operation, 'failed')
+        logger.error(f"Password hashing process died: {e}")
+        raise PasswordHashingBusy() from e
+    _metrics.completed(operation, time.perf_counter() - started - hash_seconds, hash_seconds)
+    return result
+
+
+def hash_password(password):
+    """
+    bcrypt hash of password at the configured cost.
+
+    Raises:
+        PasswordHashingBusy: if the pool is saturated
+    """
+    return _call('hash', password)
+
+
+def verify_password(password_hash, password):
+    """
+    Whether password matches a bcrypt hash.
+
+    Raises:
+        PasswordHashingBusy: if the pool is saturated
+    """
+    return _call('verify', password_hash, password)
+
+
+def password_hashing_stats():
+    """Counters of this process: outcomes per operation, queue depth and timings."""
+    return _metrics.snapshot()
+
+
+def reset_password_hashing_stats():
+    _metrics.reset()
@@ -0,0 +1,122 @@
+# backend/app/services/profile_images.py
+"""
+Ordering of profile images and the denormalized users.primary_image_url.
+
+Images are shown in (position, id) order and the first one is the user's
+primary image. Its URL is copied onto the user row so list views (match
+list, linked daters) can render a thumbnail without reading the image
+table. Every write to a user's images goes through these helpers so the
+copy stays in step.
+"""
+from app import db
+from app.models.imageDB import Image
+
+
+def next_image_position(user_id):
+    """Position after the user's last image (0 for the first upload)."""
+    last = db.session.query(db.func.max(Image.position)).filter(Image.user_id == user_id).scalar()
+    return 0 if last is None else last + 1
+
+
+def primary_image_url(user_id):
+    """URL of the user's first image by (position, id), or None."""
+    return db.session.query(Image.image_url).filter(
+        Image.user_id == user_id
+    ).order_by(Image.position, Image.id).limit(1).scalar()
+
+
+def refresh_primary_image(user):
+    """Recompute user.primary_image_url from the image table (pending changes are flushed first)."""
+    db.session.flush()
+    user.primary_image_url = primary_image_url(user.id)
+    return user.primary_image_url
+
+
+def add_image(user, image_url):
+    """Append an image at the end of the user's ordering. The caller commits."""
+    image = Image(user_id=user.id, image_url=image_url, position=next_image_position(user.id))
+    db.session.add(image)
+    if user.primary_image_url is None:
+        user.primary_image_url = image_url
+    return image
+
+
+def remove_image(user, image):
+    """
+    Delete an image and close the gap it leaves in the ordering, so positions
+    stay 0..n-1. The caller commits.
+    """
+    db.session.delete(image)
+    db.session.query(Image).filter(
+        Image.user_id == user.id,
+        Image.position > image.position
+    ).update({Image.position: Image.position - 1})
+    refresh_primary_image(user)
+
+
+def reorder_images(user, image_ids):
+    """
+    Give the user's images the order of image_ids (positions 0..n-1).
+
+    Raises:
+        ValueError: if image_ids is not exactly the user's image IDs
+    """
+    images = Image.query.filter_by(user_id=user.id).all()
+    by_id = {image.id: image for image in images}
+    if len(image_ids) != len(by_id) or set(image_ids) != set(by_id):
+        raise ValueError("image_ids must list each of the user's images exactly once")
+    for position, image_id in enumerate(image_ids):
+        by_id[image_id].position = position
+    refresh_primary_image(user)
+    return [by_id[image_id] for image_id in image_ids]
+
+
+def backfill_image_positions(batch_size=1000):
+    """
+    Number every user's images 0..n-1 in their current (position, id) order
+    and copy the first URL onto users.primary_image_url.
+
+    Returns:
+        Number of users whose primary image changed
+    """
+    from app.models.userDB import User
+
+    updated = 0
+    last_id = 0
+    while True:
+        users = db.session.query(User.id, User.primary_image_url).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(batch_size).all()
+        if not users:
+            break
+        user_ids = [row.id for row in users]
+        images = db.session.query(Image.id, Image.user_id, Image.image_url, Image.position).filter(
+            Image.user_id.in_(user_ids)
+        ).order_by(Image.user_id, Image.position, Image.id).all()
+
+        positions = []
+        first_urls = {}
+        counts = {}
+        for image in images:
+            position = counts.get(image.user_id, 0)
+            counts[image.user_id] = position + 1
+            first_urls.setdefault(image.user_id, image.image_url)
+            if image.position != position:
+                positions.append({'b_id': image.id, 'b_position': position})
+        if positions:
+            db.session.execute(Image.__table__.update().where(
+                Image.__table__.c.id == db.bindparam('b_id')
+            ).values(position=db.bindparam('b_position')), positions)
+
+        changes = [
+            {'b_id': row.id, 'b_url': first_urls.get(row.id)}
+            for row in users if first_urls.get(row.id) != row.primary_image_url
+        ]
+        if changes:
+            db.session.execute(User.__table__.update().where(
+                User.__table__.c.id == db.bindparam('b_id')
+            ).values(primary_image_url=db.bindparam('b_url')), changes)
+        db.session.commit()
+        updated += len(changes)
+        last_id = users[-1].id
+    return updated
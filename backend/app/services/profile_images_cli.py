@@ -0,0 +1,10 @@
+import click
+from .profile_images import backfill_image_positions
+
+def register_commands(app):
+    @app.cli.command("backfill-primary-images")
+    @click.option("--batch-size", default=1000, show_default=True, type=int)
+    def backfill_primary_images(batch_size):
+        """Number existing images 0..n-1 per user and populate users.primary_image_url."""
+        updated = backfill_image_positions(batch_size=batch_size)
+        click.echo(f"Updated primary_image_url for {updated} users")
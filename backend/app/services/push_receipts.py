@@ -0,0 +1,192 @@
+# backend/app/services/push_receipts.py
+"""
+Push ticket and receipt bookkeeping, used to stop sending to dead devices.
+
+A ticket only says Expo accepted a message; whether Apple/Google delivered it
+is reported later by a receipt (available after about 15 minutes, kept by
+Expo for a day). The notification dispatcher records the ticket of every
+accepted message, and check_push_receipts reads their receipts in batches:
+
+    ok                  the token's last_success_at is set and failure_count reset
+    DeviceNotRegistered the token is deleted (also when reported on the ticket)
+    unclassified errors failure_count is increased; tokens reaching
+                        PUSH_TOKEN_MAX_FAILURES are skipped when sending
+
+A ticket whose receipt isn't available yet, or whose check failed, is checked
+again after PUSH_RECEIPT_RETRY_SECONDS, doubling per attempt, so a missing
+receipt or an Expo outage doesn't turn into a getReceipts request per second.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from exponent_server_sdk import DeviceNotRegisteredError, PushServerError, PushTicket, PushTicketError
+from app import db
+from app.models.notificationDB import PushTicketRecord
+from app.models.userDB import User, PushToken
+from app.services.notification_service import get_push_client, ticket_error
+
+logger = logging.getLogger(__name__)
+
+# Receipts are read once tickets are this old
+RECEIPT_DELAY_SECONDS = int(os.getenv('PUSH_RECEIPT_DELAY_SECONDS', '900'))
+# First re-check of a ticket whose receipt was missing or whose check failed; doubles per attempt
+RECEIPT_RETRY_SECONDS = int(os.getenv('PUSH_RECEIPT_RETRY_SECONDS', '900'))
+# Expo drops receipts after a day; older tickets are forgotten
+RECEIPT_TTL = timedelta(hours=24)
+# Receipt IDs per getReceipts request (the API's limit)
+RECEIPT_BATCH_SIZE = 1000
+
+
+def prune_tokens(tokens):
+    """Forget device tokens Expo reported as unregistered. The caller commits."""
+    tokens = set(tokens)
+    if not tokens:
+        return 0
+    deleted = PushToken.query.filter(PushToken.token.in_(tokens)).delete(synchronize_session=False)
+    User.query.filter(User.push_token.in_(tokens)).update({User.push_token: None}, synchronize_session=False)
+    logger.info(f"Pruned {len(tokens)} unregistered push tokens ({deleted} registrations)")
+    return deleted
+
+
+def _mark_success(tokens, now):
+    if tokens:
+        PushToken.query.filter(PushToken.token.in_(set(tokens))).update(
+            {PushToken.last_success_at: now, PushToken.failure_count: 0}, synchronize_session=False)
+
+
+def _mark_failure(tokens):
+    for token in tokens:
+        PushToken.query.filter(PushToken.token == token).update(
+            {PushToken.failure_count: PushToken.failure_count + 1}, synchronize_session=False)
+
+
+def _is_token_failure(error):
+    # Unclassified ticket/receipt errors (e.g. a malformed token) count against the
+    # token; size, rate and credential errors are not the device's fault
+    return type(error) is PushTicketError
+
+
+def record_push_results(results):
+    """
+    Book the outcome of a publish batch. The caller commits.
+
+    Args:
+        results: (token, ticket or exception) pairs from publish_push_batch
+    """
+    tickets, unregistered, failed = [], [], []
+    now = datetime.utcnow()
+    for token, result in results:
+        if isinstance(result, Exception):
+            # The whole request failed; says nothing about the token
+            continue
+        error = ticket_error(result)
+        if error is None:
+            if result.id:
+                tickets.append({'ticket_id': result.id, 'token': token, 'created_at': now})
+        elif isinstance(error, DeviceNotRegisteredError):
+            unregistered.append(token)
+        elif _is_token_failure(error):
+            failed.append(token)
+    if tickets:
+        db.session.execute(PushTicketRecord.__table__.insert(), tickets)
+    prune_tokens(unregistered)
+    _mark_failure(failed)
+
+
+def _defer(pending, now):
+    """
+    Push back the next check of tickets that got no receipt. The caller commits.
+
+    Args:
+        pending: (record id, attempts so far) pairs
+    """
+    by_attempts = {}
+    for record_id, attempts in pending:
+        by_attempts.setdefault(attempts, []).append(record_id)
+    for attempts, record_ids in by_attempts.items():
+        PushTicketRecord.query.filter(PushTicketRecord.id.in_(record_ids)).update({
+            PushTicketRecord.attempts: attempts + 1,
+            PushTicketRecord.next_check_at: now + timedelta(seconds=RECEIPT_RETRY_SECONDS * 2 ** attempts),
+        }, synchronize_session=False)
+
+
+def check_push_receipts(limit=RECEIPT_BATCH_SIZE, delay_seconds=RECEIPT_DELAY_SECONDS):
+    """
+    Read the receipts of tickets older than delay_seconds, update their
+    tokens and commit.
+
+    Returns:
+        Number of receipts read
+    """
+    now = datetime.utcnow()
+    PushTicketRecord.query.filter(PushTicketRecord.created_at < now - RECEIPT_TTL).delete(synchronize_session=False)
+    records = PushTicketRecord.query.filter(
+        PushTicketRecord.created_at <= now - timedelta(seconds=delay_seconds),
+        db.or_(PushTicketRecord.next_check_at.is_(None), PushTicketRecord.next_check_at <= now)
+    ).order_by(PushTicketRecord.id).limit(limit).all()
+    if not records:
+        db.session.commit()
+        return 0
+    pending = [(record.id, record.attempts) for record in records]
+
+    try:
+        # The client reads receipt IDs from ticket.id
+        tickets = [PushTicket(None, PushTicket.SUCCESS_STATUS, None, None, record.ticket_id) for record in records]
+        receipts = get_push_client().check_receipts_multiple(tickets)
+    except (PushServerError, OSError) as e:
+        logger.error(f"Error reading push receipts: {e}")
+        db.session.rollback()
+        _defer(pending, now)
+        db.session.commit()
+        return 0
+
+    by_ticket = {record.ticket_id: record for record in records}
+    read, delivered, unregistered, failed = [], [], [], []
+    for receipt in receipts:
+        record = by_ticket.get(receipt.id)
+        if record is None:
+            continue
+        read.append(record.id)
+        if receipt.is_success():
+            delivered.append(record.token)
+        else:
+            try:
+                receipt.validate_response()
+            except DeviceNotRegisteredError:
+                unregistered.append(record.token)
+            except PushTicketError as e:
+                logger.warning(f"Push receipt {receipt.id} for {record.token}: {e}")
+                if _is_token_failure(e):
+                    failed.append(record.token)
+
+    PushTicketRecord.query.filter(PushTicketRecord.id.in_(read)).delete(synchronize_session=False)
+    # Receipts not available yet
+    read = set(read)
+    _defer([(record_id, attempts) for record_id, attempts in pending if record_id not in read], now)
+    _mark_success(delivered, now)
+    prune_tokens(unregistered)
+    _mark_failure(failed)
+    db.session.commit()
+    return len(receipts)
+
+
+def drain_push_receipts(delay_seconds=RECEIPT_DELAY_SECONDS):
+    """Read receipts in batches until none are due. Returns the number read."""
+    total = 0
+    while True:
+        checked = check_push_receipts(delay_seconds=delay_seconds)
+        total += checked
+        if checked < RECEIPT_BATCH_SIZE:
+            return total
+
+
+def next_receipt_check_at():
+    """When the next ticket is due for a receipt check, or None."""
+    oldest_unchecked = db.session.query(db.func.min(PushTicketRecord.created_at)).filter(
+        PushTicketRecord.next_check_at.is_(None)
+    ).scalar()
+    next_retry = db.session.query(db.func.min(PushTicketRecord.next_check_at)).scalar()
+    due = [oldest_unchecked + timedelta(seconds=RECEIPT_DELAY_SECONDS)] if oldest_unchecked else []
+    if next_retry:
+        due.append(next_retry)
+    return min(due, default=None)
@@ -0,0 +1,259 @@
+# backend/app/services/realtime.py
+"""
+Real-time events for connected clients (GET /events/stream).
+
+Routes publish small JSON events (a new chat message, a match changing
+state) to per-user channels once their transaction has committed. Each open
+event stream subscribes to its user's channel and forwards what arrives.
+
+Delivery goes through a broker chosen by REALTIME_BROKER:
+
+    auto      (default) postgres when the database is PostgreSQL, else local
+    local     in-process only; enough for a single worker and for tests
+    postgres  LISTEN/NOTIFY on the application database, so an event
+              published by one gunicorn worker reaches streams held by the
+              others (no extra infrastructure)
+
+Events are best effort: a client that reconnects catches up with
+GET /conversation/<match_id>?after=<last message id> and /match/matches.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per open stream; a stream that falls further behind is told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+# NOTIFY payloads are limited to 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7900
+NOTIFY_CHANNEL = 'realtime_events'
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """Events for one channel, read by a single stream."""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Replace the backlog with a single resync marker rather than block publishers
+            self._drain()
+            self.queue.put_nowait({'type': 'resync', 'data': {}})
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def get(self, timeout=None):
+        """Next event, or None if none arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Delivers events to subscribers in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, event):
+        self._deliver(channel, event)
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Fans events out across processes with PostgreSQL LISTEN/NOTIFY.
+
+    Publishing sends a NOTIFY; a listener thread in every process receives
+    all notifications and hands them to that process's local subscribers.
+    """
+
+    def __init__(self, dsn):
+        super().__init__()
+        self.dsn = dsn
+        self._publish_lock = threading.Lock()
+        self._publish_conn = None
+        self._listener = threading.Thread(target=self._listen, name='realtime-listener', daemon=True)
+        self._listener.start()
+
+    def _connect(self):
+        import psycopg
+        return psycopg.connect(self.dsn, autocommit=True)
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}, default=str)
+        if len(payload.encode('utf-8')) > MAX_NOTIFY_PAYLOAD:
+            # Too large for NOTIFY: send the event without its body so clients refetch
+            payload = json.dumps({
+                'channel': channel,
+                'event': {'type': event.get('type'), 'data': {}, 'truncated': True},
+            })
+        with self._publish_lock:
+            try:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = self._connect()
+                self._publish_conn.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, payload))
+            except Exception:
+                self._publish_conn = None
+                raise
+
+    def _listen(self):
+        import time
+        while True:
+            try:
+                with self._connect() as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    for notify in conn.notifies():
+                        try:
+                            message = json.loads(notify.payload)
+                            self._deliver(message['channel'], message['event'])
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"Ignoring malformed realtime notification: {e}")
+            except Exception as e:
+                logger.error(f"Realtime listener disconnected, reconnecting: {e}")
+                time.sleep(1)
+
+
+def _database_url():
+    from flask import current_app
+    from sqlalchemy.engine import make_url
+    return make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+def _postgres_dsn():
+    url = _database_url()
+    if url.get_backend_name() != 'postgresql':
+        raise ValueError("REALTIME_BROKER=postgres requires a PostgreSQL database")
+    return url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the active broker, creating it from REALTIME_BROKER on first use."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                name = os.getenv('REALTIME_BROKER', 'auto').lower()
+                if name == 'auto':
+                    # Production runs several workers on PostgreSQL; a local broker there
+                    # would drop every event published in another worker
+                    name = 'postgres' if _database_url().get_backend_name() == 'postgresql' else 'local'
+                if name == 'local':
+                    _broker = LocalBroker()
+                elif name == 'postgres':
+                    _broker = PostgresBroker(_postgres_dsn())
+                else:
+                    raise ValueError(f"Unknown REALTIME_BROKER: {name}")
+    return _broker
+
+
+def set_broker(broker):
+    """Swap the active broker (e.g. a fresh LocalBroker in tests)."""
+    global _broker
+    _broker = broker
+
+
+def publish_to_users(user_ids, event_type, data):
+    """
+    Send an event to every stream of the given users. Call after commit;
+    failures are logged, never raised, so they cannot fail the request.
+    """
+    event = {'type': event_type, 'data': data}
+    for user_id in {user_id for user_id in user_ids if user_id}:
+        try:
+            get_broker().publish(user_channel(user_id), event)
+        except Exception as e:
+            logger.error(f"Error publishing {event_type} event to user {user_id}: {e}")
+
+
+def match_audience(match):
+    """
+    Users who follow a match: both daters, the matchmakers recorded on it and
+    the daters' own matchmakers (who read their conversations).
+    """
+    from app import db
+    from app.models.userDB import User
+
+    dater_ids = [match.user_id_1, match.user_id_2]
+    audience = set(dater_ids)
+    audience.update((match.matched_by_user_id_1_matcher, match.matched_by_user_id_2_matcher))
+    audience.update(row.id for row in db.session.query(User.id).filter(
+        User.role == 'matchmaker',
+        User.referred_by_id.in_(dater_ids)
+    ))
+    audience.discard(None)
+    return audience
+
+
+def publish_match_update(match, user_ids=None):
+    """Tell a match's audience (or only user_ids) that its state changed."""
+    try:
+        # After commit the match reloads, so these can hit the database too
+        audience = match_audience(match) if user_ids is None else user_ids
+        data = {'match_id': match.id, 'status': match.status, 'blind_match': match.blind_match}
+    except Exception as e:
+        logger.error(f"Error preparing match event: {e}")
+        return
+    publish_to_users(audience, 'match', data)
+
+
+def publish_message(match, message):
+    """Deliver a new chat message (as serialized by conversation_routes) to a match's audience."""
+    try:
+        audience = match_audience(match)
+        data = {'match_id': match.id, 'message': message}
+    except Exception as e:
+        logger.error(f"Error preparing message event: {e}")
+        return
+    publish_to_users(audience, 'message', data)
+
+
+def format_sse(event):
+    """Encode an event as a server-sent-events frame."""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
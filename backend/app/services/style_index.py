@@ -0,0 +1,267 @@
+# backend/app/services/style_index.py
+"""
+Approximate nearest-neighbour index over conversation-style embeddings.
+
+An inverted-file (IVF) index: stored vectors are clustered with spherical
+k-means, and each cluster keeps its members contiguously. A search only scores
+the clusters whose centroids are closest to the query, so "who writes most
+like this dater" does not scan every user.
+
+The index is written as .npy files under STYLE_INDEX_DIR (default
+instance/style_index) by the build-style-index command and memory-mapped by
+the API processes, so it is shared through the page cache rather than loaded
+into each worker.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+from flask import current_app
+from app.models.embeddingDB import UserEmbedding
+
+logger = logging.getLogger(__name__)
+
+# Lists probed per query; more is slower but closer to exact
+DEFAULT_NPROBE = int(os.getenv('STYLE_INDEX_NPROBE', '8'))
+KMEANS_ITERATIONS = 10
+# Rows scored against the centroids at once while clustering
+ASSIGN_CHUNK_SIZE = 8192
+
+_ARRAYS = ('centroids', 'vectors', 'ids', 'offsets')
+
+
+def _normalize(matrix):
+    matrix = np.array(matrix, dtype=np.float32, ndmin=2)
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))[:, None]
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _assign(vectors, centroids):
+    """Index of the closest centroid (by cosine) for every row."""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start:start + ASSIGN_CHUNK_SIZE]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Cluster unit vectors by cosine similarity.
+
+    Returns:
+        (centroids, assignments)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+    assignments = _assign(vectors, centroids)
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        # Empty lists keep their previous centroid
+        filled = np.bincount(assignments, minlength=n_lists) > 0
+        centroids[filled] = _normalize(sums[filled])
+        new_assignments = _assign(vectors, centroids)
+        if np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+    return centroids, assignments
+
+
+class StyleIndex:
+    """Inverted-file index: vectors grouped by list, offsets[i]:offsets[i+1] is list i."""
+
+    def __init__(self, centroids, vectors, ids, offsets, meta):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, user_ids, vectors, model, n_lists=None, iterations=KMEANS_ITERATIONS, seed=0):
+        """Cluster vectors into n_lists lists (default ~sqrt(n)) and lay them out list by list."""
+        ids = np.asarray(user_ids, dtype=np.int64)
+        vectors = _normalize(vectors)
+        if not n_lists:
+            n_lists = int(np.sqrt(len(ids)))
+        n_lists = max(1, min(n_lists, len(ids)))
+
+        centroids, assignments = spherical_kmeans(vectors, n_lists, iterations=iterations, seed=seed)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1)).astype(np.int64)
+
+        meta = {
+            'model': model,
+            'dimension': int(vectors.shape[1]),
+            'count': int(len(ids)),
+            'lists': int(n_lists),
+            'built_at': time.time(),
+        }
+        return cls(centroids, vectors[order], ids[order], offsets, meta)
+
+    def save(self, path):
+        """Write the index next to path and swap it in, so readers never see a partial index."""
+        staging = f"{path}.new"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in _ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+        previous = f"{path}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, previous)
+        os.rename(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a saved index; arrays are memory-mapped read-only unless mmap=False."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None)
+            for name in _ARRAYS
+        }
+        return cls(meta=meta, **arrays)
+
+    def search(self, query, k=20, nprobe=DEFAULT_NPROBE, allowed_ids=None):
+        """
+        Top-k most similar users to a query vector.
+
+        Args:
+            query: embedding of the user being matched
+            k: number of results
+            nprobe: lists scanned; widened automatically when allowed_ids
+                filters out too many members to fill k results
+            allowed_ids: optional iterable restricting results (e.g. eligible candidates)
+
+        Returns:
+            list of (user_id, similarity), most similar first
+        """
+        query = _normalize(query)[0]
+        if not len(self) or not query.any():
+            return []
+
+        allowed = None
+        if allowed_ids is not None:
+            allowed = np.fromiter(allowed_ids, dtype=np.int64)
+            if not len(allowed):
+                return []
+
+        probe_order = np.argsort(-(self.centroids @ query))
+        found_ids, found_scores = [], []
+        found = 0
+        for probed, list_index in enumerate(probe_order):
+            if probed >= nprobe and found >= k:
+                break
+            start, end = self.offsets[list_index], self.offsets[list_index + 1]
+            if start == end:
+                continue
+            ids = np.asarray(self.ids[start:end])
+            rows = np.asarray(self.vectors[start:end])
+            if allowed is not None:
+                mask = np.isin(ids, allowed)
+                ids, rows = ids[mask], rows[mask]
+            if len(ids):
+                found_ids.append(ids)
+                found_scores.append(rows.astype(np.float32, copy=False) @ query)
+                found += len(ids)
+
+        if not found:
+            return []
+        ids = np.concatenate(found_ids)
+        scores = np.concatenate(found_scores)
+        return _top_k(ids, scores, k)
+
+
+def _top_k(ids, scores, k):
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+def exact_style_search(query, candidate_ids, k=20):
+    """
+    Brute-force top-k over the stored embeddings of candidate_ids.
+    Used when no index has been built yet.
+    """
+    from app.services.ai_embeddings import load_stored_vectors
+    from app.services.embedding_store import load_embeddings
+
+    query = _normalize(query)[0]
+    if not query.any():
+        return []
+    vectors = load_stored_vectors(load_embeddings(candidate_ids, with_vectors=False))
+    if not vectors:
+        return []
+    ids = np.fromiter(vectors.keys(), dtype=np.int64)
+    matrix = _normalize(list(vectors.values()))
+    return _top_k(ids, matrix @ query, k)
+
+
+def style_index_dir():
+    return current_app.config.get('STYLE_INDEX_DIR') or os.path.join(current_app.instance_path, 'style_index')
+
+
+def build_style_index(model, dimension, n_lists=None, iterations=KMEANS_ITERATIONS):
+    """
+    Build and save an index over every stored embedding from model/dimension
+    (users without messages are left out).
+
+    Returns:
+        The new StyleIndex, or None when there is nothing to index
+    """
+    rows = UserEmbedding.query.filter(
+        UserEmbedding.model == model,
+        UserEmbedding.dimension == dimension,
+        UserEmbedding.message_count > 0
+    ).order_by(UserEmbedding.user_id).yield_per(1000)
+
+    user_ids, vectors = [], []
+    for row in rows:
+        user_ids.append(row.user_id)
+        vectors.append(row.as_array())
+    if not user_ids:
+        return None
+
+    index = StyleIndex.build(user_ids, vectors, model, n_lists=n_lists, iterations=iterations)
+    index.save(style_index_dir())
+    return index
+
+
+_loaded = {'path': None, 'mtime': None, 'index': None}
+
+
+def get_style_index():
+    """
+    Return the memory-mapped index for this process, or None if none was built.
+    Reopens it when build-style-index has written a newer one.
+    """
+    path = style_index_dir()
+    meta_path = os.path.join(path, 'meta.json')
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+
+    if _loaded['path'] != path or _loaded['mtime'] != mtime:
+        try:
+            _loaded['index'] = StyleIndex.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load style index from {path}: {e}")
+            return None
+        _loaded['path'] = path
+        _loaded['mtime'] = mtime
+    return _loaded['index']
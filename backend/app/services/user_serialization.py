@@ -0,0 +1,111 @@
+# backend/app/services/user_serialization.py
+"""
+Batch serialization of users.
+
+User.to_dict() looks up the linked account, the matchmaker's referral row and
+linked daters, and lazy-loads images for every user it serializes. For lists
+of users that is several queries per user; serialize_users() loads the same
+related rows for the whole list with a fixed number of IN queries and
+produces identical output.
+
+The lighter public card projection is built the same way and pairs with
+load_only() options so only the columns it reads are fetched.
+"""
+from collections import defaultdict
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models.userDB import User, ReferredUsers, CARD_FIELDS
+from app.models.imageDB import Image
+
+# Keeps IN lists well under database parameter limits
+IN_CHUNK_SIZE = 500
+
+LINKED_DATER_COLUMNS = [getattr(ReferredUsers, f"linked_dater_{i}_id") for i in range(1, 11)]
+
+
+def projection_options(fields):
+    """Query options loading only the columns a projection reads (see CARD_FIELDS)."""
+    return (load_only(*[getattr(User, field) for field in fields]),)
+
+
+CARD_LOAD_OPTIONS = projection_options(CARD_FIELDS)
+
+
+def id_chunks(values):
+    """Split values into lists of at most IN_CHUNK_SIZE, for IN queries."""
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[start:start + IN_CHUNK_SIZE]
+
+
+def preload_images(users):
+    """Populate user.images for every user with one IN query (per chunk)."""
+    pending = [user for user in users if 'images' not in user.__dict__]
+    if not pending:
+        return
+    images_by_user = defaultdict(list)
+    for chunk in id_chunks(user.id for user in pending):
+        for image in Image.query.filter(Image.user_id.in_(chunk)).order_by(Image.position, Image.id).all():
+            images_by_user[image.user_id].append(image)
+    for user in pending:
+        set_committed_value(user, 'images', images_by_user.get(user.id, []))
+
+
+def load_linked_accounts(users):
+    """Return {user_id: User} for every linked account referenced by users."""
+    linked_ids = {user.linked_account_id for user in users if user.linked_account_id}
+    linked = {}
+    for chunk in id_chunks(linked_ids):
+        linked.update({user.id: user for user in User.query.filter(User.id.in_(chunk)).all()})
+    return linked
+
+
+def load_linked_dater_ids(users):
+    """
+    Return {matchmaker_id: [dater IDs]} matching User.get_linked_daters():
+    daters listed on the matchmaker's referral row that still exist.
+    """
+    matchmaker_ids = [user.id for user in users if user.role == "matchmaker"]
+    if not matchmaker_ids:
+        return {}
+
+    listed = {}
+    for chunk in id_chunks(matchmaker_ids):
+        rows = db.session.query(ReferredUsers.matchmaker_id, *LINKED_DATER_COLUMNS).filter(
+            ReferredUsers.matchmaker_id.in_(chunk)
+        ).all()
+        for matchmaker_id, *dater_ids in rows:
+            listed[matchmaker_id] = [dater_id for dater_id in dater_ids if dater_id is not None]
+
+    existing = set()
+    for chunk in id_chunks({dater_id for ids in listed.values() for dater_id in ids}):
+        existing.update(user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(chunk)).all())
+
+    # get_linked_daters() returns the rows of an unordered IN query, which come back in ID order
+    return {
+        matchmaker_id: sorted(dater_id for dater_id in set(ids) if dater_id in existing)
+        for matchmaker_id, ids in listed.items()
+    }
+
+
+def serialize_users(users):
+    """Serialize a list of users like User.to_dict() with a constant number of queries."""
+    users = list(users)
+    preload_images(users)
+    linked_accounts = load_linked_accounts(users)
+    linked_daters = load_linked_dater_ids(users)
+    return [
+        user.build_dict(
+            linked_accounts.get(user.linked_account_id) if user.linked_account_id else None,
+            linked_daters.get(user.id, [])
+        )
+        for user in users
+    ]
+
+
+def serialize_cards(users):
+    """Serialize users with User.to_card_dict(); one images query per chunk, nothing else."""
+    users = list(users)
+    preload_images(users)
+    return [user.to_card_dict() for user in users]
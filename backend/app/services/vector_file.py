@@ -0,0 +1,210 @@
+# backend/app/services/vector_file.py
+"""
+Compact memory-mapped copy of the stored conversation-style embeddings.
+
+The user_embeddings table stays the source of truth (float32 blobs). For
+scoring, its vectors are exported into one contiguous matrix on disk:
+
+    ids.npy         sorted user IDs (int64), row i belongs to ids[i]
+    watermarks.npy  last_message_id each row was built from (-1 for none)
+    vectors.npy     float32, float16 or int8 matrix, one row per user
+    scales.npy      int8 only: per-row scale, value = int8 * scale
+    meta.json       model, dimension, format, count
+
+Every API worker memory-maps the same files, so they share one page-cached
+copy, and looking users up is a binary search plus a row gather with no
+per-row decoding. A float16 row of 1536 dimensions takes 3 KB and an int8
+row takes 1.5 KB, against 6 KB as float32.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import numpy as np
+from flask import current_app
+from app.models.embeddingDB import UserEmbedding
+
+logger = logging.getLogger(__name__)
+
+VECTOR_FORMATS = ('float32', 'float16', 'int8')
+DEFAULT_VECTOR_FORMAT = os.getenv('EMBEDDING_VECTOR_FORMAT', 'float16')
+
+
+def quantize(vectors, fmt):
+    """
+    Encode a float matrix in the given format.
+
+    Returns:
+        (encoded matrix, per-row scales or None)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if fmt == 'float32':
+        return vectors, None
+    if fmt == 'float16':
+        return vectors.astype(np.float16), None
+    if fmt == 'int8':
+        # Symmetric per-row scaling keeps each row's largest component at +/-127
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        encoded = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return encoded, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector format: {fmt}")
+
+
+class VectorFile:
+    """Read-only view over an exported vector file."""
+
+    def __init__(self, ids, watermarks, vectors, scales, meta):
+        self.ids = ids
+        self.watermarks = watermarks
+        self.vectors = vectors
+        self.scales = scales
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def model(self):
+        return self.meta.get('model')
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        mode = 'r' if mmap else None
+        scales_path = os.path.join(path, 'scales.npy')
+        return cls(
+            ids=np.load(os.path.join(path, 'ids.npy'), mmap_mode=mode),
+            watermarks=np.load(os.path.join(path, 'watermarks.npy'), mmap_mode=mode),
+            vectors=np.load(os.path.join(path, 'vectors.npy'), mmap_mode=mode),
+            scales=np.load(scales_path, mmap_mode=mode) if os.path.exists(scales_path) else None,
+            meta=meta,
+        )
+
+    @staticmethod
+    def write(path, user_ids, vectors, watermarks, model, fmt=DEFAULT_VECTOR_FORMAT):
+        """Encode and write a vector file, swapping it in once complete."""
+        ids = np.asarray(user_ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)[order]
+        encoded, scales = quantize(vectors, fmt)
+        watermarks = np.array([-1 if w is None else w for w in watermarks], dtype=np.int64)[order]
+
+        staging = f"{path}.new"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        np.save(os.path.join(staging, 'ids.npy'), ids[order])
+        np.save(os.path.join(staging, 'watermarks.npy'), watermarks)
+        np.save(os.path.join(staging, 'vectors.npy'), encoded)
+        if scales is not None:
+            np.save(os.path.join(staging, 'scales.npy'), scales)
+        with open(os.path.join(staging, 'meta.json'), 'w') as f:
+            json.dump({
+                'model': model,
+                'dimension': int(vectors.shape[1]),
+                'format': fmt,
+                'count': int(len(ids)),
+                'written_at': time.time(),
+            }, f)
+
+        previous = f"{path}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, previous)
+        os.rename(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
+
+    def lookup(self, user_ids, watermarks=None):
+        """
+        Decode the rows of user_ids into float32 vectors.
+
+        Args:
+            user_ids: users to look up
+            watermarks: optional {user_id: last_message_id}; rows built from a
+                different watermark are treated as missing (the database copy is newer)
+
+        Returns:
+            {user_id: embedding} for the users found
+        """
+        if not len(self.ids):
+            return {}
+        wanted = np.fromiter(user_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, wanted)
+        rows[rows >= len(self.ids)] = 0
+        found = np.asarray(self.ids[rows]) == wanted
+
+        if watermarks is not None:
+            expected = np.array([
+                -1 if watermarks.get(int(user_id)) is None else watermarks[int(user_id)]
+                for user_id in wanted
+            ], dtype=np.int64)
+            found &= np.asarray(self.watermarks[rows]) == expected
+
+        rows = rows[found]
+        decoded = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            decoded *= np.asarray(self.scales[rows])[:, None]
+        return dict(zip(wanted[found].tolist(), decoded))
+
+
+def vector_file_dir():
+    return current_app.config.get('EMBEDDING_VECTOR_DIR') or os.path.join(current_app.instance_path, 'embedding_vectors')
+
+
+def export_vector_file(model, dimension, fmt=DEFAULT_VECTOR_FORMAT):
+    """
+    Write every stored embedding from model/dimension into the vector file.
+
+    Returns:
+        Number of users exported
+    """
+    if fmt not in VECTOR_FORMATS:
+        raise ValueError(f"Unknown vector format: {fmt}")
+
+    rows = UserEmbedding.query.filter(
+        UserEmbedding.model == model,
+        UserEmbedding.dimension == dimension
+    ).order_by(UserEmbedding.user_id).yield_per(1000)
+
+    user_ids, vectors, watermarks = [], [], []
+    for row in rows:
+        user_ids.append(row.user_id)
+        vectors.append(row.as_array())
+        watermarks.append(row.last_message_id)
+
+    VectorFile.write(
+        vector_file_dir(),
+        user_ids,
+        np.array(vectors, dtype=np.float32).reshape(len(user_ids), dimension),
+        watermarks,
+        model,
+        fmt
+    )
+    return len(user_ids)
+
+
+_loaded = {'path': None, 'mtime': None, 'file': None}
+
+
+def get_vector_file():
+    """
+    Return the memory-mapped vector file for this process, or None if none was exported.
+    Reopens it when a newer export has been written.
+    """
+    path = vector_file_dir()
+    try:
+        mtime = os.path.getmtime(os.path.join(path, 'meta.json'))
+    except OSError:
+        return None
+
+    if _loaded['path'] != path or _loaded['mtime'] != mtime:
+        try:
+            _loaded['file'] = VectorFile.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load embedding vector file from {path}: {e}")
+            return None
+        _loaded['path'] = path
+        _loaded['mtime'] = mtime
+    return _loaded['file']
@@ -28,4 +28,4 @@ flask db upgrade || echo "Migration upgrade failed or already up to date"
 
 # Start Gunicorn
 echo "Starting Gunicorn on port $PORT..."
-exec gunicorn -w 4 -b 0.0.0.0:$PORT --timeout 120 --access-logfile - --error-logfile - run:app
+exec gunicorn -w ${WEB_CONCURRENCY:-4} --worker-class gthread --threads ${GUNICORN_THREADS:-64} -b 0.0.0.0:$PORT --timeout 120 --access-logfile - --error-logfile - run:app
@@ -128,7 +128,7 @@ const MatchConvo = () => {
 
       if (res.ok || res.status === 201) {
         const data = await res.json();
-        setMessages(data.messages || []);
+        if (data.message) setMessages((prev) => [...prev, data.message]);
         setNewMessageText("");
         setSendPuzzle(false);
         // Refresh match info to get updated message count
@@ -199,7 +199,7 @@ const MatchConvo = () => {
 
       if (res.ok || res.status === 201) {
         const data = await res.json();
-        setMessages(data.messages || []);
+        if (data.message) setMessages((prev) => [...prev, data.message]);
         setNewMessageText('');
         setSelectedPuzzleLink('');
         // Refresh match info to get updated message count